@@ -1,9 +1,33 @@
 # Imports
+import array
+import collections
+import collections.abc
+import copy
+import hashlib
 import json 
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
  
 # Constants - file names
 FN_LOCATIONS = "locations.json"
 FN_ITEMS = "items.json"
+FN_VERBS = "verbs.json"
+FN_SNAPSHOT = "world.snapshot"
+
+# Constants - compiled world snapshot. The header is the magic, the format
+# version and the length of the JSON metadata that follows it. The world
+# itself follows the metadata, marshalled, with each location & item kept as
+# a JSON string that is only decoded when the object is first used.
+SNAPSHOT_MAGIC = b"ADVWORLD"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+
+# Constants - saved game state format version
+SAVE_VERSION = 1
 
 # Constants - item attributes
 A_LIGHT = 1
@@ -13,6 +37,29 @@ A_VERY_HEAVY = 3
 # Special Location
 L_CARRIED = "carried"
 
+# Constants - kinds of word the parser knows. A word can be more than one kind.
+W_VERB = 1
+W_DIRECTION = 2
+W_PREPOSITION = 4
+W_ITEM = 8
+W_BLOCKED_EXIT = 16
+W_LOCATION = 32
+W_ALL = 64
+
+# Constants - how many parsed inputs the parser remembers
+P_CACHE_SIZE = 1024
+
+# Constants - how many destinations the path index keeps routes to
+PI_MAX_TARGETS = 256
+
+# Constants - longest route that is described step by step
+T_MAX_LISTED_STEPS = 10
+
+# Constants - how many rendered location descriptions are kept, shared by the
+# games in a world for unchanged locations, and by each game for its own
+DS_SHARED_CACHE_SIZE = 4096
+DS_CACHE_SIZE = 8
+
 # Constants - directions
 D_NORTH = "north"
 D_EAST = "east"
@@ -23,6 +70,109 @@ D_OUT = "out"
 D_UP = "up"
 D_DOWN = "down"
 
+# Where game output goes. Text is collected as the game prints it, then
+# written out all in one go by Flush, usually once per turn.
+class OutputSink(object):
+    def __init__(self):
+        self._parts = []
+
+    # Add some text, like print() does
+    def Print(self, text="", end="\n"):
+        self._parts.append(f"{text}{end}")
+
+    def Write(self, text):
+        self._parts.append(text)
+
+    # Text collected since the last flush
+    def GetPending(self):
+        return "".join(self._parts)
+
+    # Write out everything collected so far
+    def Flush(self):
+        if len(self._parts) > 0:
+            text = "".join(self._parts)
+            self._parts = []
+            self.WriteOut(text)
+
+    # Subclasses say where the text goes
+    def WriteOut(self, text):
+        pass
+
+# Output to the console
+class StdoutSink(OutputSink):
+    def WriteOut(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+# Output kept in memory, e.g. for tests & replays
+class MemorySink(OutputSink):
+    def __init__(self):
+        super().__init__()
+        self._output = []
+
+    def WriteOut(self, text):
+        self._output.append(text)
+
+    # Everything written out so far
+    def GetOutput(self):
+        return "".join(self._output)
+
+    def Clear(self):
+        self._output = []
+
+# Output to a connected socket
+class SocketSink(OutputSink):
+    def __init__(self, connection, encoding="utf-8"):
+        super().__init__()
+        self._connection = connection
+        self._encoding = encoding
+
+    def WriteOut(self, text):
+        self._connection.sendall(text.encode(self._encoding))
+
+# Output thrown away, e.g. for benchmarks & bots
+class NullSink(OutputSink):
+    def Print(self, text="", end="\n"):
+        pass
+
+    def Write(self, text):
+        pass
+
+# Rendered location descriptions, dropping the least recently used
+class DescriptionCache(object):
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def Get(self, key):
+        text = self._entries.get(key)
+        if text is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        return text
+
+    def Put(self, key, text):
+        self._entries[key] = text
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def Clear(self):
+        self._entries.clear()
+
+    def GetStats(self):
+        return {'hits': self._hits, 'misses': self._misses, 'size': len(self._entries)}
+
+    # Everything cached, oldest first, as (key, text)
+    def GetEntries(self):
+        return list(self._entries.items())
+
 class Location(object):
     def __init__(self, name, description):
         self._name = name
@@ -31,6 +181,9 @@ class Location(object):
         self._exits = {}
         self._blocked_exit = {}
 
+        # ID in the world graph (see WorldGraph)
+        self._location_id = -1
+
     def ToDict(self):
         # Convert the Location instance to a dictionary
         return {
@@ -41,6 +194,29 @@ class Location(object):
             'blocked_exit': self._blocked_exit
         }
 
+    # Create a Location instance from a dictionary
+    @staticmethod
+    def FromDict(location_dict):
+        # Create the location object
+        location = Location(location_dict["name"], location_dict["description"])
+        
+        # Get start_location flag
+        location.SetStartLocation(location_dict["start_location"])
+
+        # Any exits
+        if "exits" in location_dict: 
+            # Yep, so add them
+            exits_dict = location_dict["exits"]
+            for exit_name in exits_dict:
+                location.AddExit(exit_name, exits_dict[exit_name])
+
+        # Is there a blocked exit for this location?
+        if "blocked_exit" in location_dict:
+            # Yep, add it
+            location.SetBlockedExit(location_dict["blocked_exit"])
+
+        return location
+
     # Getters & Setters
     def SetBlockedExit(self, blocked_exit):
         self._blocked_exit = blocked_exit
@@ -51,6 +227,16 @@ class Location(object):
     def AddExit(self, direction, name):
         self._exits[direction] = name
 
+    def GetExits(self):
+        return self._exits
+
+    # Make a private copy of this location that can be changed safely
+    def Copy(self):
+        location = copy.copy(self)
+        location._exits = dict(self._exits)
+        location._blocked_exit = dict(self._blocked_exit)
+        return location
+
     # Get & Set Start Location 
     def GetStartLocation(self):
         return self._start_location
@@ -59,30 +245,36 @@ class Location(object):
         self._start_location = start_location
 
     # Get the description of the location
-    def Describe(self):
+    def Describe(self, sink):
         # print the location description
-        print(f"\n{self._description}")
+        sink.Print(f"\n{self._description}")
  
         # Is there a blocked exit?
         if len(self._blocked_exit) > 0:
             # Yep
-            print(f"There is {self._blocked_exit['desc']}")
+            sink.Print(f"There is {self._blocked_exit['desc']}")
         
         # Any normal exits?
         if len(self._exits) > 0:
             # Yep, so list exits
-            print(f"Possible exits are:", end=" ")
+            sink.Print("Possible exits are:", end=" ")
             for key in self._exits:
-                print(f" {key}", end= " ")
-            print()
+                sink.Print(f" {key}", end= " ")
+            sink.Print()
         else:
             # No exits. Doesn't look good for the player!
-            print("Uh ho. There doesn't seem to be any way out of here!")
+            sink.Print("Uh ho. There doesn't seem to be any way out of here!")
                     
     # Get the location name
     def GetLocationName(self):
         return self._name
 
+    def GetLocationId(self):
+        return self._location_id
+
+    def SetLocationId(self, location_id):
+        self._location_id = location_id
+
     # Move to a new location (if possible)
     def Move(self, direction):
         if direction.lower() in self._exits:
@@ -102,6 +294,9 @@ class Item(object):
         self._locked = False
         self._requires_to_unlock = ""
 
+        # Registry (if any) that indexes this item by location
+        self._registry = None
+
     def ToDict(self):
         # Convert the item objects to a dictionary
         return {
@@ -116,6 +311,25 @@ class Item(object):
             'requires_to_unlock' : self._requires_to_unlock
         }
 
+    # Create an Item instance from a dictionary
+    @staticmethod
+    def FromDict(item_dict):
+        # Create the item object
+        item = Item()
+
+        # Populate it
+        item.SetItemName(item_dict["name"])
+        item.SetDescription(item_dict["description"])
+        item.SetWeight(item_dict["weight"])
+        item.SetLocationName(item_dict["location_name"])
+        item.SetGetable(item_dict["getable"])
+        item.SetContainer(item_dict["container"])
+        item.SetOpen(item_dict["open"])
+        item.SetLocked(item_dict["locked"])
+        item.SetRequiresToUnlock(item_dict["requires_to_unlock"])
+
+        return item
+
     # Some getters & setters
     def SetLocked(self, locked):
         self._locked = locked
@@ -132,23 +346,30 @@ class Item(object):
     def SetDescription(self, description):
         self._description = description
 
+    def GetBaseDescription(self):
+        return self._description
+
     def GetDescription(self):
         # Are we a container?
-        if self._container:
+        if self.GetContainer():
             # Yep, are we open?
-            if self._open:
+            if self.GetOpen():
                 # Yep, so describe as open
-                return self._description + f" The {self._name} is open."
+                return self.GetBaseDescription() + f" The {self.GetItemName()} is open."
             else:
                 # Nope, describe as closed
-                return self._description + f" The {self._name} is closed." 
+                return self.GetBaseDescription() + f" The {self.GetItemName()} is closed." 
         else:
             # Nope, not a container
-            return self._description
+            return self.GetBaseDescription()
 
     def SetOpen(self, open):
         self._open = open
 
+        # What can be seen inside us has changed
+        if self._registry is not None:
+            self._registry.Touch(self._name)
+
     def GetOpen(self):
         return self._open
 
@@ -177,12 +398,291 @@ class Item(object):
         return self._getable
 
     def SetLocationName(self, location):
+        # Remember where we were, so the registry can update its index
+        old_location = self._location_name
         self._location_name = location
 
+        # Keep the registry (if any) in sync
+        if self._registry is not None:
+            self._registry.MoveItem(self, old_location, location)
+
     def GetLocationName(self):
         return self._location_name
 
 
+# A read-only dict of objects that are only created from their dicts the
+# first time they are looked up, so loading a big world costs next to nothing.
+class LazyMap(collections.abc.Mapping):
+    def __init__(self, rows, make):
+        self._rows = rows
+        self._make = make
+        self._objects = {}
+
+    def __getitem__(self, name):
+        obj = self._objects.get(name)
+        if obj is None:
+            # First time, so create it
+            obj = self._make(self._rows[name])
+            self._objects[name] = obj
+        return obj
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    # The saved row, without creating the object
+    def GetRow(self, name):
+        return self._rows[name]
+
+# Holds all the items, indexed by name and by location. A container is just
+# another location, so the same index answers "what is inside" too, and the
+# items form a tree: each item's location is its parent, and the index holds
+# each parent's children. Containers can be inside containers.
+#
+# A registry can be layered over a shared base registry. It then only holds
+# private copies of the items that have been changed (see GetMutableItem),
+# and reads everything else from the base, which is never modified.
+class ItemRegistry(object):
+    def __init__(self, base=None):
+        self._base = base
+        self._items = {}
+        self._by_location = {}
+
+        # Goes up every time something arrives at or leaves a location
+        self._versions = {}
+
+        # Load order is shared with the base, as overlays never add new items
+        if base is not None:
+            self._order = base._order
+        else:
+            self._order = {}
+
+    # Dict style access by item name
+    def __getitem__(self, item_name):
+        item = self._items.get(item_name)
+        if item is None:
+            if self._base is None:
+                raise KeyError(item_name)
+            return self._base[item_name]
+        return item
+
+    def __contains__(self, item_name):
+        if item_name in self._items:
+            return True
+        return self._base is not None and item_name in self._base
+
+    def __iter__(self):
+        if self._base is not None:
+            return iter(self._base)
+        return iter(self._items)
+
+    def __len__(self):
+        if self._base is not None:
+            return len(self._base)
+        return len(self._items)
+
+    # How many items have private copies in this layer
+    def GetChangedCount(self):
+        if self._base is not None:
+            return len(self._items)
+        return 0
+
+    # The names of the items with private copies in this layer
+    def GetChangedNames(self):
+        if self._base is not None:
+            return list(self._items)
+        return []
+
+    # Get an item that is safe to change. For a layered registry this makes a
+    # private copy of the base item the first time it is asked for.
+    def GetMutableItem(self, item_name):
+        item = self._items.get(item_name)
+        if item is None:
+            if self._base is None:
+                raise KeyError(item_name)
+
+            # Copy on write
+            item = copy.copy(self._base[item_name])
+            item._registry = self
+            self._items[item_name] = item
+            self._by_location.setdefault(item.GetLocationName(), {})[item_name] = None
+        return item
+
+    # Add an item, and index it by its location
+    def AddItem(self, item):
+        item_name = item.GetItemName()
+        self._items[item_name] = item
+        self._order[item_name] = len(self._order)
+        self._by_location.setdefault(item.GetLocationName(), {})[item_name] = None
+        self._versions[item.GetLocationName()] = self._versions.get(item.GetLocationName(), 0) + 1
+        item._registry = self
+
+    def GetItem(self, item_name):
+        if item_name in self:
+            return self[item_name]
+        return None
+
+    # Save the items & indexes as plain data, for a world snapshot
+    def ToRows(self):
+        return {
+            'items': {item_name: json.dumps(self._items[item_name].ToDict()) for item_name in self._items},
+            'order': self._order,
+            'by_location': {location_name: tuple(self._by_location[location_name]) for location_name in self._by_location}
+        }
+
+    # Load the items & indexes saved by ToRows. Items are only created when used.
+    def LoadRows(self, rows):
+        self._items = LazyMap(rows["items"], self.MakeItem)
+        self._order = rows["order"]
+        self._by_location = rows["by_location"]
+
+    # An item as saved JSON, for comparing worlds
+    def GetRow(self, item_name):
+        if isinstance(self._items, LazyMap):
+            return self._items.GetRow(item_name)
+        return json.dumps(self[item_name].ToDict())
+
+    # Create a registered item from its saved JSON
+    def MakeItem(self, row):
+        item = Item.FromDict(json.loads(row))
+        item._registry = self
+        return item
+
+    # Called by Item.SetLocationName when an item moves
+    def MoveItem(self, item, old_location, new_location):
+        item_name = item.GetItemName()
+
+        # Take it out of the old location
+        old_here = self._by_location.get(old_location)
+        if old_here is not None:
+            old_here.pop(item_name, None)
+            if len(old_here) == 0:
+                del self._by_location[old_location]
+
+        # And put it in the new one
+        self._by_location.setdefault(new_location, {})[item_name] = None
+
+        # Both have changed
+        self.Touch(old_location)
+        self.Touch(new_location)
+
+    # Move a number of items to the same place in one go, only noting each
+    # location that has changed once
+    def MoveItems(self, item_names, new_location):
+        old_locations = {}
+        new_here = self._by_location.setdefault(new_location, {})
+        for item_name in item_names:
+            item = self.GetMutableItem(item_name)
+            old_location = item.GetLocationName()
+            item._location_name = new_location
+
+            # Out of the old location & into the new one
+            old_here = self._by_location.get(old_location)
+            if old_here is not None:
+                old_here.pop(item_name, None)
+                if len(old_here) == 0:
+                    del self._by_location[old_location]
+            new_here[item_name] = None
+            old_locations[old_location] = None
+
+        for old_location in old_locations:
+            self.Touch(old_location)
+        self.Touch(new_location)
+
+    # Note that what can be seen at or in a location (or container) has
+    # changed, along with everything it's inside
+    def Touch(self, location_name):
+        versions = self._versions
+        while True:
+            versions[location_name] = versions.get(location_name, 0) + 1
+            if location_name not in self:
+                break
+            location_name = self[location_name].GetLocationName()
+
+    # How many times what can be seen at a location has changed in this layer
+    # (0 if it never has, so it's just as it is in the base)
+    def GetVersion(self, location_name):
+        return self._versions.get(location_name, 0)
+
+    # The names indexed at a location in this layer only, in any order
+    def GetIndexedAt(self, location_name):
+        return self._by_location.get(location_name)
+
+    # List the names of all the items at a location, in load order
+    def GetItemsAt(self, location_name):
+        here = self._by_location.get(location_name)
+
+        # Anything in the base that we haven't got our own copy of?
+        if self._base is not None:
+            base_here = self._base.GetIndexedAt(location_name)
+            if base_here:
+                here = [item_name for item_name in base_here if item_name not in self._items] + list(here or ())
+
+        if not here:
+            return []
+        return sorted(here, key=self._order.__getitem__)
+
+    # List the names of all the items inside a container
+    def GetContents(self, container_name):
+        return self.GetItemsAt(container_name)
+
+    # Where an item is, going up through the containers it's inside: a
+    # location name or L_CARRIED. None if any of them are closed, so it can't
+    # be seen or reached. Costs a step for each container.
+    def GetReachableLocation(self, item):
+        location_name = item.GetLocationName()
+        while location_name in self:
+            container = self[location_name]
+            if not container.GetOpen():
+                return None
+            location_name = container.GetLocationName()
+        return location_name
+
+    # List the names of everything that can be seen at a location: what's
+    # there, and what's inside any open containers there, in load order
+    def GetVisibleAt(self, location_name):
+        visible = []
+        places = [location_name]
+        while len(places) > 0:
+            for item_name in self.GetItemsAt(places.pop()):
+                visible.append(item_name)
+                item = self[item_name]
+                if item.GetContainer() and item.GetOpen():
+                    places.append(item_name)
+        visible.sort(key=self._order.__getitem__)
+        return visible
+
+    # The total weight of everything at a location, e.g. L_CARRIED
+    def GetTotalWeightAt(self, location_name):
+        return sum(self[item_name].GetWeight() for item_name in self.GetItemsAt(location_name))
+
+    # Check the location index matches the items. Returns a list of problems.
+    def CheckConsistency(self):
+        problems = []
+
+        # Every item must be indexed under its location
+        for item_name in self._items:
+            location_name = self._items[item_name].GetLocationName()
+            if item_name not in self._by_location.get(location_name, {}):
+                problems.append(f"{item_name} is not indexed at {location_name}")
+
+        # And every indexed item must really be there
+        for location_name in self._by_location:
+            for item_name in self._by_location[location_name]:
+                item = self._items.get(item_name)
+                if item is None:
+                    problems.append(f"{item_name} is indexed at {location_name} but is not a known item")
+                elif item.GetLocationName() != location_name:
+                    problems.append(f"{item_name} is indexed at {location_name} but is at {item.GetLocationName()}")
+
+        return problems
+
+# A parsed command. Parsers cache and share these, so treat them as read-only.
 class Command(object):
     def __init__(self, verb, obj, prep, target):
         self.verb = verb
@@ -192,213 +692,1143 @@ class Command(object):
 
 class Parser(object):
     def __init__(self):
+        # Every known word, mapped to the kinds of word it is (W_ flags)
+        self._vocabulary = {}
+
+        # Synonyms & multi-word names, mapping a tuple of words to the token
+        # that replaces them, plus the phrase lengths for each first word
+        self._phrases = {}
+        self._phrase_lengths = {}
+
+        # Somewhere else to look for words, by kind (see SetLookup)
+        self._lookups = {}
+
+        # Recently parsed input
+        self._cache = collections.OrderedDict()
+        self._cache_size = P_CACHE_SIZE
+
         # Valid verbs
-        self._essential_verbs = [
+        for verb in [
             'go', 'get', 'drop', 'examine', 'inventory',
             'unlock', 'lock', 'open', 'close', 'break',
-            'smash', 'hit', 'help', 'quit'
-        ]
+            'smash', 'hit', 'put', 'help', 'quit'
+        ]:
+            self.AddVerb(verb)
         
         # Valid directions
-        self._directions = [
-            'north', 'east', 'south', 'west',
-            'in', 'out', 'up', 'down'
-        ]
+        for direction in [
+            D_NORTH, D_EAST, D_SOUTH, D_WEST,
+            D_IN, D_OUT, D_UP, D_DOWN
+        ]:
+            self.AddWord(direction, W_DIRECTION)
 
         #  Valid preps
-        self._prepositions = [
+        for prep in [
             'with', 'at',
-            'using', 'into'
-        ]
-
-        # These lists will hold valid names of things in our world
-        self._item_names = []
-        self._blocked_exit_names = []
+            'using', 'into',
+            'in', 'from'
+        ]:
+            self.AddWord(prep, W_PREPOSITION)
+
+        # Everything at once
+        self.AddWord('all', W_ALL)
+
+        # Other ways of saying things
+        for synonym, word in [
+            ('take', 'get'), ('pick up', 'get'), ('x', 'examine'), ('i', 'inventory'),
+            ('n', D_NORTH), ('e', D_EAST), ('s', D_SOUTH), ('w', D_WEST),
+            ('u', D_UP), ('d', D_DOWN), ('everything', 'all')
+        ]:
+            self.AddSynonym(synonym, word)
+
+    # What kinds of word is it? (W_ flags)
+    def GetKind(self, word):
+        kind = self._vocabulary.get(word, 0)
+        if kind == 0:
+            # Not in the vocabulary, try the lookups
+            for lookup_kind in self._lookups:
+                if word in self._lookups[lookup_kind]:
+                    kind |= lookup_kind
+        return kind
 
     # Various checks
     def IsVerb(self, obj):
-        if obj in self._essential_verbs:
-            return True
-        return False
+        return self.GetKind(obj) & W_VERB != 0
 
     def IsDirection(self, obj):
-        if obj in self._directions:
-            return True
-        return False
+        return self.GetKind(obj) & W_DIRECTION != 0
 
     def IsItem(self, obj):
-        if obj in self._item_names:
-            return True
-        return False
+        return self.GetKind(obj) & W_ITEM != 0
 
     def IsBlockedExit(self, obj):
-        if obj in self._blocked_exit_names:
-            return True
-        return False
+        return self.GetKind(obj) & W_BLOCKED_EXIT != 0
+
+    def IsLocation(self, obj):
+        return self.GetKind(obj) & W_LOCATION != 0
+
+    def IsAll(self, obj):
+        return self.GetKind(obj) & W_ALL != 0
+
+    # Getters
+    def GetWords(self, kind):
+        return [word for word in self._vocabulary if self._vocabulary[word] & kind]
+
+    def GetVerbs(self):
+        return self.GetWords(W_VERB)
+
+    def GetItemNames(self):
+        return self.GetWords(W_ITEM)
+
+    def GetBlockedExitNames(self):
+        return self.GetWords(W_BLOCKED_EXIT)
+
+    def GetCacheSize(self):
+        return len(self._cache)
+
+    # Also look words of a kind up in anything that supports "in"
+    def SetLookup(self, kind, lookup):
+        self._lookups[kind] = lookup
+        self._cache.clear()
+
+    # How many parsed inputs to remember. Zero turns the cache off.
+    def SetCacheSize(self, cache_size):
+        self._cache_size = cache_size
+        self._cache.clear()
+
+    # Add a word of the given kind. Words can be more than one word long.
+    def AddWord(self, word, kind):
+        self._vocabulary[word] = self._vocabulary.get(word, 0) | kind
+        if " " in word:
+            self.AddPhrase(word, word)
+        self._cache.clear()
+
+    # Add another way of saying a known word, e.g. "take" for "get"
+    def AddSynonym(self, synonym, word):
+        self.AddPhrase(synonym, word)
+        self._cache.clear()
+
+    # Replace a run of input words with a single token
+    def AddPhrase(self, phrase, replacement):
+        words = tuple(phrase.lower().split())
+        self._phrases[words] = replacement
+
+        # Remember the lengths to try, longest first
+        lengths = self._phrase_lengths.setdefault(words[0], [])
+        if len(words) not in lengths:
+            lengths.append(len(words))
+            lengths.sort(reverse=True)
 
     # Add a verb
     def AddVerb(self, verb):
-        self._essential_verbs.append(verb)
+        self.AddWord(verb, W_VERB)
 
     # Add an known item
     def AddItemName(self, item_name):
-        self._item_names.append(item_name)
+        self.AddWord(item_name, W_ITEM)
 
     # Add a known blocked exit name
     def AddBlockedExitName(self, blocked_exit_name):
-        self._blocked_exit_names.append(blocked_exit_name)
+        self.AddWord(blocked_exit_name, W_BLOCKED_EXIT)
+
+    # Add a known location name. "top_of_tree" can also be typed "top of tree".
+    def AddLocationName(self, location_name):
+        self.AddWord(location_name, W_LOCATION)
+        if "_" in location_name:
+            self.AddPhrase(location_name.replace("_", " "), location_name)
+
+    # Break user input into tokens, replacing synonyms & joining multi-word names
+    def Tokenize(self, user_input):
+        words = user_input.lower().split()
+        tokens = []
+        i = 0
+        while i < len(words):
+            # Could a phrase start here?
+            lengths = self._phrase_lengths.get(words[i])
+            if lengths is not None:
+                for length in lengths:
+                    replacement = self._phrases.get(tuple(words[i:i + length]))
+                    if replacement is not None:
+                        # Yep
+                        tokens.append(replacement)
+                        i += length
+                        break
+                else:
+                    # Nope, just a word
+                    tokens.append(words[i])
+                    i += 1
+            else:
+                tokens.append(words[i])
+                i += 1
+        return tokens
 
     # Parse the user input
     def ParseInput(self, user_input):
+        # Seen it recently?
+        cache = self._cache
+        command = cache.get(user_input)
+        if command is not None:
+            cache.move_to_end(user_input)
+            return command
+
         verb = None
         obj = None
         prep = None
         target = None
-
-        # Break user input into tokens
-        tokens = user_input.lower().split()
+        vocabulary = self._vocabulary
 
         # Parse the tokens
-        for word in tokens:
+        for word in self.Tokenize(user_input):
+            # What kind of word is it? (one lookup)
+            kind = vocabulary.get(word, 0)
+            if kind == 0 and len(self._lookups) > 0:
+                kind = self.GetKind(word)
+
             # Found a verb?
-            if not verb and word in self._essential_verbs:
+            if not verb and kind & W_VERB:
                 verb = word
             # Found object (of the sentance)?
-            elif not obj and (word in self._item_names or word in self._blocked_exit_names or word in self._directions):
+            elif not obj and kind & (W_ITEM | W_BLOCKED_EXIT | W_DIRECTION | W_LOCATION | W_ALL):
                 obj = word
             # Found a preposition?
-            elif not prep and word in self._prepositions:
+            elif not prep and kind & W_PREPOSITION:
                 prep = word
             # Found the target?
-            elif prep and not target and (word in self._item_names or word in self._blocked_exit_names):
+            elif prep and not target and kind & (W_ITEM | W_BLOCKED_EXIT):
                 target = word
 
-        # Return parsed user input as a command object
-        return Command(verb, obj, prep, target)
+        # Return parsed user input as a command object, remembering it for next time
+        command = Command(verb, obj, prep, target)
+        if self._cache_size > 0:
+            cache[user_input] = command
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return command
+
+# Maps every verb to the function that handles it, called as handler(game, command).
+# Only verbs added with takes_all can be done to everything at once.
+class VerbRegistry(object):
+    def __init__(self):
+        self._handlers = {}
+        self._takes_all = set()
+
+    def __contains__(self, verb):
+        return verb in self._handlers
 
-# This is the main game object!
-class Game(object):
+    def __len__(self):
+        return len(self._handlers)
+
+    def AddVerb(self, verb, handler, takes_all=False):
+        self._handlers[verb] = handler
+        if takes_all:
+            self._takes_all.add(verb)
+        else:
+            self._takes_all.discard(verb)
+
+    # Make a new verb do the same as an existing one
+    def AddSynonym(self, synonym, verb):
+        self.AddVerb(synonym, self._handlers[verb], verb in self._takes_all)
+
+    def GetHandler(self, verb):
+        return self._handlers.get(verb)
+
+    # Can it be done to everything at once, e.g. "get all"?
+    def TakesAll(self, verb):
+        return verb in self._takes_all
+
+    def GetVerbs(self):
+        return list(self._handlers)
+
+# Verbs added by Python plugins, which every world created afterwards gets
+_plugin_verbs = {}
+
+# Add a verb to every world, for plugins. The handler is called as handler(game, command).
+def RegisterVerb(verb, handler, takes_all=False):
+    _plugin_verbs[verb] = (handler, takes_all)
+
+# Instrumentation (see Metrics.py). When it's off nothing is measured and
+# games are left exactly as they are.
+_metrics = None
+
+def SetMetrics(metrics):
+    global _metrics
+    _metrics = metrics
+
+def GetMetrics():
+    return _metrics
+
+# Create a verb registry holding the standard verbs & any plugin verbs
+def CreateVerbRegistry():
+    verbs = VerbRegistry()
+
+    # Essential verbs
+    verbs.AddVerb("go", Game.Go)
+    verbs.AddVerb("get", Game.Get, takes_all=True)
+    verbs.AddVerb("drop", Game.Drop, takes_all=True)
+    verbs.AddVerb("examine", Game.Examine)
+    verbs.AddVerb("inventory", Game.Inventory)
+
+    # Verbs that operate on items, exits, or Non Player Characters(NPCs)
+    verbs.AddVerb("hit", Game.Hit)
+    verbs.AddSynonym("break", "hit")
+    verbs.AddVerb("open", Game.Open)
+    verbs.AddVerb("close", Game.Close)
+    verbs.AddVerb("lock", Game.Lock)
+    verbs.AddVerb("unlock", Game.Unlock)
+    verbs.AddVerb("put", Game.Put)
+
+    # Plugins
+    for verb in _plugin_verbs:
+        handler, takes_all = _plugin_verbs[verb]
+        verbs.AddVerb(verb, handler, takes_all)
+
+    return verbs
+
+# Finds shortest routes between locations, following their exits. Every route
+# found is remembered as the next step to take from each location on it to
+# the destination, as any part of a shortest route is a shortest route too.
+# The index must be thrown away when exits change. With max_visited, a search
+# gives up after looking at that many locations, for worlds where looking at
+# one means loading it.
+class PathIndex(object):
+    def __init__(self, location_map, max_targets=PI_MAX_TARGETS, max_visited=None):
+        self._map = location_map
+        self._max_targets = max_targets
+        self._max_visited = max_visited
+
+        # Destination -> {location name: direction to go}, most recently used last
+        self._routes = collections.OrderedDict()
+
+    # The directions to take to get from start to target, or None if there's no way
+    def FindRoute(self, start_name, target_name):
+        if start_name == target_name:
+            return []
+
+        # Already know the way?
+        next_steps = self._routes.get(target_name)
+        if next_steps is not None and start_name in next_steps:
+            self._routes.move_to_end(target_name)
+            return self.FollowRoute(next_steps, start_name, target_name)
+
+        # Nope, search outwards from the start (breadth first)
+        came_from = {start_name: None}
+        frontier = collections.deque([start_name])
+        while len(frontier) > 0 and target_name not in came_from:
+            if self._max_visited is not None and len(came_from) >= self._max_visited:
+                break
+            location_name = frontier.popleft()
+            exits = self._map[location_name].GetExits()
+            for direction in exits:
+                next_name = exits[direction]
+                if next_name not in came_from:
+                    came_from[next_name] = (location_name, direction)
+                    frontier.append(next_name)
+
+        if target_name not in came_from:
+            # No way there
+            return None
+
+        # Work back from the target
+        route = []
+        location_name = target_name
+        while came_from[location_name] is not None:
+            location_name, direction = came_from[location_name]
+            route.append((location_name, direction))
+        route.reverse()
+
+        # Remember it
+        if next_steps is None:
+            next_steps = {}
+            self._routes[target_name] = next_steps
+            if len(self._routes) > self._max_targets:
+                self._routes.popitem(last=False)
+        else:
+            self._routes.move_to_end(target_name)
+        for location_name, direction in route:
+            next_steps[location_name] = direction
+
+        return [direction for location_name, direction in route]
+
+    # Follow remembered steps to a target
+    def FollowRoute(self, next_steps, start_name, target_name):
+        route = []
+        location_name = start_name
+        while location_name != target_name:
+            direction = next_steps[location_name]
+            route.append(direction)
+            location_name = self._map[location_name].GetExits()[direction]
+        return route
+
+    def GetMaxVisited(self):
+        return self._max_visited
+
+# The world's map as integers. Every location & item name has an ID, and all
+# the exits are kept in compact arrays: the exits of location i are entries
+# offsets[i] to offsets[i + 1] of the direction & target arrays. Moving around
+# then compares integers rather than strings. Exits that lead nowhere have a
+# target of -1.
+class WorldGraph(object):
     def __init__(self):
+        self._location_names = []
+        self._location_ids = {}
+        self._item_names = []
+        self._item_ids = {}
+        self._directions = []
+        self._direction_ids = {}
+
+        # The exits
+        self._offsets = array.array('i', [0])
+        self._exit_directions = array.array('i')
+        self._exit_targets = array.array('i')
+
+        # Where to find location objects, and the ones found so far, by ID
+        self._map = {}
+        self._locations = []
+
+    # Build the graph from a map of locations & a registry of items
+    def Build(self, location_map, items):
+        # Number everything first, so exits can point forwards
+        for location_name in location_map:
+            self.AddName(self._location_names, self._location_ids, location_name)
+        for item_name in items:
+            self.AddName(self._item_names, self._item_ids, item_name)
+
+        # Then the exits
+        for location_name in self._location_names:
+            exits = location_map[location_name].GetExits()
+            for direction in exits:
+                self._exit_directions.append(self.AddName(self._directions, self._direction_ids, direction))
+                self._exit_targets.append(self._location_ids.get(exits[direction], -1))
+            self._offsets.append(len(self._exit_targets))
+
+        self.SetMap(location_map)
+
+    # Give a name the next ID, unless it already has one
+    def AddName(self, names, ids, name):
+        name_id = ids.get(name)
+        if name_id is None:
+            name_id = len(names)
+            names.append(name)
+            ids[name] = name_id
+        return name_id
+
+    # Save the graph as plain data, for a world snapshot
+    def ToRows(self):
+        return {
+            'locations': self._location_names,
+            'items': self._item_names,
+            'directions': self._directions,
+            'offsets': self._offsets.tobytes(),
+            'exit_directions': self._exit_directions.tobytes(),
+            'exit_targets': self._exit_targets.tobytes()
+        }
+
+    def LoadRows(self, rows):
+        for location_name in rows["locations"]:
+            self.AddName(self._location_names, self._location_ids, location_name)
+        for item_name in rows["items"]:
+            self.AddName(self._item_names, self._item_ids, item_name)
+        for direction in rows["directions"]:
+            self.AddName(self._directions, self._direction_ids, direction)
+        self._offsets = array.array('i', rows["offsets"])
+        self._exit_directions = array.array('i', rows["exit_directions"])
+        self._exit_targets = array.array('i', rows["exit_targets"])
+
+    # Where location objects come from (they may be created lazily)
+    def SetMap(self, location_map):
+        self._map = location_map
+        self._locations = [None] * len(self._location_names)
+
+    # IDs & names
+    def GetLocationId(self, location_name):
+        return self._location_ids.get(location_name, -1)
+
+    def GetLocationName(self, location_id):
+        return self._location_names[location_id]
+
+    def GetLocationNames(self):
+        return self._location_names
+
+    def GetItemId(self, item_name):
+        return self._item_ids.get(item_name, -1)
+
+    def GetItemName(self, item_id):
+        return self._item_names[item_id]
+
+    def GetLocation(self, location_id):
+        location = self._locations[location_id]
+        if location is None:
+            location = self._map[self._location_names[location_id]]
+            self._locations[location_id] = location
+        return location
+
+    # The exits of a location, as (direction, target ID) pairs
+    def GetExits(self, location_id):
+        exits = []
+        for index in range(self._offsets[location_id], self._offsets[location_id + 1]):
+            exits.append((self._directions[self._exit_directions[index]], self._exit_targets[index]))
+        return exits
+
+    # Where a direction leads from a location, or -1 if nowhere
+    def Move(self, location_id, direction):
+        direction_id = self._direction_ids.get(direction)
+        if direction_id is None:
+            return -1
+        try:
+            index = self._exit_directions.index(direction_id, self._offsets[location_id], self._offsets[location_id + 1])
+        except ValueError:
+            return -1
+        return self._exit_targets[index]
+
+    # The IDs of every location that can be reached from a location, also
+    # through any extra exits (e.g. blocked exits once they've been opened)
+    def FindReachable(self, start_id, extra_exits=None):
+        reached = bytearray(len(self._location_names))
+        reached[start_id] = 1
+        frontier = [start_id]
+        while len(frontier) > 0:
+            location_id = frontier.pop()
+            targets = list(self._exit_targets[self._offsets[location_id]:self._offsets[location_id + 1]])
+            if extra_exits is not None:
+                targets.extend(extra_exits.get(location_id, ()))
+            for target_id in targets:
+                if target_id >= 0 and not reached[target_id]:
+                    reached[target_id] = 1
+                    frontier.append(target_id)
+        return reached
+
+# The world definition, loaded from the JSON files. It is shared read-only
+# by every game, which only copies the things it changes.
+class World(object):
+    def __init__(self, fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_verbs=FN_VERBS):
         # Initialize
-        self._alive = True
         self._parser = Parser()
-        self._items = {}
+        self._items = ItemRegistry()
         self._map = {}
+        self._start_location = None
+        self._path_index = None
+        self._graph = WorldGraph()
+        self._description_cache = DescriptionCache(DS_SHARED_CACHE_SIZE)
+
+        # Names defined more than once, found while loading
+        self._duplicates = []
+
+        # Verbs, plus the extra ones the world data defines & what they act like
+        self._verbs = CreateVerbRegistry()
+        self._verb_synonyms = {}
+        for verb in self._verbs.GetVerbs():
+            self._parser.AddVerb(verb)
+
+        # Create the game map, Items & verbs (unless we're loading a snapshot)
+        if fn_locations is not None:
+            self.CreateMap(fn_locations)
+        if fn_items is not None:
+            self.CreateItems(fn_items)
+        if fn_verbs is not None:
+            self.CreateVerbs(fn_verbs)
+
+        # Number everything, then check it all makes sense before anyone plays
+        if fn_locations is not None or fn_items is not None:
+            self._graph.Build(self._map, self._items)
+            for location_name in self._map:
+                location = self._map[location_name]
+                location.SetLocationId(self._graph.GetLocationId(location_name))
+            problems = self.Validate()
+            if len(problems) > 0:
+                raise ValueError("Invalid world data:\n" + "\n".join(problems))
+
+    # Save the whole world as plain data, for a world snapshot
+    def ToRows(self):
+        return {
+            'locations': {location_name: json.dumps(self._map[location_name].ToDict()) for location_name in self._map},
+            'start_location': self._start_location.GetLocationName(),
+            'items': self._items.ToRows(),
+            'verbs': self._parser.GetVerbs(),
+            'verb_synonyms': self._verb_synonyms,
+            'blocked_exit_names': self._parser.GetBlockedExitNames(),
+            'graph': self._graph.ToRows()
+        }
 
-        # Create the game map & Items
-        self.CreateMap()
-        self.CreateItems()
+    # Load a world saved by ToRows. Locations & items are only created when used.
+    def LoadRows(self, rows):
+        self._graph.LoadRows(rows["graph"])
+        self._map = LazyMap(rows["locations"], self.MakeLocation)
+        self._graph.SetMap(self._map)
+        self._start_location = self._map[rows["start_location"]]
+        self._items.LoadRows(rows["items"])
+
+        # Teach the parser our words
+        for verb in rows["verbs"]:
+            self._parser.AddVerb(verb)
+        for item_name in rows["items"]["items"]:
+            self._parser.AddItemName(item_name)
+        for blocked_exit_name in rows["blocked_exit_names"]:
+            self._parser.AddBlockedExitName(blocked_exit_name)
+        for verb in rows["verb_synonyms"]:
+            self.AddVerbSynonym(verb, rows["verb_synonyms"][verb])
+        for location_name in rows["locations"]:
+            self._parser.AddLocationName(location_name)
+
+    # A location as saved JSON, for comparing worlds
+    def GetLocationRow(self, location_name):
+        if isinstance(self._map, LazyMap):
+            return self._map.GetRow(location_name)
+        return json.dumps(self._map[location_name].ToDict())
+
+    # Create a location from its saved JSON
+    def MakeLocation(self, row):
+        location = Location.FromDict(json.loads(row))
+        location.SetLocationId(self._graph.GetLocationId(location.GetLocationName()))
+        return location
+
+    # Getters
+    def GetParser(self):
+        return self._parser
+
+    def GetItems(self):
+        return self._items
+
+    def GetMap(self):
+        return self._map
 
-    def CreateItems(self):
+    def GetStartLocation(self):
+        return self._start_location
+
+    def GetVerbs(self):
+        return self._verbs
+
+    def GetGraph(self):
+        return self._graph
+
+    # Swap in another item registry (e.g. an ItemTable's), before any games start
+    def SetItems(self, items):
+        self._items = items
+        self._description_cache.Clear()
+
+    # Routes around the world as it starts, shared by every game that hasn't changed any exits
+    def GetPathIndex(self):
+        if self._path_index is None:
+            self._path_index = PathIndex(self._map)
+        return self._path_index
+
+    # Descriptions of locations as they start, shared by every game that hasn't changed them
+    def GetDescriptionCache(self):
+        return self._description_cache
+
+    # Add a verb to this world only. The handler is called as handler(game, command).
+    def AddVerb(self, verb, handler, takes_all=False):
+        self._verbs.AddVerb(verb, handler, takes_all)
+        self._parser.AddVerb(verb)
+
+    # Make a verb act like another, e.g. "smash" like "hit"
+    def AddVerbSynonym(self, synonym, verb):
+        # Don't replace a verb that already does something
+        if synonym not in self._verbs:
+            self._verbs.AddSynonym(synonym, verb)
+            self._verb_synonyms[synonym] = verb
+        self._parser.AddVerb(synonym)
+
+    # Check the world makes sense. Returns a list of every problem found.
+    def Validate(self):
+        problems = list(self._duplicates)
+        graph = self._graph
+
+        # Need somewhere to start
+        if self._start_location is None:
+            problems.append("There is no start location")
+
+        # Exits must lead somewhere
+        opened_exits = {}
+        for location_id, location_name in enumerate(graph.GetLocationNames()):
+            for direction, target_id in graph.GetExits(location_id):
+                if target_id < 0:
+                    target_name = self._map[location_name].GetExits()[direction]
+                    problems.append(f"{location_name} exit {direction} leads to unknown location {target_name}")
+
+            # Including the ones behind blocked exits
+            exits = self._map[location_name].GetBlockedExit().get("exits", {})
+            for direction in exits:
+                target_id = graph.GetLocationId(exits[direction])
+                if target_id < 0:
+                    problems.append(f"{location_name} blocked exit {direction} leads to unknown location {exits[direction]}")
+                else:
+                    opened_exits.setdefault(location_id, []).append(target_id)
+
+        # Everywhere must be reachable from the start, once blocked exits are opened
+        if self._start_location is not None:
+            reached = graph.FindReachable(graph.GetLocationId(self._start_location.GetLocationName()), opened_exits)
+            for location_id, location_name in enumerate(graph.GetLocationNames()):
+                if not reached[location_id]:
+                    problems.append(f"{location_name} can't be reached from the start location")
+
+        for item_name in self._items:
+            item = self._items[item_name]
+
+            # Items must be somewhere
+            location_name = item.GetLocationName()
+            if location_name != L_CARRIED and graph.GetLocationId(location_name) < 0 and graph.GetItemId(location_name) < 0:
+                problems.append(f"{item_name} is at unknown location {location_name}")
+            elif graph.GetItemId(location_name) >= 0 and not self._items[location_name].GetContainer():
+                problems.append(f"{item_name} is inside {location_name}, which isn't a container")
+
+            # And need a real item to unlock them
+            requires_to_unlock = item.GetRequiresToUnlock()
+            if requires_to_unlock != "" and graph.GetItemId(requires_to_unlock) < 0:
+                problems.append(f"{item_name} requires unknown item {requires_to_unlock} to unlock")
+            elif requires_to_unlock == "" and item.GetLocked():
+                problems.append(f"{item_name} is locked but nothing unlocks it")
+
+        # Containers can't end up inside themselves. Walk up from each item,
+        # marking the way (1) and what's been checked (2), so each is only walked once.
+        marks = bytearray(len(self._items))
+        for item_name in self._items:
+            path = []
+            item_id = graph.GetItemId(item_name)
+            while item_id >= 0 and marks[item_id] == 0:
+                marks[item_id] = 1
+                path.append(item_id)
+                item_id = graph.GetItemId(self._items[graph.GetItemName(item_id)].GetLocationName())
+            if item_id >= 0 and marks[item_id] == 1:
+                problems.append(f"{graph.GetItemName(item_id)} is inside itself")
+            for path_id in path:
+                marks[path_id] = 2
+
+        return problems
+
+    def CreateItems(self, fn_items=FN_ITEMS):
         # Read the locations from the JSON file
-        with open(FN_ITEMS, 'r') as json_file:
+        with open(fn_items, 'r') as json_file:
             items_list = json.load(json_file)
 
         # Create items from the loaded location dicts
         for item_dict in items_list:
+            # Seen it before?
+            if item_dict["name"] in self._items:
+                self._duplicates.append(f"Item {item_dict['name']} is defined more than once")
+
             # Create the item object
-            item = Item()
-
-            # Populate it
-            item.SetItemName(item_dict["name"])
-            item.SetDescription(item_dict["description"])
-            item.SetWeight(item_dict["weight"])
-            item.SetLocationName(item_dict["location_name"])
-            item.SetGetable(item_dict["getable"])
-            item.SetContainer(item_dict["container"])
-            item.SetOpen(item_dict["open"])
-            item.SetLocked(item_dict["locked"])
-            item.SetRequiresToUnlock(item_dict["requires_to_unlock"])
+            item = Item.FromDict(item_dict)
 
             # Add item
-            self._items[item_dict["name"]] = item
+            self._items.AddItem(item)
             self._parser.AddItemName(item_dict["name"])
 
-    def CreateMap(self):
+    def CreateMap(self, fn_locations=FN_LOCATIONS):
         # Read the locations from the JSON file
-        with open(FN_LOCATIONS, 'r') as json_file:
+        with open(fn_locations, 'r') as json_file:
             locations_list = json.load(json_file)
 
         # Create map from the loaded location dicts
         for location_dict in locations_list:
-            # Create the location object
-            location = Location(location_dict["name"], location_dict["description"])
-            
-            # Get start_location flag
-            location.SetStartLocation(location_dict["start_location"])
+            # Seen it before?
+            if location_dict["name"] in self._map:
+                self._duplicates.append(f"Location {location_dict['name']} is defined more than once")
 
-            # Any exits
-            if "exits" in location_dict: 
-                # Yep, so add them
-                exits_dict = location_dict["exits"]
-                for exit_name in exits_dict:
-                    location.AddExit(exit_name, exits_dict[exit_name])
+            # Create the location object
+            location = Location.FromDict(location_dict)
 
             # Is there a blocked exit for this location?
             if "blocked_exit" in location_dict:
-                # Yep, add it
+                # Yep, tell the parser about it
                 blocked_exit_dict = location_dict["blocked_exit"]                
-                location.SetBlockedExit(blocked_exit_dict)
 
                 # Add blocked exit name to parser
                 self._parser.AddBlockedExitName(blocked_exit_dict["name"])
 
-                # Add blocked exit verbs to parser
+                # Add blocked exit verbs, which all hit it
                 if "verbs" in blocked_exit_dict:
                     for verb in blocked_exit_dict["verbs"]:
-                        self._parser.AddVerb(verb)               
+                        self.AddVerbSynonym(verb, "hit")
 
             # Is this the start location?
             if location.GetStartLocation():
-                self._location = location
+                self._start_location = location
 
             # Add the location to the map
             self._map[location_dict["name"]] = location     
+            self._parser.AddLocationName(location_dict["name"])
+
+    def CreateVerbs(self, fn_verbs=FN_VERBS):
+        # The verbs file is optional
+        if not os.path.exists(fn_verbs):
+            return
+
+        # Read the verbs from the JSON file. Each new verb names the verb it acts like.
+        with open(fn_verbs, 'r') as json_file:
+            verbs_dict = json.load(json_file)
+
+        for verb in verbs_dict:
+            if verbs_dict[verb] not in self._verbs:
+                raise ValueError(f"Verb {verb} acts like unknown verb {verbs_dict[verb]}")
+            self.AddVerbSynonym(verb, verbs_dict[verb])
+
+# Describe a world source file, so we can tell later if it has changed. Optional
+# files that don't exist are described as None.
+def GetSourceInfo(fn):
+    if not os.path.exists(fn):
+        return None
+    stat = os.stat(fn)
+    with open(fn, 'rb') as source_file:
+        sha256 = hashlib.sha256(source_file.read()).hexdigest()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256}
+
+# Has a source file changed since it was described?
+def IsSourceChanged(fn, source_info):
+    # Missing before? Then it's changed if it's there now
+    if source_info is None:
+        return os.path.exists(fn)
+
+    # Same time & size? Then assume it's the same
+    stat = os.stat(fn)
+    if stat.st_mtime_ns == source_info["mtime_ns"] and stat.st_size == source_info["size"]:
+        return False
+
+    # Nope, so check the contents really changed
+    return GetSourceInfo(fn)["sha256"] != source_info["sha256"]
+
+# Build a world from the JSON files, validate it & save it as a snapshot
+def CompileWorld(fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_snapshot=FN_SNAPSHOT, fn_verbs=FN_VERBS):
+    # Build & check the world
+    try:
+        world = World(fn_locations, fn_items, fn_verbs)
+    except KeyError as error:
+        raise ValueError(f"World data is missing the {error} attribute")
+
+    # Record what it was built from. Marshal data is only good for the Python that wrote it.
+    metadata = json.dumps({
+        "python": sys.hexversion,
+        "sources": {
+            "locations": GetSourceInfo(fn_locations),
+            "items": GetSourceInfo(fn_items),
+            "verbs": GetSourceInfo(fn_verbs)
+        }
+    }).encode()
+
+    # Write it to a temporary file, then swap it in, so readers never see half a snapshot
+    fn_temp = f"{fn_snapshot}.{os.getpid()}.tmp"
+    with open(fn_temp, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(metadata)))
+        snapshot_file.write(metadata)
+        marshal.dump(world.ToRows(), snapshot_file)
+    os.replace(fn_temp, fn_snapshot)
+
+    return world
+
+# Load a world from a snapshot. Returns None if the snapshot is missing, was
+# written by a different version, or is older than the JSON files.
+def ReadSnapshot(fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_snapshot=FN_SNAPSHOT, fn_verbs=FN_VERBS):
+    try:
+        with open(fn_snapshot, 'rb') as snapshot_file:
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+                # Check the header
+                if len(snapshot) < SNAPSHOT_HEADER.size:
+                    return None
+                magic, version, metadata_size = SNAPSHOT_HEADER.unpack_from(snapshot)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    return None
+
+                # Still up to date?
+                offset = SNAPSHOT_HEADER.size
+                metadata = json.loads(snapshot[offset:offset + metadata_size])
+                if metadata["python"] != sys.hexversion:
+                    return None
+                sources = metadata["sources"]
+                if IsSourceChanged(fn_locations, sources["locations"]) or IsSourceChanged(fn_items, sources["items"]):
+                    return None
+                if IsSourceChanged(fn_verbs, sources["verbs"]):
+                    return None
+
+                # Yep, load the world straight from the mapped file
+                with memoryview(snapshot) as view:
+                    rows = marshal.loads(view[offset + metadata_size:])
+    except (OSError, ValueError, KeyError, EOFError, TypeError):
+        # Missing or damaged, so it'll need rebuilding
+        return None
+
+    world = World(None, None, None)
+    world.LoadRows(rows)
+    return world
+
+# Load a world, using the snapshot if it is up to date & rebuilding it if not
+def LoadWorld(fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_snapshot=FN_SNAPSHOT, fn_verbs=FN_VERBS):
+    start = time.perf_counter()
+    source = "snapshot"
+    world = ReadSnapshot(fn_locations, fn_items, fn_snapshot, fn_verbs)
+    if world is None:
+        source = "json"
+        try:
+            world = CompileWorld(fn_locations, fn_items, fn_snapshot, fn_verbs)
+        except OSError:
+            # Can't write the snapshot, just use the JSON
+            world = World(fn_locations, fn_items, fn_verbs)
+
+    # Measured?
+    if _metrics is not None:
+        _metrics.Observe("world_load", source, time.perf_counter() - start)
+    return world
+
+# Work out what changed between two saved game states. Entries that went
+# back to how the world started are None.
+def DiffState(old_state, new_state):
+    delta = {}
+    if new_state["location"] != old_state["location"]:
+        delta["location"] = new_state["location"]
+
+    for key in ["items", "locations"]:
+        old = old_state[key]
+        new = new_state[key]
+        changed = {name: new[name] for name in new if old.get(name) != new[name]}
+        for name in old:
+            if name not in new:
+                changed[name] = None
+        if len(changed) > 0:
+            delta[key] = changed
+
+    return delta
+
+# Apply a delta from DiffState to a saved game state, giving a new state
+def ApplyStateDelta(state, delta):
+    new_state = {
+        'v': state["v"],
+        'location': delta.get("location", state["location"]),
+        'items': dict(state["items"]),
+        'locations': dict(state["locations"])
+    }
+
+    for key in ["items", "locations"]:
+        changed = delta.get(key, {})
+        for name in changed:
+            if changed[name] is None:
+                new_state[key].pop(name, None)
+            else:
+                new_state[key][name] = changed[name]
+
+    return new_state
+
+# The default world, loaded the first time a game needs it
+_default_world = None
+
+def GetDefaultWorld():
+    global _default_world
+    if _default_world is None:
+        _default_world = LoadWorld()
+    return _default_world
+
+# Make new games use another world, e.g. after reloading the files
+def SetDefaultWorld(world):
+    global _default_world
+    _default_world = world
+
+# "a", "a and b", "a, b and c"
+def JoinNames(names):
+    if len(names) == 1:
+        return names[0]
+    return ", ".join(names[:-1]) + " and " + names[-1]
+
+# This is the main game object!
+class Game(object):
+    def __init__(self, world=None, sink=None):
+        # Share the default world unless we're given one
+        if world is None:
+            world = GetDefaultWorld()
+
+        # Send output to the console unless we're told otherwise
+        if sink is None:
+            sink = StdoutSink()
+        self._sink = sink
+
+        # Initialize
+        self._alive = True
+        self._world = world
+        self._parser = world.GetParser()
+        self._verbs = world.GetVerbs()
+
+        # Our own layer over the world, holding only what we change
+        self._items = ItemRegistry(world.GetItems())
+        self._changed_locations = {}
+        self._changed_location_ids = {}
+        self._map = collections.ChainMap(self._changed_locations, world.GetMap())
+        self._graph = world.GetGraph()
+
+        # Rendered descriptions of the locations we've changed (made when
+        # first needed), and how many times each has been changed
+        self._descriptions = None
+        self._location_versions = {}
+
+        # Start at the start
+        self._location = world.GetStartLocation()
+        self._command_count = 0
+
+        # Our own routes, once we've changed any exits
+        self._exits_version = 0
+        self._path_index = None
+
+        # Measure what we do, if instrumentation is on
+        if _metrics is not None:
+            _metrics.Instrument(self)
+
+    # Call when exits have been added or removed
+    def ExitsChanged(self):
+        self._exits_version += 1
+        self._path_index = None
+
+    # Get the routes around the world as we see it
+    def GetPathIndex(self):
+        # Same exits as the world? Then share its routes
+        if self._exits_version == 0:
+            return self._world.GetPathIndex()
+
+        # Nope, use our own, searching no further than the world's does
+        if self._path_index is None:
+            self._path_index = PathIndex(self._map, max_visited=self._world.GetPathIndex().GetMaxVisited())
+        return self._path_index
+
+    # Get the current location, ready to be changed
+    def GetMutableLocation(self):
+        location_name = self._location.GetLocationName()
+        if location_name not in self._changed_locations:
+            # Copy on write
+            self._location = self._location.Copy()
+            self._changed_locations[location_name] = self._location
+            self._changed_location_ids[self._location.GetLocationId()] = self._location
+        return self._location
 
     # Move in a valid direction
     def Go(self, command):
         # Assume the object is the direction
         if command.obj is not None:
-            # Yep, try and move in that direction
-            new_location_name = self._location.Move(command.obj)
-            if new_location_name is not None:
-                self._location = self._map[new_location_name]
+            # Going to a place, rather than in a direction?
+            if not self._parser.IsDirection(command.obj) and self._parser.IsLocation(command.obj):
+                # Yep
+                self.Travel(command)
             else:
-                # Not a valid direction
-                print(f"You can't {command.verb} {command.obj}!")
+                # Nope, try and move in that direction. Unless we've changed the
+                # exits here, follow them by ID.
+                location_id = self._location.GetLocationId()
+                if self._graph is not None and location_id >= 0 and location_id not in self._changed_location_ids:
+                    new_location_id = self._graph.Move(location_id, command.obj)
+                    if new_location_id >= 0:
+                        new_location = self._changed_location_ids.get(new_location_id)
+                        if new_location is None:
+                            new_location = self._graph.GetLocation(new_location_id)
+                        self._location = new_location
+                    else:
+                        # Not a valid direction
+                        self._sink.Print(f"You can't {command.verb} {command.obj}!")
+                else:
+                    new_location_name = self._location.Move(command.obj)
+                    if new_location_name is not None:
+                        self._location = self._map[new_location_name]
+                    else:
+                        # Not a valid direction
+                        self._sink.Print(f"You can't {command.verb} {command.obj}!")
         else:
             # No obj specified
-            print(f"Sorry, I don't understand where you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand where you want to {command.verb}...")
+
+    # Go all the way to a location, by the shortest route
+    def Travel(self, command):
+        place = command.obj.replace("_", " ")
+        route = self.GetPathIndex().FindRoute(self._location.GetLocationName(), command.obj)
+        if route is None:
+            # Can't get there from here
+            self._sink.Print(f"You can't find a way to {place} from here!")
+        elif len(route) == 0:
+            # Already there
+            self._sink.Print(f"You are already at {place}!")
+        else:
+            # Off we go
+            self._location = self._map[command.obj]
+            if len(route) <= T_MAX_LISTED_STEPS:
+                self._sink.Print(f"You {command.verb} {', '.join(route)} to {place}.")
+            else:
+                self._sink.Print(f"You {command.verb} {len(route)} steps to {place}.")
 
     # Get an item
     def Get(self, command):
+        # Everything?
+        if command.obj is not None and self._parser.IsAll(command.obj):
+            self.GetAll(command)
         # Did we get a valid object name?
-        if command.obj is not None:
+        elif command.obj is not None:
             # Yep, are we trying to get a valid item?
             if self._parser.IsItem(command.obj):
                 item = self._items[command.obj]
-                if item.GetLocationName() == self._location.GetLocationName():
+                if item.GetLocationName() != L_CARRIED and self.IsReachable(item) and self.IsIn(item, command.target):
                     # Yep, present. Now, is it getable?
                     if item.GetGetable():
-                        item.SetLocationName(L_CARRIED)
-                        print(f"You {command.verb} the {command.obj}")
+                        self._items.GetMutableItem(command.obj).SetLocationName(L_CARRIED)
+                        self._sink.Print(f"You {command.verb} the {command.obj}")
                     else:
                         # Item not gettable
-                        print(f"You can't {command.verb} the {command.obj}...")
+                        self._sink.Print(f"You can't {command.verb} the {command.obj}...")
                 else:
                     # Item not present
-                    print(f"I don't see the {command.obj} here!")
+                    self._sink.Print(f"I don't see the {command.obj} here!")
             else:
                 # Not an item
-                print(f"You can't {command.verb} the {command.obj}...")
+                self._sink.Print(f"You can't {command.verb} the {command.obj}...")
         else:
             # No valid obj
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
+
+    # Get everything here, or everything in a container, in one go
+    def GetAll(self, command):
+        if command.target is not None:
+            # From a container. Is it here & open?
+            container = self._items.GetItem(command.target)
+            if container is None or not self.IsReachable(container):
+                self._sink.Print(f"I don't see the {command.target} here!")
+                return
+            if not container.GetContainer():
+                self._sink.Print(f"There's nothing in the {command.target}!")
+                return
+            if not container.GetOpen():
+                self._sink.Print(f"The {command.target} is closed.")
+                return
+            inside = self._items.GetContents(command.target)
+        else:
+            inside = self._items.GetItemsAt(self._location.GetLocationName())
+
+        # Take everything that can be taken
+        taken = []
+        left = []
+        for item_name in inside:
+            if self._items[item_name].GetGetable():
+                taken.append(item_name)
+            else:
+                left.append(item_name)
+        self._items.MoveItems(taken, L_CARRIED)
+
+        # Tell them what happened, all at once
+        if len(taken) > 0:
+            self._sink.Print(f"You {command.verb} the {JoinNames(taken)}.", end="")
+            if len(left) > 0:
+                self._sink.Print(f" You can't {command.verb} the {JoinNames(left)}.", end="")
+            self._sink.Print()
+        elif len(left) > 0:
+            self._sink.Print(f"You can't {command.verb} the {JoinNames(left)}...")
+        elif command.target is not None:
+            self._sink.Print(f"There's nothing in the {command.target}!")
+        else:
+            self._sink.Print(f"There's nothing here to {command.verb}!")
+
+    # Drop everything we're carrying in one go
+    def DropAll(self, command):
+        carried = self.GetCarriedItems()
+        if len(carried) > 0:
+            self._items.MoveItems(carried, self._location.GetLocationName())
+            self._sink.Print(f"You {command.verb} the {JoinNames(carried)}.")
+        else:
+            self._sink.Print("You are not carrying anything!")
 
     # Drop an item
     def Drop(self, command):
+        # Everything?
+        if command.obj is not None and self._parser.IsAll(command.obj):
+            self.DropAll(command)
         # Do we have a valid object
-        if command.obj is not None:
+        elif command.obj is not None:
             # Yep, is it a valid item?
             if command.obj in self._items:
                 # Yep, 
@@ -407,16 +1837,16 @@ class Game(object):
                 # Are we carrying it?
                 if item.GetLocationName() == L_CARRIED:
                     # Yep, so set the item's locstion to the current location
-                    item.SetLocationName(self._location.GetLocationName())
+                    self._items.GetMutableItem(command.obj).SetLocationName(self._location.GetLocationName())
                 else:
                     # Item not carried
-                    print(f"You are not carrying the {command.obj}!")
+                    self._sink.Print(f"You are not carrying the {command.obj}!")
             else:
                 # Not a valid item
-                print(f"You can't {command.verb} the {command.obj}...")
+                self._sink.Print(f"You can't {command.verb} the {command.obj}...")
         else:
             # No valid obj
-            print(f"Sorry, I don't understand what you want to {command.verb} ...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb} ...")
 
     # Examine an item
     def Examine(self, command):
@@ -426,81 +1856,88 @@ class Game(object):
             if self._parser.IsItem(command.obj):
                 # It's an item
                 item = self._items[command.obj]
-                if item.GetLocationName() == self._location.GetLocationName() or item.GetLocationName() == L_CARRIED:
+                if self.IsReachable(item):
                     # Yep, print the longer description
-                    print(f"You {command.verb} the {command.obj}, and see: {item.GetDescription()}")
+                    self._sink.Print(f"You {command.verb} the {command.obj}, and see: {item.GetDescription()}")
                 else:
                     # Nope, not here
-                    print(f"I don't see a {command.obj} anywhere!")
+                    self._sink.Print(f"I don't see a {command.obj} anywhere!")
             # Is it a direction?
             elif self._parser.IsDirection(command.obj):
                 # Yep, strange request, but you never know
-                print(f"You want to {command.verb} {command.obj}? Weird ...")
+                self._sink.Print(f"You want to {command.verb} {command.obj}? Weird ...")
             else:
                 # Fallback feedback
-                print(f"You {command.verb} the {command.obj} but don't see extra details...")
+                self._sink.Print(f"You {command.verb} the {command.obj} but don't see extra details...")
         else:
             # No valid obj
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
+
+    # Can the player see & reach an item? It must be here or carried, and
+    # not inside anything closed.
+    def IsReachable(self, item):
+        location_name = self._items.GetReachableLocation(item)
+        return location_name == self._location.GetLocationName() or location_name == L_CARRIED
+
+    # Is an item somewhere inside a container (at any depth)? Anywhere will do
+    # if there's no container.
+    def IsIn(self, item, container_name):
+        if container_name is None:
+            return True
+        location_name = item.GetLocationName()
+        while location_name in self._items:
+            if location_name == container_name:
+                return True
+            location_name = self._items[location_name].GetLocationName()
+        return False
 
     def GetCarriedItems(self):
         # Build list of all the items we are carrying
-        carried = []
-        for item_name in self._items:
-            if self._items[item_name].GetLocationName() == L_CARRIED:
-                carried.append(item_name)
+        return self._items.GetItemsAt(L_CARRIED)
 
-        # Return the list
-        return carried
-
-    def Inventory(self):
+    def Inventory(self, command=None):
         # Build list of all the items we are carrying
         carried = self.GetCarriedItems()
 
         # Tell the player what they are carrying
         if len(carried) > 0:
-            print("You are carrying:", end=" ")
+            self._sink.Print("You are carrying:", end=" ")
             for item_name in carried:
-                print(f"{item_name}", end=" ")
+                self._sink.Print(f"{item_name}", end=" ")
         else:
-            print("You are not carrying anything!")
+            self._sink.Print("You are not carrying anything!")
 
     def OpenItem(self, command):
         # Get a handle to the requested item
         item = self._items[command.obj]
 
         # Is the item here?
-        if item.GetLocationName() == self._location.GetLocationName() or item.GetLocationName() == L_CARRIED:
+        if self.IsReachable(item):
             # Is it a container?
             if item.GetContainer():
                 # Is it locked?
                 if not item.GetLocked():
-                    # Nope, Get all the stuff out
-                    inside = []
-                    for item_name in self._items:
-                        if self._items[item_name].GetLocationName() == item.GetItemName():
-                            # Set new item location to current location & mark as open
-                            self._items[item_name].SetLocationName(self._location.GetLocationName())
-                            inside.append(item_name)
-                
+                    # Nope. What's inside stays inside, but can now be seen & reached
+                    inside = self._items.GetContents(item.GetItemName())
+
                     # Mark item as open and update player
-                    self._items[command.obj].SetOpen(True) 
-                    print(f"You {command.verb} the {command.obj}.")
+                    self._items.GetMutableItem(command.obj).SetOpen(True)
+                    self._sink.Print(f"You {command.verb} the {command.obj}.")
             
                     # Tell player what was inside
-                    print(f"Inside the {command.obj} you find: ", end=" ")
+                    self._sink.Print(f"Inside the {command.obj} you find: ", end=" ")
                     for item_name in inside:
-                        print(f"{item_name}", end=" ")
-                    print()
+                        self._sink.Print(f"{item_name}", end=" ")
+                    self._sink.Print()
                 else:
                     # Item already locked
-                    print(f"You can't {command.verb} the {command.obj}. It is locked.")
+                    self._sink.Print(f"You can't {command.verb} the {command.obj}. It is locked.")
             else:
                 # Item not a container
-                print(f"You can't {command.verb} the {command.obj}!")
+                self._sink.Print(f"You can't {command.verb} the {command.obj}!")
         else:
             # Item not here
-            print(f"I don't see a {command.obj} anywhere!")
+            self._sink.Print(f"I don't see a {command.obj} anywhere!")
 
     def Open(self, command):
         # Did we get a valid object name?
@@ -511,10 +1948,10 @@ class Game(object):
                 self.OpenItem(command)
             else:
                 # Nope can't open that
-                print(f"You can't {command.verb} the {command.obj}...")
+                self._sink.Print(f"You can't {command.verb} the {command.obj}...")
         else:
             # Nope,
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
 
     def Close(self, command):
         # Did we get a valid object name?
@@ -525,66 +1962,73 @@ class Game(object):
                 item = self._items[command.obj]
 
                 # Is the item present?
-                if item.GetLocationName() == self._location.GetLocationName() or item.GetLocationName() == L_CARRIED:
+                if self.IsReachable(item):
                     # Yep, is it a container?
                     if item.GetContainer():
                         # Is it open?
                         if item.GetOpen():
-                            item.SetOpen(False)
-                            print(f"You {command.verb} the {command.obj}")
+                            self._items.GetMutableItem(command.obj).SetOpen(False)
+                            self._sink.Print(f"You {command.verb} the {command.obj}")
                         else:
                             # Closed already
-                            print(f"The {command.obj} is already closed.")
+                            self._sink.Print(f"The {command.obj} is already closed.")
                     else:
                         # Not a container
-                        print(f"You can't {command.verb} the {command.obj}!")
+                        self._sink.Print(f"You can't {command.verb} the {command.obj}!")
                 else:
                     # Not here
-                    print(f"I don't see a {command.obj} anywhere!")
+                    self._sink.Print(f"I don't see a {command.obj} anywhere!")
             else:
                 # Not an item
-                print(f"You can't {command.verb} a {command.obj}")
+                self._sink.Print(f"You can't {command.verb} a {command.obj}")
         else:
             # Unknown object,
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
 
     def Lock(self, command):
         # Did we get a valid object name?
         if command.obj is not None:
+            # Yep, is it an item?
+            if not self._parser.IsItem(command.obj):
+                self._sink.Print(f"You can't {command.verb} the {command.obj}...")
+                return
+
             # Yep, get the item
             item = self._items[command.obj]
 
             # Is the item present?
-            if item.GetLocationName() == self._location.GetLocationName() or item.GetLocationName() == L_CARRIED:
+            if self.IsReachable(item):
                 # Yep, is it a container?
                 if item.GetContainer():
                     # Is it open?
                     if not item.GetOpen():
                         # Is the target item here?
-                        target_item = self._items[command.target]
-                        if target_item.GetLocationName() == self._location.GetLocationName() or target_item.GetLocationName() == L_CARRIED:
+                        if command.target is None:
+                            # No target specified
+                            self._sink.Print(f"Sorry, I don't understand. What do you want to use to {command.verb} the {command.obj}?")
+                        elif self._parser.IsItem(command.target) and self.IsReachable(self._items[command.target]):
                             # is the target the right item to unlock the item?
                             if item.GetRequiresToUnlock() == command.target:
                                 # Yep. Lock!
-                                item.SetLocked(True)
-                                print(f"You {command.verb} the {command.obj}")
+                                self._items.GetMutableItem(command.obj).SetLocked(True)
+                                self._sink.Print(f"You {command.verb} the {command.obj}")
                             else:
-                                print(f"You can't {command.verb} the {command.obj} with the {command.target}")
+                                self._sink.Print(f"You can't {command.verb} the {command.obj} with the {command.target}")
                         else:
                             # Target not here
-                            print(f"I don't see a {command.target} here ...")
+                            self._sink.Print(f"I don't see a {command.target} here ...")
                     else:
                         # Can't lock while open
-                        print(f"You can't {command.verb} the {command.obj} while it is open.")
+                        self._sink.Print(f"You can't {command.verb} the {command.obj} while it is open.")
                 else:
                     # Not a container
-                    print(f"You can't {command.verb} the {command.obj}!")
+                    self._sink.Print(f"You can't {command.verb} the {command.obj}!")
             else:
                 # Item not here
-                print(f"I don't see a {command.obj} anywhere!")
+                self._sink.Print(f"I don't see a {command.obj} anywhere!")
         else:
             # No valid object
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
 
     def Unlock(self, command):
         # Did we get a valid object name?
@@ -593,49 +2037,87 @@ class Game(object):
             if command.target is not None:
                 # Yep, valid prep?
                 if command.prep == "with" or command.prep == "using":
+                    # Is it an item?
+                    if not self._parser.IsItem(command.obj):
+                        self._sink.Print(f"You can't {command.verb} the {command.obj}...")
+                        return
                     item = self._items[command.obj]
 
                     # Is the item here?
-                    if item.GetLocationName() == self._location.GetLocationName() or item.GetLocationName() == L_CARRIED:
+                    if self.IsReachable(item):
                         # Is it a container?
                         if item.GetContainer():
                             # Yep. Is it locked?
                             if item.GetLocked():
                                 # Is the target item here?
-                                target_item = self._items[command.target]
-                                if target_item.GetLocationName() == self._location.GetLocationName() or target_item.GetLocationName() == L_CARRIED:
+                                if self._parser.IsItem(command.target) and self.IsReachable(self._items[command.target]):
                                     # is the target the right item to unlock the item?
                                     if item.GetRequiresToUnlock() == command.target:
                                         # Yep, so unlock
-                                        item.SetLocked(False)
-                                        print(f"You {command.verb} the {command.obj}.")
+                                        self._items.GetMutableItem(command.obj).SetLocked(False)
+                                        self._sink.Print(f"You {command.verb} the {command.obj}.")
                                     else:
                                         # Wrong item to unlock
-                                        print(f"You can't {command.verb} the {command.obj} with the {command.target}...")
+                                        self._sink.Print(f"You can't {command.verb} the {command.obj} with the {command.target}...")
                                 else:
                                     # Target item not here
-                                    print(f"I don't see a {command.target} anywhere!")
+                                    self._sink.Print(f"I don't see a {command.target} anywhere!")
                             else:
                                 # Item already unlocked
-                                print(f"You can't {command.verb} a {command.verb}ed {command.obj}..")
+                                self._sink.Print(f"You can't {command.verb} a {command.verb}ed {command.obj}..")
                         else:
                             # Not a container
-                            print(f"You can't {command.verb} the {command.obj}!")
+                            self._sink.Print(f"You can't {command.verb} the {command.obj}!")
                     else:
                         # Item to be unlocked is not here
-                        print(f"I don't see a {command.obj} anywhere!")
+                        self._sink.Print(f"I don't see a {command.obj} anywhere!")
                 else:
-                    print(f"Sorry, how do you want to {command.verb} the {command.obj}?")
+                    self._sink.Print(f"Sorry, how do you want to {command.verb} the {command.obj}?")
             else:
                 # No target specified
-                print(f"Sorry, I don't understand. What do you want to use to {command.verb} the {command.obj}?")
+                self._sink.Print(f"Sorry, I don't understand. What do you want to use to {command.verb} the {command.obj}?")
+        else:
+            # No valid obj
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.obj}...")
+
+    # Put an item inside a container
+    def Put(self, command):
+        # Did we get a valid object name?
+        if command.obj is not None and self._parser.IsItem(command.obj):
+            # Yep, into something?
+            if command.target is not None and self._parser.IsItem(command.target):
+                item = self._items[command.obj]
+                container = self._items[command.target]
+
+                # Are they both here?
+                if not self.IsReachable(item):
+                    self._sink.Print(f"I don't see the {command.obj} here!")
+                elif not self.IsReachable(container):
+                    self._sink.Print(f"I don't see the {command.target} here!")
+                # Can it go in?
+                elif not container.GetContainer():
+                    self._sink.Print(f"You can't {command.verb} anything in the {command.target}!")
+                elif not container.GetOpen():
+                    self._sink.Print(f"The {command.target} is closed.")
+                elif not item.GetGetable():
+                    self._sink.Print(f"You can't move the {command.obj}...")
+                elif command.obj == command.target or self.IsIn(container, command.obj):
+                    # It would end up inside itself
+                    self._sink.Print(f"You can't {command.verb} the {command.obj} inside itself!")
+                else:
+                    # Yep
+                    self._items.GetMutableItem(command.obj).SetLocationName(command.target)
+                    self._sink.Print(f"You {command.verb} the {command.obj} in the {command.target}.")
+            else:
+                # Nowhere to put it
+                self._sink.Print(f"Sorry, what do you want to {command.verb} the {command.obj} in?")
         else:
             # No valid obj
-            print(f"Sorry, I don't understand what you want to {command.obj}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
 
     def HitItem(self, command):
         # Just do this for now
-        print(f"You {command.verb} the {command.obj}. That was a waste of time, nothing happened.")
+        self._sink.Print(f"You {command.verb} the {command.obj}. That was a waste of time, nothing happened.")
         
     def HitBlockedExit(self, command):
         # Is the exit the player is trying to hit even here?
@@ -645,26 +2127,32 @@ class Game(object):
             if command.prep == "with" or command.prep == "using":
                 # Is the player using the right item?
                 if command.target == blocked_exit_dict["target"]:
-                    # Yep. Add new exits
+                    # Yep. Get our own copy of the location to change
+                    location = self.GetMutableLocation()
+                    blocked_exit_dict = location.GetBlockedExit()
+
+                    # Add new exits
                     exits = blocked_exit_dict["exits"]
                     for direction in exits:
-                        self._location.AddExit(direction, exits[direction])
+                        location.AddExit(direction, exits[direction])
+                    self.ExitsChanged()
 
                     # Update blocked exit description
                     blocked_exit_dict["desc"] = blocked_exit_dict["alt_desc"]
+                    self.LocationChanged(location.GetLocationName())
 
                     # Update player
                     effect = blocked_exit_dict["effect"]
-                    print(f"You {command.verb} the {command.obj} using the {command.target}. {effect}")
+                    self._sink.Print(f"You {command.verb} the {command.obj} using the {command.target}. {effect}")
                 else:
                     # Incorrect target specified to unblock
-                    print(f"You {command.verb} the {command.obj}. It has no effect.")
+                    self._sink.Print(f"You {command.verb} the {command.obj}. It has no effect.")
             else:
                 # Invalid prep specified
-                print(f"Sorry, how do you want to {command.verb} the {command.obj}?")
+                self._sink.Print(f"Sorry, how do you want to {command.verb} the {command.obj}?")
         else:
             # Blocked exit not here
-            print(f"I don't see a {command.obj} here for you to {command.verb}...")
+            self._sink.Print(f"I don't see a {command.obj} here for you to {command.verb}...")
 
     def Hit(self, command):
         # Did we get a valid object name?
@@ -677,55 +2165,246 @@ class Game(object):
                 self.HitBlockedExit(command)
             else:
                 # Not an item or a blocked exit
-                print(f"You want to {command.verb} what? That makes no sense")
+                self._sink.Print(f"You want to {command.verb} what? That makes no sense")
         else:
             # No valid obj specified
-            print(f"Sorry, I don't understand what you want to {command.verb}...")
+            self._sink.Print(f"Sorry, I don't understand what you want to {command.verb}...")
 
 
     def DoCommand(self, command):
-        # Essential verbs
-        if command.verb == "go":
-            self.Go(command)
-        elif command.verb == "get":
-            self.Get(command)
-        elif command.verb == "drop":
-            self.Drop(command)
-        elif command.verb == "examine":
-            self.Examine(command)
-        elif command.verb == "inventory":
-            self.Inventory()
-        # Verbs that operate on items, exits, or Non Player Characters(NPCs)
-        if command.verb == 'hit' or command.verb == "break":
-            self.Hit(command)
-        elif command.verb == "open":
-            self.Open(command)
-        elif command.verb == "close":
-            self.Close(command)
-        elif command.verb == "lock":
-            self.Lock(command)
-        elif command.verb == "unlock":
-            self.Unlock(command)
+        # Look up the verb's handler & call it
+        handler = self._verbs.GetHandler(command.verb)
+        if handler is not None:
+            # Everything at once only makes sense for some verbs
+            if command.obj is not None and self._parser.IsAll(command.obj) and not self._verbs.TakesAll(command.verb):
+                self._sink.Print(f"Sorry, you can't {command.verb} everything at once.")
+            else:
+                handler(self, command)
 
     def DescribeLocation(self):
-            # Describe the location
-            self._location.Describe()
-
-            # Make a list of all the items that are in our current location
-            here = []
-            for item_name in self._items:
-                item = self._items[item_name]
-                if item.GetLocationName() == self._location.GetLocationName():
-                    here.append(item_name)
-
-            if len(here) > 0:
-                # Show list of items here
-                print("You can see the following items here:", end=" ")
-                for item_name in here:
-                    print(item_name, end=" ")
-                print()
-            else:
-                print("There is nothing here.")
+        location_name = self._location.GetLocationName()
+        location_version = self._location_versions.get(location_name, 0)
+        items_version = self._items.GetVersion(location_name)
+
+        # Just as it is in the world? Then every game can share the description.
+        if location_version == 0 and items_version == 0 and location_name not in self._changed_locations:
+            cache = self._world.GetDescriptionCache()
+            key = location_name
+        else:
+            # Nope, use our own, which is out of date as soon as a version goes up
+            if self._descriptions is None:
+                self._descriptions = DescriptionCache(DS_CACHE_SIZE)
+            cache = self._descriptions
+            key = (location_name, location_version, items_version)
+
+        text = cache.Get(key)
+        if text is None:
+            text = self.RenderLocation()
+            cache.Put(key, text)
+        self._sink.Write(text)
+
+    # The description of where we are, without using the caches
+    def RenderLocation(self):
+        sink = OutputSink()
+
+        # Describe the location
+        self._location.Describe(sink)
+
+        # Make a list of all the items that can be seen in our current location
+        here = self._items.GetVisibleAt(self._location.GetLocationName())
+
+        if len(here) > 0:
+            # Show list of items here
+            sink.Print("You can see the following items here:", end=" ")
+            for item_name in here:
+                sink.Print(item_name, end=" ")
+            sink.Print()
+        else:
+            sink.Print("There is nothing here.")
+        return sink.GetPending()
+
+    # Call after changing how a location looks (not what's in it, the item
+    # registry keeps track of that)
+    def LocationChanged(self, location_name):
+        self._location_versions[location_name] = self._location_versions.get(location_name, 0) + 1
+
+    # Is the player still playing?
+    def IsAlive(self):
+        return self._alive
+
+    # Where the player is
+    def GetLocation(self):
+        return self._location
+
+    def GetItems(self):
+        return self._items
+
+    def GetMap(self):
+        return self._map
+
+    def GetWorld(self):
+        return self._world
+
+    # How much this game holds of its own: (changed items, changed locations, cached descriptions)
+    def GetSizes(self):
+        descriptions = 0 if self._descriptions is None else len(self._descriptions)
+        return self._items.GetChangedCount(), len(self._changed_locations), descriptions
+
+    # Carry on in another world, e.g. after reloading the files. The state
+    # must make sense in the new world (see Reload.MigrateState).
+    def SetWorld(self, world, state):
+        # Parsing timed? (see Metrics.Instrument)
+        timed = _metrics is not None and self._parser is not self._world.GetParser()
+        self._world = world
+        self._parser = world.GetParser()
+        if timed:
+            _metrics.InstrumentParser(self)
+        self._verbs = world.GetVerbs()
+        self._graph = world.GetGraph()
+        self._map = collections.ChainMap(self._changed_locations, world.GetMap())
+        self.SetState(state)
+
+    def GetSink(self):
+        return self._sink
+
+    def SetSink(self, sink):
+        self._sink = sink
+
+    def GetParser(self):
+        return self._parser
+
+    def SetParser(self, parser):
+        self._parser = parser
+
+    # How many lines of input we've handled, to tell if anything could have changed
+    def GetCommandCount(self):
+        return self._command_count
+
+    def SetCommandCount(self, command_count):
+        self._command_count = command_count
+
+    # Get what has changed from the starting world, as plain data:
+    #   location:  where the player is
+    #   items:     {item name: [location name, open, locked]} for changed items
+    #   locations: {location name: {"exits": {direction: location name}, "desc": blocked exit description}}
+    def GetState(self):
+        # Changed items
+        base_items = self._world.GetItems()
+        items = {}
+        for item_name in self._items.GetChangedNames():
+            item = self._items[item_name]
+            base_item = base_items[item_name]
+            values = [item.GetLocationName(), item.GetOpen(), item.GetLocked()]
+            if values != [base_item.GetLocationName(), base_item.GetOpen(), base_item.GetLocked()]:
+                items[item_name] = values
+
+        # Changed locations
+        base_map = self._world.GetMap()
+        locations = {}
+        for location_name in self._changed_locations:
+            location = self._changed_locations[location_name]
+            base_location = base_map[location_name]
+            changes = {}
+
+            # New exits
+            base_exits = base_location.GetExits()
+            exits = location.GetExits()
+            new_exits = {direction: exits[direction] for direction in exits if base_exits.get(direction) != exits[direction]}
+            if len(new_exits) > 0:
+                changes["exits"] = new_exits
+
+            # New blocked exit description
+            desc = location.GetBlockedExit().get("desc")
+            if desc != base_location.GetBlockedExit().get("desc"):
+                changes["desc"] = desc
+
+            if len(changes) > 0:
+                locations[location_name] = changes
+
+        return {
+            'v': SAVE_VERSION,
+            'location': self._location.GetLocationName(),
+            'items': items,
+            'locations': locations
+        }
+
+    # Put the game back into a state from GetState
+    def SetState(self, state):
+        if state.get("v") != SAVE_VERSION:
+            raise ValueError(f"Can't restore saved game version {state.get('v')}")
+
+        # Back to the starting world
+        self._items = ItemRegistry(self._world.GetItems())
+        self._changed_locations.clear()
+        self._changed_location_ids.clear()
+        self._descriptions = None
+        self._location_versions.clear()
+
+        # Change the items
+        for item_name in state["items"]:
+            location_name, open, locked = state["items"][item_name]
+            item = self._items.GetMutableItem(item_name)
+            item.SetLocationName(location_name)
+            item.SetOpen(open)
+            item.SetLocked(locked)
+
+        # Change the locations
+        for location_name in state["locations"]:
+            changes = state["locations"][location_name]
+            location = self._map[location_name].Copy()
+            exits = changes.get("exits", {})
+            for direction in exits:
+                location.AddExit(direction, exits[direction])
+            if "desc" in changes:
+                location.GetBlockedExit()["desc"] = changes["desc"]
+            self._changed_locations[location_name] = location
+            self._changed_location_ids[location.GetLocationId()] = location
+
+        # Routes may have changed
+        self._exits_version = 0
+        self._path_index = None
+        for location_name in state["locations"]:
+            if "exits" in state["locations"][location_name]:
+                self.ExitsChanged()
+                break
+
+        # And put the player back
+        self._location = self._map[state["location"]]
+        self._alive = True
+
+    # Save & load the game to a file
+    def Save(self, fn):
+        with open(fn, 'w') as save_file:
+            json.dump(self.GetState(), save_file, separators=(',', ':'))
+
+    def Load(self, fn):
+        with open(fn, 'r') as save_file:
+            self.SetState(json.load(save_file))
+
+    # Handle a single line of player input. Returns the command it was understood as.
+    def ProcessInput(self, user_input):
+        # What do they want to do?
+        command = self._parser.ParseInput(user_input)
+        self.ProcessCommand(command)
+        return command
+
+    # Handle a command that has already been parsed
+    def ProcessCommand(self, command):
+        self._command_count += 1
+
+        # Valid command
+        if command.verb == None:
+            self._sink.Print("Sorry, I don't understand what you said ...")
+        elif command.verb == "quit":
+            self._sink.Print("You'll be back!")
+            self._alive = False
+        else:
+            self.DoCommand(command)
+
+    # Do a command again, e.g. from a journal
+    def Replay(self, command):
+        self._command_count += 1
+        self.DoCommand(command)
 
     # Main run method
     def Run(self):
@@ -733,14 +2412,11 @@ class Game(object):
             # Tell the player where they are and what is there
             self.DescribeLocation()
 
+            # Everything for this turn goes out in one go
+            self._sink.Flush()
+
             # What do they want to do?
-            command = self._parser.ParseInput(input("What next? "))
-
-            # Valid command
-            if command.verb == None:
-                print("Sorry, I don't understand what you said ...")
-            elif command.verb == "quit":
-                print("You'll be back!")
-                self._alive = False
-            else:
-                self.DoCommand(command)
+            self.ProcessInput(input("What next? "))
+
+        # Say goodbye
+        self._sink.Flush()
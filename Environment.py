@@ -0,0 +1,199 @@
+# A headless way to play games, for training & evaluating automated players.
+# No input() or print(), each step takes a command and gives back what the
+# player would have seen:
+#
+#   env = GameEnv()
+#   observation = env.Reset()
+#   observation, reward, done, info = env.Step("get bottle")
+#
+# VecEnv steps a batch of independent games in lockstep. Each different
+# command in a batch is parsed once, and the games share the world's rendered
+# location descriptions. Very big batches can be split over worker processes.
+#
+# A reward hook is called as reward(game, command, observation) after every
+# step and returns a number. With worker processes it must be picklable, e.g.
+# a function defined at the top level of a module.
+
+# Imports
+import multiprocessing
+from Adventure import *
+
+# Constants - default limit on steps before a game counts as done (None for no limit)
+E_MAX_STEPS = None
+
+# Game output kept until it's taken as an observation
+class ObservationSink(OutputSink):
+    def Take(self):
+        text = "".join(self._parts)
+        self._parts = []
+        return text
+
+# One game, stepped a command at a time
+class GameEnv(object):
+    def __init__(self, world=None, reward=None, max_steps=E_MAX_STEPS):
+        if world is None:
+            world = GetDefaultWorld()
+        self._world = world
+        self._parser = world.GetParser()
+        self._reward = reward
+        self._max_steps = max_steps
+        self._sink = ObservationSink()
+        self._game = None
+        self._steps = 0
+
+    def GetGame(self):
+        return self._game
+
+    def GetParser(self):
+        return self._parser
+
+    # Start a new game (from a saved state, if given), returning the first observation
+    def Reset(self, state=None):
+        self._game = Game(self._world, self._sink)
+        if state is not None:
+            self._game.SetState(state)
+        self._steps = 0
+        self._game.DescribeLocation()
+        return self._sink.Take()
+
+    # Do one command, returning (observation, reward, done, info). The command
+    # can be given already parsed, to save parsing it again.
+    def Step(self, user_input, command=None):
+        if command is None:
+            command = self._parser.ParseInput(user_input)
+        game = self._game
+        game.ProcessCommand(command)
+        self._steps += 1
+
+        # What they see, as they would in a terminal
+        if game.IsAlive():
+            game.DescribeLocation()
+        observation = self._sink.Take()
+
+        reward = 0.0
+        if self._reward is not None:
+            reward = self._reward(game, command, observation)
+
+        # Finished, or out of time?
+        truncated = self._max_steps is not None and self._steps >= self._max_steps
+        done = not game.IsAlive() or truncated
+        info = {
+            'steps': self._steps,
+            'location': game.GetLocation().GetLocationName(),
+            'truncated': truncated
+        }
+        return observation, reward, done, info
+
+# Many games, stepped together. Games that finish start again straight away;
+# the last thing they saw is in their info as "final_observation".
+class VecEnv(object):
+    def __init__(self, count, world=None, reward=None, max_steps=E_MAX_STEPS, processes=0):
+        self._count = count
+        self._envs = []
+        self._workers = []
+
+        if processes > 1 and count > 1:
+            # Split the games over worker processes, as evenly as possible
+            processes = min(processes, count)
+            context = multiprocessing.get_context()
+            for index in range(processes):
+                shard_count = count // processes + (1 if index < count % processes else 0)
+                connection, worker_connection = context.Pipe()
+                process = context.Process(target=RunVecEnvWorker, args=(worker_connection, shard_count, world, reward, max_steps), daemon=True)
+                process.start()
+                worker_connection.close()
+                self._workers.append((process, connection, shard_count))
+        else:
+            self._envs = [GameEnv(world, reward, max_steps) for index in range(count)]
+
+    def __len__(self):
+        return self._count
+
+    def GetEnvs(self):
+        return self._envs
+
+    # Start every game again, returning their first observations
+    def Reset(self):
+        if len(self._workers) > 0:
+            for process, connection, shard_count in self._workers:
+                connection.send(("reset", None))
+            observations = []
+            for process, connection, shard_count in self._workers:
+                observations.extend(connection.recv())
+            return observations
+        return [env.Reset() for env in self._envs]
+
+    # Do a command in every game, returning lists of observations, rewards,
+    # done flags & infos
+    def Step(self, user_inputs):
+        if len(user_inputs) != self._count:
+            raise ValueError(f"Need {self._count} commands, got {len(user_inputs)}")
+
+        if len(self._workers) > 0:
+            return self.StepWorkers(user_inputs)
+
+        # Parse each different command once
+        parser = self._envs[0].GetParser() if self._count > 0 else None
+        commands = {}
+        for user_input in user_inputs:
+            if user_input not in commands:
+                commands[user_input] = parser.ParseInput(user_input)
+
+        observations = []
+        rewards = []
+        dones = []
+        infos = []
+        for env, user_input in zip(self._envs, user_inputs):
+            observation, reward, done, info = env.Step(user_input, commands[user_input])
+            if done:
+                # Start again
+                info["final_observation"] = observation
+                observation = env.Reset()
+            observations.append(observation)
+            rewards.append(reward)
+            dones.append(done)
+            infos.append(info)
+        return observations, rewards, dones, infos
+
+    # Send each worker its share of the commands, then gather the results in order
+    def StepWorkers(self, user_inputs):
+        start = 0
+        for process, connection, shard_count in self._workers:
+            connection.send(("step", user_inputs[start:start + shard_count]))
+            start += shard_count
+
+        observations = []
+        rewards = []
+        dones = []
+        infos = []
+        for process, connection, shard_count in self._workers:
+            shard_observations, shard_rewards, shard_dones, shard_infos = connection.recv()
+            observations.extend(shard_observations)
+            rewards.extend(shard_rewards)
+            dones.extend(shard_dones)
+            infos.extend(shard_infos)
+        return observations, rewards, dones, infos
+
+    # Stop the worker processes, if any
+    def Close(self):
+        for process, connection, shard_count in self._workers:
+            connection.send(("close", None))
+            connection.close()
+            process.join()
+        self._workers = []
+
+# A worker process's share of a VecEnv
+def RunVecEnvWorker(connection, count, world, reward, max_steps):
+    envs = VecEnv(count, world, reward, max_steps)
+    while True:
+        try:
+            request, argument = connection.recv()
+        except EOFError:
+            break
+        if request == "reset":
+            connection.send(envs.Reset())
+        elif request == "step":
+            connection.send(envs.Step(argument))
+        else:
+            break
+    connection.close()
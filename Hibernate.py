@@ -0,0 +1,277 @@
+# Puts idle players' games to sleep on disk, to keep memory use down, and
+# wakes them again on their next command.
+#
+# Hibernating a game keeps only its saved state (what's changed from the
+# starting world) & command count, marshalled into one record in a scratch
+# file, and lets the Game go. Waking it reads the record back with a single
+# pread and restores the state into a new Game. The file is only for players
+# who are still connected, so it starts empty every time; the journal is
+# what keeps games safe across restarts.
+#
+# Games are kept in memory in least recently used order. Every tick, games
+# idle for longer than the timeout are hibernated, then the least recently
+# used idle ones until the games in memory fit the budget. Memory is
+# estimated from what each game holds of its own (see Game.GetSizes), as
+# measuring it exactly would cost more than hibernating saves.
+#
+# A hibernating session only needs GetGame(), SetGame(game), GetSink() &
+# IsIdle() (see Server.Session).
+#
+# With a reloader, games wake up in its newest world. Hibernated games aren't
+# moved when the world is reloaded (that would mean reading every one), so
+# each remembers how many reloads there had been when it went to sleep, and
+# one that slept through a reload has its state moved over as it wakes.
+
+# Imports
+import collections
+import marshal
+import os
+import time
+import zlib
+from Adventure import *
+from Metrics import Histogram
+from Reload import MigrateState, UnknownDiff
+
+# Constants - defaults: seconds idle before hibernating, no memory budget,
+# and seconds between ticks
+HB_IDLE_TIMEOUT = 300.0
+HB_MEMORY_BUDGET = None
+HB_TICK = 0.5
+
+# Constants - estimated bytes for a game, and for each thing it has of its own
+HB_GAME_BYTES = 1024
+HB_ITEM_BYTES = 512
+HB_LOCATION_BYTES = 1024
+HB_DESCRIPTION_BYTES = 768
+
+# Constants - records bigger than this are compressed, and the file is
+# compacted once it's this many times bigger than the records still in it
+HB_COMPRESS_OVER = 256
+HB_COMPACT_RATIO = 4
+HB_COMPACT_MIN = 1 << 20
+
+# Constants - first byte of each record
+HB_PLAIN = b"m"
+HB_COMPRESSED = b"z"
+
+# Roughly how much memory a game takes
+def EstimateGameBytes(game):
+    items, locations, descriptions = game.GetSizes()
+    return HB_GAME_BYTES + items * HB_ITEM_BYTES + locations * HB_LOCATION_BYTES + descriptions * HB_DESCRIPTION_BYTES
+
+# A game's state as a record, and back
+def EncodeGame(game):
+    data = marshal.dumps((game.GetCommandCount(), game.GetState()))
+    if len(data) > HB_COMPRESS_OVER:
+        return HB_COMPRESSED + zlib.compress(data, 1)
+    return HB_PLAIN + data
+
+def DecodeGame(record):
+    data = record[1:]
+    if record[:1] == HB_COMPRESSED:
+        data = zlib.decompress(data)
+    return marshal.loads(data)
+
+# Records in one scratch file, found by key. Space from records that have
+# been read back is reclaimed by compacting.
+class HibernationStore(object):
+    def __init__(self, fn, compact_ratio=HB_COMPACT_RATIO):
+        self._fn = fn
+        self._compact_ratio = compact_ratio
+        self._fd = os.open(fn, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+
+        # key -> (offset, size), and where the next record goes
+        self._index = {}
+        self._end = 0
+        self._live = 0
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def Put(self, key, record):
+        self.Discard(key)
+        os.pwrite(self._fd, record, self._end)
+        self._index[key] = (self._end, len(record))
+        self._end += len(record)
+        self._live += len(record)
+
+    # Read a record back & forget it
+    def Take(self, key):
+        offset, size = self._index.pop(key)
+        self._live -= size
+        return os.pread(self._fd, size, offset)
+
+    def Discard(self, key):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._live -= entry[1]
+
+    def GetSize(self):
+        return self._end
+
+    # Rewrite the file with just the records still in it, if it's grown too big
+    def CompactIfLong(self):
+        if self._end > HB_COMPACT_MIN and self._end > self._live * self._compact_ratio:
+            self.Compact()
+
+    def Compact(self):
+        fn_temp = f"{self._fn}.{os.getpid()}.tmp"
+        fd = os.open(fn_temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        index = {}
+        end = 0
+        for key, (offset, size) in sorted(self._index.items(), key=lambda entry: entry[1][0]):
+            os.pwrite(fd, os.pread(self._fd, size, offset), end)
+            index[key] = (end, size)
+            end += size
+        os.replace(fn_temp, self._fn)
+        os.close(self._fd)
+        self._fd = fd
+        self._index = index
+        self._end = end
+
+    def Close(self):
+        os.close(self._fd)
+        os.remove(self._fn)
+
+# Decides which sessions' games to keep in memory, and hibernates the rest
+class Hibernator(object):
+    def __init__(self, fn, memory_budget=HB_MEMORY_BUDGET, idle_timeout=HB_IDLE_TIMEOUT, reloader=None, world=None):
+        self._store = HibernationStore(fn)
+        self._memory_budget = memory_budget
+        self._idle_timeout = idle_timeout
+        self._reloader = reloader
+        self._world = world
+
+        # Sessions with their games in memory, least recently used first, as
+        # session -> (last active, estimated bytes)
+        self._resident = collections.OrderedDict()
+        self._resident_bytes = 0
+
+        # How many reloads there had been when each hibernated game went to sleep
+        self._reloads = {}
+
+        self._hibernations = 0
+        self._restores = Histogram()
+
+    # A new session, with its game in memory
+    def Add(self, session):
+        self.Active(session)
+
+    # A session has just done something, so it's the most recently used
+    def Active(self, session):
+        entry = self._resident.pop(session, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        estimate = EstimateGameBytes(session.GetGame())
+        self._resident[session] = (time.monotonic(), estimate)
+        self._resident_bytes += estimate
+
+    # A session has ended
+    def Remove(self, session):
+        entry = self._resident.pop(session, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        self._store.Discard(session)
+        self._reloads.pop(session, None)
+
+    def IsHibernating(self, session):
+        return session in self._store
+
+    # The world games wake up in, and how many times it's been reloaded
+    def GetWorld(self):
+        if self._reloader is not None:
+            return self._reloader.GetWorld()
+        if self._world is None:
+            self._world = GetDefaultWorld()
+        return self._world
+
+    def GetReloadCount(self):
+        if self._reloader is None:
+            return 0
+        return self._reloader.GetStats()["reloads"]
+
+    # Put a session's game to sleep
+    def Hibernate(self, session):
+        last_active, estimate = self._resident.pop(session)
+        self._resident_bytes -= estimate
+        game = session.GetGame()
+        if self._reloader is not None:
+            # Into the newest world first, if it's not there yet
+            self._reloader.Migrate(game)
+        self._store.Put(session, EncodeGame(game))
+        self._reloads[session] = self.GetReloadCount() if game.GetWorld() is self.GetWorld() else None
+        session.SetGame(None)
+        self._hibernations += 1
+
+    # Bring a session's game back, if it's hibernating. Returns True if it was.
+    def Wake(self, session):
+        if session not in self._store:
+            return False
+        start = time.perf_counter()
+        command_count, state = DecodeGame(self._store.Take(session))
+        world = self.GetWorld()
+        if self._reloads.pop(session) != self.GetReloadCount():
+            # Slept through a reload
+            state = MigrateState(state, UnknownDiff(world))
+        game = Game(world, session.GetSink())
+        game.SetState(state)
+        game.SetCommandCount(command_count)
+        session.SetGame(game)
+        self.Active(session)
+
+        elapsed = time.perf_counter() - start
+        self._restores.Observe(elapsed)
+        metrics = GetMetrics()
+        if metrics is not None:
+            metrics.Observe("restore", None, elapsed)
+        return True
+
+    # Hibernate games idle for too long, then more until memory's within budget
+    def Tick(self):
+        now = time.monotonic()
+        busy = []
+        while len(self._resident) > 0:
+            session, (last_active, estimate) = next(iter(self._resident.items()))
+            over_budget = self._memory_budget is not None and self._resident_bytes > self._memory_budget
+            if not over_budget and now - last_active < self._idle_timeout:
+                break
+            if session.IsIdle():
+                self.Hibernate(session)
+            else:
+                # In the middle of a turn, leave it be for now
+                busy.append((session, self._resident.pop(session)))
+
+        # Back at the front, in the same order
+        for session, entry in reversed(busy):
+            self._resident[session] = entry
+            self._resident.move_to_end(session, last=False)
+
+        self._store.CompactIfLong()
+        metrics = GetMetrics()
+        if metrics is not None:
+            for name, value in self.GetGauges().items():
+                metrics.SetGauge(name, value)
+
+    def GetGauges(self):
+        return {
+            'sessions_resident': len(self._resident),
+            'sessions_hibernated': len(self._store),
+            'resident_bytes_estimate': self._resident_bytes,
+            'hibernation_file_bytes': self._store.GetSize()
+        }
+
+    # Everything above, plus how many have hibernated & how long waking took
+    def GetStats(self):
+        stats = self.GetGauges()
+        stats['hibernations'] = self._hibernations
+        stats['restores'] = self._restores.GetCount()
+        stats['restore_mean_ms'] = self._restores.GetSum() / max(1, self._restores.GetCount()) * 1000
+        stats['restore_p99_ms'] = self._restores.GetPercentile(0.99) * 1000
+        stats['restore_max_ms'] = self._restores.GetMax() * 1000
+        return stats
+
+    def Close(self):
+        self._store.Close()
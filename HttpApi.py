@@ -0,0 +1,371 @@
+# A stateless HTTP JSON API, so any number of nodes behind a load balancer
+# can serve any player without sticky sessions. The server keeps nothing
+# between requests: the player's game travels with them as a state token,
+# sent with each command and handed back, updated, with its output.
+#
+#   POST /play  {"command": "get key", "token": "..."}
+#            -> {"output": "...", "token": "...", "moves": 3, "alive": true}
+#
+# Leave out the token (or send null) to start a new game, and the command to
+# just look around. Once the player quits the token comes back null.
+#
+# A token is the game's saved state (only what's changed from the starting
+# world, see Game.GetState) & command count as compact JSON, deflated with a
+# preset dictionary of the world's names so even tiny states shrink, then
+# signed with a keyed BLAKE2b MAC & base64url encoded. Every node must share
+# the key (--key-file or ADVENTURE_TOKEN_KEY) and the world. Tokens carry an
+# ID made from every location & item in the world, and one from a different
+# world (even one that only moved an item) is refused.
+#
+# As with a save file, nothing stops a player sending an older token again to
+# go back to an earlier point; a signed token only ever holds a state this
+# game really got to.
+#
+# The HTTP is just enough for JSON over keep-alive connections: requests need
+# a Content-Length, and chunked bodies aren't accepted.
+
+# Imports
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import traceback
+import zlib
+from Adventure import *
+from Environment import ObservationSink
+from Metrics import Metrics
+
+# Constants - server defaults
+HA_HOST = "127.0.0.1"
+HA_PORT = 8000
+HA_BACKLOG = 4096
+HA_PATH = "/play"
+
+# Constants - where the shared token key comes from, if not a file
+HA_KEY_ENV = "ADVENTURE_TOKEN_KEY"
+
+# Constants - token layout: version, world ID, MAC, then the deflated state
+HA_TOKEN_VERSION = b"\x01"
+HA_WORLD_ID_BYTES = 4
+HA_MAC_BYTES = 16
+HA_HEADER_BYTES = len(HA_TOKEN_VERSION) + HA_WORLD_ID_BYTES + HA_MAC_BYTES
+
+# Constants - deflate settings. A small window & hash table keep setting up
+# each compressor cheap, which matters far more than the last few bytes for
+# states this size; the preset dictionary must fit in the window.
+HA_LEVEL = 9
+HA_WBITS = -13
+HA_MEM_LEVEL = 4
+HA_DICT_BYTES = 1 << 13
+
+# Constants - limits on what's accepted
+HA_MAX_BODY = 1 << 16
+HA_MAX_STATE = 1 << 20
+HA_MAX_HEADERS = 100
+
+# Constants - HTTP statuses used
+HA_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    411: "Length Required",
+    413: "Payload Too Large",
+    500: "Internal Server Error"
+}
+
+# Bits of saved state that turn up in nearly every token, for the end of the
+# preset dictionary (where deflate finds them quickest)
+HA_DICT_TAIL = ',{},{}]' + ',false,false],' + ',true,false],' + ',false,true],' + f'["{L_CARRIED}"' + '{"exits":{"' + '"desc":'
+
+# A request or token that can't be used, with the HTTP status to say so
+class RequestError(ValueError):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self._status = status
+
+    def GetStatus(self):
+        return self._status
+
+# The preset dictionary for a world: its location & item names, then the
+# bits every state has. Only the last HA_DICT_BYTES are kept.
+def MakeStateDictionary(world):
+    names = list(world.GetMap()) + list(world.GetItems())
+    text = "".join(f'"{name}"' for name in names) + HA_DICT_TAIL
+    return text.encode()[-HA_DICT_BYTES:]
+
+# Identifies a world by everything in it, as saved states only make sense in
+# the world they were made in
+def MakeWorldId(world):
+    world_hash = hashlib.blake2b(digest_size=HA_WORLD_ID_BYTES)
+    for location_name in world.GetMap():
+        world_hash.update(world.GetLocationRow(location_name).encode() + b"\n")
+    items = world.GetItems()
+    for item_name in items:
+        world_hash.update(items.GetRow(item_name).encode() + b"\n")
+    return world_hash.digest()
+
+# Turns games into signed, compressed tokens and back
+class TokenCodec(object):
+    def __init__(self, world, key):
+        self._dictionary = MakeStateDictionary(world)
+        self._world_id = MakeWorldId(world)
+
+        # Any length of key will do
+        self._key = hashlib.blake2b(key, digest_size=32).digest()
+
+    def GetWorldId(self):
+        return self._world_id
+
+    def Sign(self, data):
+        return hashlib.blake2b(data, key=self._key, digest_size=HA_MAC_BYTES).digest()
+
+    def Encode(self, game):
+        state = game.GetState()
+        payload = json.dumps([game.GetCommandCount(), state["location"], state["items"], state["locations"]],
+                             separators=(',', ':')).encode()
+        compressor = zlib.compressobj(HA_LEVEL, zlib.DEFLATED, HA_WBITS, HA_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, self._dictionary)
+        deflated = compressor.compress(payload) + compressor.flush()
+        signed = HA_TOKEN_VERSION + self._world_id
+        token = signed + self.Sign(signed + deflated) + deflated
+        return base64.urlsafe_b64encode(token).rstrip(b"=").decode()
+
+    # Returns (command count, state), or raises RequestError
+    def Decode(self, token):
+        try:
+            token = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            raise RequestError(400, "That token isn't base64")
+        if len(token) < HA_HEADER_BYTES or token[:1] != HA_TOKEN_VERSION:
+            raise RequestError(400, "That isn't a version 1 token")
+
+        signed = token[:HA_HEADER_BYTES - HA_MAC_BYTES]
+        mac = token[HA_HEADER_BYTES - HA_MAC_BYTES:HA_HEADER_BYTES]
+        deflated = token[HA_HEADER_BYTES:]
+        if not hmac.compare_digest(mac, self.Sign(signed + deflated)):
+            raise RequestError(403, "That token has been tampered with, or was made with another key")
+        if signed[len(HA_TOKEN_VERSION):] != self._world_id:
+            raise RequestError(409, "That token is from another world, start a new game")
+
+        # Signed by us, so all that's left to go wrong is a token too big for us
+        decompressor = zlib.decompressobj(HA_WBITS, self._dictionary)
+        payload = decompressor.decompress(deflated, HA_MAX_STATE)
+        if not decompressor.eof:
+            raise RequestError(413, "That token holds too big a game")
+        command_count, location, items, locations = json.loads(payload)
+        return command_count, {'v': SAVE_VERSION, 'location': location, 'items': items, 'locations': locations}
+
+# Plays one command in a game from a token. One Game is reused for every
+# request, as SetState puts everything back.
+class TokenGame(object):
+    def __init__(self, world=None, key=None):
+        if world is None:
+            world = GetDefaultWorld()
+        if key is None:
+            key = GetKey()
+        self._codec = TokenCodec(world, key)
+        self._sink = ObservationSink()
+        self._game = Game(world, self._sink)
+        self._start_state = self._game.GetState()
+
+    def GetCodec(self):
+        return self._codec
+
+    # Returns the response for a token (None for a new game) & a command
+    # (None to just look around)
+    def Play(self, token, user_input):
+        game = self._game
+        if token is None:
+            game.SetState(self._start_state)
+            game.SetCommandCount(0)
+        else:
+            command_count, state = self._codec.Decode(token)
+            try:
+                game.SetState(state)
+            except (KeyError, ValueError, TypeError):
+                raise RequestError(409, "That token doesn't fit this world, start a new game")
+            game.SetCommandCount(command_count)
+
+        if user_input is not None:
+            game.ProcessInput(user_input)
+        if game.IsAlive():
+            game.DescribeLocation()
+            token = self._codec.Encode(game)
+        else:
+            token = None
+
+        return {
+            'output': self._sink.Take(),
+            'token': token,
+            'moves': game.GetCommandCount(),
+            'alive': game.IsAlive()
+        }
+
+    # The response for a request body, as (status, response)
+    def HandleBody(self, body):
+        try:
+            try:
+                request = json.loads(body)
+            except json.JSONDecodeError:
+                raise RequestError(400, "That isn't JSON")
+            if not isinstance(request, dict):
+                raise RequestError(400, "Send a JSON object")
+            token = request.get("token")
+            user_input = request.get("command")
+            if token is not None and not isinstance(token, str):
+                raise RequestError(400, "The token should be a string")
+            if user_input is not None and not isinstance(user_input, str):
+                raise RequestError(400, "The command should be a string")
+            return 200, self.Play(token, user_input)
+        except RequestError as error:
+            return error.GetStatus(), {'error': str(error)}
+        except Exception:
+            # A bug shouldn't cost the client an answer
+            traceback.print_exc()
+            return 500, {'error': "Sorry, something went wrong with that"}
+        finally:
+            # Nothing a failed request printed may reach the next one
+            self._sink.Take()
+
+# Read one request from a connection. Returns (method, path, headers, body),
+# or None if the client has gone.
+async def ReadRequest(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    words = line.decode("latin-1").split()
+    if len(words) != 3 or not words[2].startswith("HTTP/"):
+        raise RequestError(400, "That isn't an HTTP request")
+    method, path, version = words
+
+    headers = {'version': version}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) > HA_MAX_HEADERS:
+            raise RequestError(400, "Too many headers")
+        name, separator, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "transfer-encoding" in headers:
+        raise RequestError(411, "Send a Content-Length, not a chunked body")
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise RequestError(400, "That Content-Length isn't a number")
+    if int(length) > HA_MAX_BODY:
+        raise RequestError(413, "That request is too big")
+    body = await reader.readexactly(int(length))
+    return method, path.split("?")[0], headers, body
+
+# Will the client send another request on this connection?
+def IsKeepAlive(headers):
+    connection = headers.get("connection", "").lower()
+    if headers["version"] == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+def WriteResponse(writer, status, response, keep_alive, extra_headers=""):
+    body = json.dumps(response, separators=(',', ':')).encode()
+    head = (f"HTTP/1.1 {status} {HA_STATUS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Cache-Control: no-store\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"{extra_headers}\r\n")
+    writer.write(head.encode() + body)
+
+# Serves /play over HTTP, keeping nothing between requests
+class ApiServer(object):
+    def __init__(self, host=HA_HOST, port=HA_PORT, key=None, world=None):
+        self._host = host
+        self._port = port
+        self._token_game = TokenGame(world, key)
+        self._requests = 0
+
+    def GetRequestCount(self):
+        return self._requests
+
+    # The response to one request, as (status, response, extra headers)
+    def Handle(self, method, path, body):
+        if path != HA_PATH:
+            return 404, {'error': f"Try POST {HA_PATH}"}, ""
+        if method != "POST":
+            return 405, {'error': f"Try POST {HA_PATH}"}, "Allow: POST\r\n"
+        start = time.perf_counter()
+        status, response = self._token_game.HandleBody(body)
+        metrics = GetMetrics()
+        if metrics is not None:
+            metrics.Observe("request", str(status), time.perf_counter() - start)
+        return status, response, ""
+
+    # Called by asyncio for every new connection, which may send many requests
+    async def HandleConnection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await ReadRequest(reader)
+                except RequestError as error:
+                    WriteResponse(writer, error.GetStatus(), {'error': str(error)}, False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = IsKeepAlive(headers)
+                status, response, extra_headers = self.Handle(method, path, body)
+                self._requests += 1
+                WriteResponse(writer, status, response, keep_alive, extra_headers)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # Client dropped or sent something broken, nothing else to do
+            pass
+        finally:
+            writer.close()
+
+    async def Serve(self):
+        server = await asyncio.start_server(self.HandleConnection, self._host, self._port, backlog=HA_BACKLOG)
+        print(f"Adventure API listening on http://{self._host}:{self._port}{HA_PATH}")
+        if GetMetrics() is not None:
+            self._metrics_task = asyncio.create_task(GetMetrics().RunReports())
+        async with server:
+            await server.serve_forever()
+
+    def Run(self):
+        asyncio.run(self.Serve())
+
+# The key shared by every node: from a file, the environment, or made up for
+# this run (then only this server, until it stops, takes its own tokens)
+def GetKey(fn_key=None):
+    if fn_key is not None:
+        with open(fn_key, 'rb') as key_file:
+            return key_file.read().strip()
+    if os.environ.get(HA_KEY_ENV):
+        return os.environ[HA_KEY_ENV].encode()
+    print(f"No --key-file or {HA_KEY_ENV}, so tokens will only work on this server until it stops", file=sys.stderr)
+    return os.urandom(32)
+
+# Start the server
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the stateless Adventure HTTP API")
+    arg_parser.add_argument("--host", default=HA_HOST)
+    arg_parser.add_argument("--port", type=int, default=HA_PORT)
+    arg_parser.add_argument("--key-file", help=f"sign tokens with the key in this file (or set {HA_KEY_ENV}), the same on every node")
+    arg_parser.add_argument("--metrics", help="write Prometheus metrics to this file")
+    arg_parser.add_argument("--metrics-every", type=float, default=10.0, help="seconds between metrics reports")
+    arg_parser.add_argument("--metrics-text", action="store_true", help="also print a metrics table to stderr")
+    args = arg_parser.parse_args()
+
+    # Measure it all?
+    if args.metrics or args.metrics_text:
+        SetMetrics(Metrics(args.metrics, args.metrics_every, sys.stderr if args.metrics_text else None))
+
+    ApiServer(args.host, args.port, GetKey(args.key_file)).Run()
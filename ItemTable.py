@@ -0,0 +1,347 @@
+# An array-backed item store. Rather than one Item object per item, each
+# attribute is a column: location names are interned to integer IDs, weights
+# are an array of ints and getable/container/open/locked are bits packed into
+# one byte per item. Bulk questions ("what's at X", "how heavy is all this",
+# "which containers are open") are answered a whole column at a time, with
+# NumPy if it's installed, otherwise with the array module & itertools.
+#
+# Item objects are only made as views over a row, when something asks for one.
+# A world can switch to a table with UseItemTable(world).
+
+# Imports
+import array
+import bisect
+import itertools
+import json
+from Adventure import *
+
+# NumPy is optional, it only makes the bulk queries faster
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Constants - item flags, packed into one byte per item
+IT_GETABLE = 1
+IT_CONTAINER = 2
+IT_OPEN = 4
+IT_LOCKED = 8
+
+# A lightweight Item that reads & writes a row of an ItemTable
+class ItemView(Item):
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    # Copies (e.g. a game's copy-on-write) are ordinary items, so changing
+    # them never changes the shared table
+    def __copy__(self):
+        return Item.FromDict(self.ToDict())
+
+    def ToDict(self):
+        return self._table.GetItemDict(self._row)
+
+    def GetRow(self):
+        return self._row
+
+    # Getters & setters, straight to the columns
+    def SetLocked(self, locked):
+        self._table.SetFlag(self._row, IT_LOCKED, locked)
+
+    def GetLocked(self):
+        return self._table.GetFlag(self._row, IT_LOCKED)
+
+    def SetRequiresToUnlock(self, requires_to_unlock):
+        self._table.SetRequiresToUnlock(self._row, requires_to_unlock)
+
+    def GetRequiresToUnlock(self):
+        return self._table.GetRequiresToUnlock(self._row)
+
+    def SetDescription(self, description):
+        self._table.SetDescription(self._row, description)
+
+    def GetBaseDescription(self):
+        return self._table.GetDescription(self._row)
+
+    def SetOpen(self, open):
+        self._table.SetFlag(self._row, IT_OPEN, open)
+
+    def GetOpen(self):
+        return self._table.GetFlag(self._row, IT_OPEN)
+
+    def SetItemName(self, name):
+        raise TypeError("Items in an item table can't be renamed")
+
+    def GetItemName(self):
+        return self._table.GetItemName(self._row)
+
+    def SetWeight(self, weight):
+        self._table.SetWeight(self._row, weight)
+
+    def GetWeight(self):
+        return self._table.GetWeight(self._row)
+
+    def SetContainer(self, container):
+        self._table.SetFlag(self._row, IT_CONTAINER, container)
+
+    def GetContainer(self):
+        return self._table.GetFlag(self._row, IT_CONTAINER)
+
+    def SetGetable(self, getable):
+        self._table.SetFlag(self._row, IT_GETABLE, getable)
+
+    def GetGetable(self):
+        return self._table.GetFlag(self._row, IT_GETABLE)
+
+    def SetLocationName(self, location):
+        self._table.SetLocationName(self._row, location)
+
+    def GetLocationName(self):
+        return self._table.GetLocationName(self._row)
+
+# The items, as columns. Rows are numbered in load order.
+class ItemTable(object):
+    def __init__(self):
+        # Names, and the row of each name
+        self._names = []
+        self._rows = {}
+
+        # Interned strings (location names, descriptions, keys), by ID & by value
+        self._strings = []
+        self._string_ids = {}
+
+        # The columns
+        self._locations = array.array('i')
+        self._weights = array.array('i')
+        self._flags = bytearray()
+        self._descriptions = array.array('i')
+        self._requires_to_unlock = array.array('i')
+
+        # Rows sorted by location, for looking up what's at a location (see GetRowsAt)
+        self._location_order = None
+
+    def __len__(self):
+        return len(self._names)
+
+    # The ID for a string, adding it if it's new
+    def Intern(self, text):
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(text)
+            self._string_ids[text] = string_id
+        return string_id
+
+    # Add an item from its dict (as in items.json), returning its row
+    def AddItem(self, item_dict):
+        row = len(self._names)
+        self._names.append(item_dict["name"])
+        self._rows[item_dict["name"]] = row
+        self._locations.append(self.Intern(item_dict["location_name"]))
+        self._weights.append(item_dict["weight"])
+        self._flags.append((IT_GETABLE if item_dict["getable"] else 0) |
+                           (IT_CONTAINER if item_dict["container"] else 0) |
+                           (IT_OPEN if item_dict["open"] else 0) |
+                           (IT_LOCKED if item_dict["locked"] else 0))
+        self._descriptions.append(self.Intern(item_dict["description"]))
+        self._requires_to_unlock.append(self.Intern(item_dict["requires_to_unlock"]))
+        self._location_order = None
+        return row
+
+    # Row lookups
+    def GetRow(self, item_name):
+        return self._rows.get(item_name)
+
+    def GetRows(self):
+        return self._rows
+
+    def GetNames(self):
+        return self._names
+
+    def GetView(self, row):
+        return ItemView(self, row)
+
+    def GetItemDict(self, row):
+        return {
+            'name': self._names[row],
+            'description': self.GetDescription(row),
+            'weight': self._weights[row],
+            'location_name' : self.GetLocationName(row),
+            'getable' : self.GetFlag(row, IT_GETABLE),
+            'container' : self.GetFlag(row, IT_CONTAINER),
+            'open' : self.GetFlag(row, IT_OPEN),
+            'locked': self.GetFlag(row, IT_LOCKED),
+            'requires_to_unlock' : self.GetRequiresToUnlock(row)
+        }
+
+    # Getters & setters for one row
+    def GetItemName(self, row):
+        return self._names[row]
+
+    def GetFlag(self, row, flag):
+        return self._flags[row] & flag != 0
+
+    def SetFlag(self, row, flag, on):
+        if on:
+            self._flags[row] |= flag
+        else:
+            self._flags[row] &= ~flag
+
+    def GetWeight(self, row):
+        return self._weights[row]
+
+    def SetWeight(self, row, weight):
+        self._weights[row] = weight
+
+    def GetLocationName(self, row):
+        return self._strings[self._locations[row]]
+
+    def SetLocationName(self, row, location_name):
+        self._locations[row] = self.Intern(location_name)
+        self._location_order = None
+
+    def GetDescription(self, row):
+        return self._strings[self._descriptions[row]]
+
+    def SetDescription(self, row, description):
+        self._descriptions[row] = self.Intern(description)
+
+    def GetRequiresToUnlock(self, row):
+        return self._strings[self._requires_to_unlock[row]]
+
+    def SetRequiresToUnlock(self, row, requires_to_unlock):
+        self._requires_to_unlock[row] = self.Intern(requires_to_unlock)
+
+    # Bulk queries, a column at a time. These all return rows in load order.
+
+    # Every row at a location, by scanning the location column
+    def FindRowsAt(self, location_name):
+        location_id = self._string_ids.get(location_name)
+        if location_id is None:
+            return []
+        if numpy is not None:
+            locations = numpy.frombuffer(self._locations, dtype=numpy.intc)
+            return numpy.flatnonzero(locations == location_id).tolist()
+        return list(itertools.compress(range(len(self._locations)), map(location_id.__eq__, self._locations)))
+
+    # Every row at a location, from the location index (built the first time
+    # it's needed after anything has moved)
+    def GetRowsAt(self, location_name):
+        location_id = self._string_ids.get(location_name)
+        if location_id is None:
+            return []
+        order = self.GetLocationOrder()
+        key = self._locations.__getitem__
+        start = bisect.bisect_left(order, location_id, key=key)
+        end = bisect.bisect_right(order, location_id, lo=start, key=key)
+        return order[start:end].tolist()
+
+    # Row numbers sorted by location, then load order
+    def GetLocationOrder(self):
+        if self._location_order is None:
+            if numpy is not None:
+                locations = numpy.frombuffer(self._locations, dtype=numpy.intc)
+                order = numpy.argsort(locations, kind="stable").astype(numpy.intc)
+                self._location_order = array.array('i', order.tobytes())
+            else:
+                self._location_order = array.array('i', sorted(range(len(self._locations)), key=self._locations.__getitem__))
+        return self._location_order
+
+    # Every row with all of the given flags set
+    def FindRowsWithFlags(self, flags):
+        if numpy is not None:
+            column = numpy.frombuffer(self._flags, dtype=numpy.uint8)
+            return numpy.flatnonzero(column & flags == flags).tolist()
+
+        # Turn each flag byte into 1 if it matches, else 0, then pick those rows
+        matches = bytes(1 if value & flags == flags else 0 for value in range(256))
+        return list(itertools.compress(range(len(self._flags)), self._flags.translate(matches)))
+
+    def FindOpenContainers(self):
+        return self.FindRowsWithFlags(IT_CONTAINER | IT_OPEN)
+
+    # The total weight of everything at a location, e.g. L_CARRIED
+    def GetTotalWeightAt(self, location_name):
+        location_id = self._string_ids.get(location_name)
+        if location_id is None:
+            return 0
+        if numpy is not None:
+            locations = numpy.frombuffer(self._locations, dtype=numpy.intc)
+            weights = numpy.frombuffer(self._weights, dtype=numpy.intc)
+            return int(weights[locations == location_id].sum())
+        return sum(itertools.compress(self._weights, map(location_id.__eq__, self._locations)))
+
+    # Roughly how much memory the columns take, in bytes
+    def GetColumnBytes(self):
+        columns = [self._locations, self._weights, self._descriptions, self._requires_to_unlock]
+        return sum(column.itemsize * len(column) for column in columns) + len(self._flags)
+
+# Build a table from item dicts, which can be any iterable
+def BuildItemTable(item_dicts):
+    table = ItemTable()
+    for item_dict in item_dicts:
+        table.AddItem(item_dict)
+    return table
+
+# The base item registry of a world whose items are in a table. Games layer
+# their own registry over it as usual, and only the items they change become
+# full Item objects.
+class TableItemRegistry(ItemRegistry):
+    def __init__(self, table):
+        super().__init__()
+        self._table = table
+        self._order = table.GetRows()
+
+    def __getitem__(self, item_name):
+        row = self._table.GetRow(item_name)
+        if row is None:
+            raise KeyError(item_name)
+        return self._table.GetView(row)
+
+    def __contains__(self, item_name):
+        return self._table.GetRow(item_name) is not None
+
+    def __iter__(self):
+        return iter(self._table.GetNames())
+
+    def __len__(self):
+        return len(self._table)
+
+    def GetTable(self):
+        return self._table
+
+    def AddItem(self, item):
+        self._table.AddItem(item.ToDict())
+
+    def GetIndexedAt(self, location_name):
+        names = self._table.GetNames()
+        return [names[row] for row in self._table.GetRowsAt(location_name)]
+
+    def GetItemsAt(self, location_name):
+        # Already in load order
+        return self.GetIndexedAt(location_name)
+
+    def GetTotalWeightAt(self, location_name):
+        return self._table.GetTotalWeightAt(location_name)
+
+    def ToRows(self):
+        names = self._table.GetNames()
+        rows = {
+            'items': {item_name: json.dumps(self._table.GetItemDict(row)) for row, item_name in enumerate(names)},
+            'order': dict(self._order),
+            'by_location': {}
+        }
+        for row, item_name in enumerate(names):
+            rows["by_location"].setdefault(self._table.GetLocationName(row), []).append(item_name)
+        rows["by_location"] = {location_name: tuple(rows["by_location"][location_name]) for location_name in rows["by_location"]}
+        return rows
+
+    def CheckConsistency(self):
+        # The index is rebuilt from the columns, so it can't disagree with them
+        return []
+
+# Move a world's items into a table
+def UseItemTable(world):
+    items = world.GetItems()
+    world.SetItems(TableItemRegistry(BuildItemTable(items[item_name].ToDict() for item_name in items)))
+    return world.GetItems()
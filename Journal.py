@@ -0,0 +1,252 @@
+# Journals every command the sessions carry out, so their games survive the
+# server dying. All the sessions append to one file, and commands are written
+# out in groups: everything appended while the previous group was being synced
+# goes out together, with one write & one fsync (a group commit). Every so
+# often a session's whole state is written instead of its command, so recovery
+# only has to replay the commands since then through DoCommand.
+#
+# The file is JSON lines. The first line is a header, then each record is
+#   {"s": session id, "c": [verb, obj, prep, target]}   a command
+#   {"s": session id, "full": state, "n": count}        a session's whole state
+#   {"s": session id, "gone": true}                     the session ended
+
+# Imports
+import asyncio
+import json
+import os
+from Adventure import *
+
+# Constants - file format
+J_FORMAT = "adventure-journal"
+J_VERSION = 1
+
+# Constants - write a session's whole state after this many commands, wait
+# this long for more commands before each commit, and compact once the file
+# has this many times more records than recovery needs
+J_SNAPSHOT_EVERY = 100
+J_COMMIT_DELAY = 0.0
+J_COMPACT_RATIO = 4
+
+class Journal(object):
+    def __init__(self, fn, sync=True, commit_delay=J_COMMIT_DELAY,
+                 snapshot_every=J_SNAPSHOT_EVERY, compact_ratio=J_COMPACT_RATIO):
+        self._fn = fn
+        self._sync = sync
+        self._commit_delay = commit_delay
+        self._snapshot_every = max(1, snapshot_every)
+        self._compact_ratio = compact_ratio
+        self._file = None
+
+        # For each live session, the records needed to recover it: its last
+        # whole state (if any) & the commands since
+        self._tails = {}
+        self._needed = 0
+        self._records = 0
+
+        # Records appended but not written yet, and how many have been
+        # appended & committed so far
+        self._pending = []
+        self._appended = 0
+        self._committed = 0
+        self._committing = None
+
+        # How many commits there have been, and how many records they held
+        self._commits = 0
+        self._committed_records = 0
+
+    # Read the journal back, returning {session id: Game} for every session
+    # that hadn't ended, each with its state rebuilt. Then compact it, ready
+    # for appending.
+    def Recover(self, world=None):
+        records = {}
+        if os.path.exists(self._fn):
+            with open(self._fn, 'r') as journal_file:
+                # Check the header
+                header = json.loads(journal_file.readline() or "{}")
+                if header.get("format") != J_FORMAT or header.get("v") != J_VERSION:
+                    raise ValueError(f"{self._fn} is not a version {J_VERSION} journal")
+
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn write at the end of the journal, from a crash
+                        break
+                    session_id = record["s"]
+                    if record.get("gone"):
+                        records.pop(session_id, None)
+                    elif "full" in record:
+                        # Nothing before this is needed
+                        records[session_id] = [record]
+                    else:
+                        records.setdefault(session_id, []).append(record)
+
+        # Rebuild each game from its last state, replaying the commands since
+        games = {}
+        self._tails = {}
+        self._needed = 0
+        for session_id in records:
+            game = Game(world, NullSink())
+            for record in records[session_id]:
+                if "full" in record:
+                    game.SetState(record["full"])
+                    game.SetCommandCount(record["n"])
+                else:
+                    game.Replay(Command(*record["c"]))
+            games[session_id] = game
+            self._tails[session_id] = [json.dumps(record, separators=(',', ':')) for record in records[session_id]]
+            self._needed += len(records[session_id])
+
+        self.Compact()
+        return games
+
+    # Note a command a session has carried out. It isn't durable until it has
+    # been committed (see Commit & WaitCommitted).
+    def Append(self, session_id, game, command):
+        tail = self._tails.get(session_id)
+        if tail is None:
+            tail = []
+            self._tails[session_id] = tail
+
+        # Enough commands since the last whole state? Then write another.
+        if len(tail) >= self._snapshot_every:
+            record = {"s": session_id, "full": game.GetState(), "n": game.GetCommandCount()}
+            self._needed -= len(tail)
+            del tail[:]
+        else:
+            record = {"s": session_id, "c": [command.verb, command.obj, command.prep, command.target]}
+
+        line = json.dumps(record, separators=(',', ':'))
+        tail.append(line)
+        self._needed += 1
+        self._pending.append(line)
+        self._appended += 1
+
+    # Forget a session that has ended
+    def End(self, session_id):
+        tail = self._tails.pop(session_id, None)
+        if tail is not None:
+            self._needed -= len(tail)
+            self._pending.append(json.dumps({"s": session_id, "gone": True}, separators=(',', ':')))
+            self._appended += 1
+
+    # Write out everything appended so far, with one write & one fsync
+    def Commit(self):
+        lines = self._pending
+        self._pending = []
+        appended = self._appended
+        self.Write(lines)
+        self._committed = appended
+        self.CompactIfLong()
+
+    # Wait until everything appended so far has been committed. Everyone
+    # waiting at the same time shares one commit.
+    async def WaitCommitted(self):
+        appended = self._appended
+        while self._committed < appended:
+            if self._committing is None:
+                self._committing = asyncio.get_running_loop().create_future()
+                asyncio.ensure_future(self.CommitGroup(self._committing))
+            await self._committing
+
+    # Commit whatever has been appended, off the event loop so more can be
+    # appended (for the next group) while this one is synced
+    async def CommitGroup(self, committing):
+        try:
+            if self._commit_delay > 0:
+                await asyncio.sleep(self._commit_delay)
+            loop = asyncio.get_running_loop()
+            lines = self._pending
+            self._pending = []
+            appended = self._appended
+            await loop.run_in_executor(None, self.Write, lines)
+            self._committed = appended
+
+            # Compact off the event loop too, as it rewrites the whole file
+            if self.IsLong():
+                lines, appended = self.TakeCompactLines()
+                journal_file = await loop.run_in_executor(None, self.WriteCompacted, lines)
+                self.SwapCompacted(journal_file, len(lines) - 1, appended)
+            committing.set_result(None)
+        except Exception as e:
+            committing.set_exception(e)
+        finally:
+            self._committing = None
+
+    # Append records with one write
+    def Write(self, lines):
+        if len(lines) == 0:
+            return
+        self._file.write(("\n".join(lines) + "\n").encode())
+        self._file.flush()
+        if self._sync:
+            os.fsync(self._file.fileno())
+        self._records += len(lines)
+        self._commits += 1
+        self._committed_records += len(lines)
+
+    # Has the journal got too long for what recovery needs?
+    def IsLong(self):
+        return self._records > self._compact_ratio * max(self._snapshot_every, self._needed)
+
+    def CompactIfLong(self):
+        if self.IsLong():
+            self.Compact()
+
+    # Rewrite the journal as just what's needed to recover the live sessions.
+    # That includes anything not committed yet, which is then committed too.
+    def Compact(self):
+        lines, appended = self.TakeCompactLines()
+        self.SwapCompacted(self.WriteCompacted(lines), len(lines) - 1, appended)
+
+    # What the compacted journal holds, taking everything appended so far.
+    # Returns (lines, how many had been appended).
+    def TakeCompactLines(self):
+        lines = [json.dumps({"format": J_FORMAT, "v": J_VERSION})]
+        for session_id in self._tails:
+            lines.extend(self._tails[session_id])
+        self._pending = []
+        return lines, self._appended
+
+    # Write a new journal & swap it in for the old one, returning it open for
+    # appending. Touches nothing else, so it can run off the event loop.
+    def WriteCompacted(self, lines):
+        fn_temp = f"{self._fn}.tmp"
+        with open(fn_temp, 'w') as journal_file:
+            journal_file.write("\n".join(lines) + "\n")
+            if self._sync:
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+        os.replace(fn_temp, self._fn)
+
+        # Make the rename itself durable
+        if self._sync:
+            directory = os.open(os.path.dirname(os.path.abspath(self._fn)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        return open(self._fn, 'ab')
+
+    # Carry on appending to a newly compacted journal
+    def SwapCompacted(self, journal_file, records, appended):
+        if self._file is not None:
+            self._file.close()
+        self._file = journal_file
+        self._records = records
+        self._committed = max(self._committed, appended)
+
+    def Close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def GetSize(self):
+        return os.path.getsize(self._fn)
+
+    # Commits so far, and the records they held
+    def GetStats(self):
+        return {
+            'commits': self._commits,
+            'records': self._committed_records
+        }
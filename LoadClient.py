@@ -0,0 +1,99 @@
+# Imports
+import argparse
+import asyncio
+import multiprocessing
+import time
+from Server import S_HOST, S_PORT, S_PROMPT, S_ENCODING
+
+# Commands each simulated player cycles through. None of them end the game.
+LOAD_COMMANDS = [
+    "examine bottle", "get bottle", "inventory", "drop bottle",
+    "go out", "go up", "get key", "go down", "drop key", "go in"
+]
+
+# Connect one simulated player, and wait for the first prompt
+async def ConnectPlayer(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readuntil(S_PROMPT.encode(S_ENCODING))
+    return reader, writer
+
+# One connected player. Returns the latency of every command sent.
+async def RunPlayer(reader, writer, commands_per_player):
+    prompt = S_PROMPT.encode(S_ENCODING)
+    latencies = []
+
+    for i in range(commands_per_player):
+        command = LOAD_COMMANDS[i % len(LOAD_COMMANDS)]
+
+        # Time from sending the command to seeing the next prompt
+        start = time.perf_counter()
+        writer.write((command + "\n").encode(S_ENCODING))
+        await writer.drain()
+        await reader.readuntil(prompt)
+        latencies.append(time.perf_counter() - start)
+
+    # Say goodbye
+    writer.write(b"quit\n")
+    await writer.drain()
+    writer.close()
+    return latencies
+
+# Percentile of an already sorted list
+def Percentile(sorted_values, percent):
+    if len(sorted_values) == 0:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+# Lots of simulated players. Returns all their latencies.
+async def RunPlayers(host, port, players, commands_per_player, connect_batch):
+    # Connect in batches, so we don't overflow the listen backlog. Each batch
+    # is accepted before the next is started, and its players start playing.
+    tasks = []
+    for i in range(0, players, connect_batch):
+        connections = await asyncio.gather(*[ConnectPlayer(host, port) for j in range(min(connect_batch, players - i))])
+        for reader, writer in connections:
+            tasks.append(asyncio.create_task(RunPlayer(reader, writer, commands_per_player)))
+
+    results = await asyncio.gather(*tasks)
+    return [latency for player in results for latency in player]
+
+# Some of the players, for a process of their own
+def RunPlayersProcess(host, port, players, commands_per_player, connect_batch):
+    return asyncio.run(RunPlayers(host, port, players, commands_per_player, connect_batch))
+
+# Run the players, spread over processes so the client isn't what's measured.
+# Returns (sorted latencies, elapsed seconds).
+def RunLoad(host, port, players, commands_per_player, connect_batch, processes=1):
+    start = time.perf_counter()
+    if processes <= 1:
+        latencies = RunPlayersProcess(host, port, players, commands_per_player, connect_batch)
+    else:
+        shares = [players // processes + (1 if i < players % processes else 0) for i in range(processes)]
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(RunPlayersProcess, [(host, port, share, commands_per_player, connect_batch) for share in shares])
+        latencies = [latency for result in results for latency in result]
+    elapsed = time.perf_counter() - start
+    return sorted(latencies), elapsed
+
+def ShowLoad(players, latencies, elapsed):
+    print(f"Players:      {players}")
+    print(f"Commands:     {len(latencies)}")
+    print(f"Elapsed:      {elapsed:.2f}s")
+    print(f"Throughput:   {len(latencies) / elapsed:.0f} commands/s")
+    print(f"p50 latency:  {Percentile(latencies, 50) * 1000:.2f}ms")
+    print(f"p99 latency:  {Percentile(latencies, 99) * 1000:.2f}ms")
+
+# Run the load generator against a running server
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load test the Adventure game server")
+    arg_parser.add_argument("--host", default=S_HOST)
+    arg_parser.add_argument("--port", type=int, default=S_PORT)
+    arg_parser.add_argument("--players", type=int, default=1000)
+    arg_parser.add_argument("--commands", type=int, default=50)
+    arg_parser.add_argument("--connect-batch", type=int, default=100)
+    arg_parser.add_argument("--processes", type=int, default=1, help="client processes to spread the players over")
+    args = arg_parser.parse_args()
+
+    latencies, elapsed = RunLoad(args.host, args.port, args.players, args.commands, args.connect_batch, args.processes)
+    ShowLoad(args.players, latencies, elapsed)
@@ -0,0 +1,295 @@
+# Optional instrumentation. Times parsing, every verb handler reached through
+# DoCommand, describing locations, whole turns & world loading, keeping a
+# histogram of each by verb. They can be exported as a text table or as a
+# Prometheus text file every so often, as turns are played and from a timer
+# the servers run (so a quiet server still reports), along with any gauges
+# (counts of things right now) the server sets. Slow turns can be caught with
+# a sampling profiler.
+#
+# Turn it on before any games are created:
+#
+#   SetMetrics(Metrics(fn_prometheus="adventure.prom", report_every=10))
+#
+# Games created while it's off aren't touched at all, so it costs nothing.
+
+# Imports
+import asyncio
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import time
+from Adventure import *
+
+# Constants - histogram bucket upper bounds, in seconds
+M_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+             0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Constants - what each measurement's label means, for Prometheus
+M_LABELS = {
+    "command": "verb",
+    "world_load": "source",
+    "request": "status"
+}
+M_PREFIX = "adventure"
+
+# Constants - profile one turn in this many, and keep this many slow turns
+M_SAMPLE_EVERY = 100
+M_MAX_SLOW_TURNS = 20
+M_PROFILE_LINES = 15
+
+# Counts of how long something took, in buckets
+class Histogram(object):
+    def __init__(self, bounds=M_BUCKETS):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def Observe(self, seconds):
+        self._counts[bisect.bisect_left(self._bounds, seconds)] += 1
+        self._count += 1
+        self._sum += seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    def GetCount(self):
+        return self._count
+
+    def GetSum(self):
+        return self._sum
+
+    def GetMax(self):
+        return self._max
+
+    # (upper bound, count at or below it) for every bucket, ending with +Inf
+    def GetBuckets(self):
+        buckets = []
+        total = 0
+        for index, count in enumerate(self._counts):
+            total += count
+            bound = self._bounds[index] if index < len(self._bounds) else float("inf")
+            buckets.append((bound, total))
+        return buckets
+
+    # Roughly the value a fraction of observations are at or below (a bucket's upper bound)
+    def GetPercentile(self, fraction):
+        if self._count == 0:
+            return 0.0
+        wanted = fraction * self._count
+        for bound, total in self.GetBuckets():
+            if total >= wanted:
+                return min(bound, self._max)
+        return self._max
+
+# A label value as Prometheus wants it inside quotes
+def EscapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# A parser that times ParseInput, and passes everything else straight through
+class TimedParser(object):
+    def __init__(self, parser, metrics):
+        self._parser = parser
+        self._metrics = metrics
+
+    def ParseInput(self, user_input):
+        start = time.perf_counter()
+        command = self._parser.ParseInput(user_input)
+        self._metrics.Observe("parse", None, time.perf_counter() - start)
+        return command
+
+    # Only called the first time, after that it's found on us
+    def __getattr__(self, name):
+        value = getattr(self._parser, name)
+        setattr(self, name, value)
+        return value
+
+class Metrics(object):
+    def __init__(self, fn_prometheus=None, report_every=None, text_stream=None,
+                 slow_turn=None, sample_every=M_SAMPLE_EVERY):
+        # (name, label) -> Histogram, and name -> current value
+        self._histograms = {}
+        self._gauges = {}
+
+        # Where & how often to report
+        self._fn_prometheus = fn_prometheus
+        self._report_every = report_every
+        self._text_stream = text_stream
+        self._next_report = None
+        if report_every is not None:
+            self._next_report = time.monotonic() + report_every
+
+        # Profiling of slow turns
+        self._slow_turn = None
+        self._sample_every = sample_every
+        self._slow_turns = []
+        self._turns = 0
+        self.SetProfiling(slow_turn, sample_every)
+
+    # Turn the slow turn profiler on (profiling one turn in sample_every, and
+    # keeping those that took at least slow_turn seconds) or off (None)
+    def SetProfiling(self, slow_turn, sample_every=M_SAMPLE_EVERY):
+        self._slow_turn = slow_turn
+        self._sample_every = max(1, sample_every)
+
+    def GetSlowTurns(self):
+        return self._slow_turns
+
+    # Record how long something took
+    def Observe(self, name, label, seconds):
+        histogram = self._histograms.get((name, label))
+        if histogram is None:
+            histogram = Histogram()
+            self._histograms[(name, label)] = histogram
+        histogram.Observe(seconds)
+
+    # Record how many of something there are right now
+    def SetGauge(self, name, value):
+        self._gauges[name] = value
+
+    def GetGauges(self):
+        return self._gauges
+
+    def GetHistogram(self, name, label=None):
+        return self._histograms.get((name, label))
+
+    def GetHistograms(self):
+        return self._histograms
+
+    # Wrap a game's methods so they're measured
+    def Instrument(self, game):
+        self.InstrumentParser(game)
+        game.DoCommand = self.TimeCommand(game.DoCommand)
+        game.DescribeLocation = self.Time("describe", game.DescribeLocation)
+        game.ProcessInput = self.TimeTurn(game.ProcessInput)
+
+    # Time a game's parsing, again after it's moved to another world
+    def InstrumentParser(self, game):
+        game.SetParser(TimedParser(game.GetParser(), self))
+
+    # Time a function that takes no arguments
+    def Time(self, name, function):
+        def Timed():
+            start = time.perf_counter()
+            result = function()
+            self.Observe(name, None, time.perf_counter() - start)
+            return result
+        return Timed
+
+    # Time DoCommand, by verb
+    def TimeCommand(self, do_command):
+        def TimedCommand(command):
+            start = time.perf_counter()
+            do_command(command)
+            self.Observe("command", command.verb, time.perf_counter() - start)
+        return TimedCommand
+
+    # Time whole turns, profiling some of them
+    def TimeTurn(self, process_input):
+        def TimedTurn(user_input):
+            self._turns += 1
+
+            # Profile this one?
+            profiler = None
+            if self._slow_turn is not None and self._turns % self._sample_every == 0:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Something else is already profiling
+                    profiler = None
+
+            start = time.perf_counter()
+            command = process_input(user_input)
+            elapsed = time.perf_counter() - start
+
+            if profiler is not None:
+                profiler.disable()
+                if elapsed >= self._slow_turn:
+                    self.AddSlowTurn(user_input, elapsed, profiler)
+
+            self.Observe("turn", None, elapsed)
+
+            self.ReportIfDue()
+            return command
+        return TimedTurn
+
+    # Keep the profile of a slow turn, dropping the oldest if there are too many
+    def AddSlowTurn(self, user_input, elapsed, profiler):
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats("cumulative").print_stats(M_PROFILE_LINES)
+        self._slow_turns.append({
+            'input': user_input.strip(),
+            'seconds': elapsed,
+            'profile': text.getvalue()
+        })
+        if len(self._slow_turns) > M_MAX_SLOW_TURNS:
+            del self._slow_turns[0]
+
+    # Everything as a text table, in milliseconds
+    def FormatText(self):
+        lines = [f"{'measure':<12} {'label':<12} {'count':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name, label in sorted(self._histograms, key=lambda key: (key[0], key[1] or "")):
+            histogram = self._histograms[(name, label)]
+            lines.append(f"{name:<12} {label or '':<12} {histogram.GetCount():>9} "
+                         f"{histogram.GetSum() / histogram.GetCount() * 1000:>9.3f} "
+                         f"{histogram.GetPercentile(0.5) * 1000:>9.3f} "
+                         f"{histogram.GetPercentile(0.99) * 1000:>9.3f} "
+                         f"{histogram.GetMax() * 1000:>9.3f}")
+        for name in sorted(self._gauges):
+            lines.append(f"{name:<25} {self._gauges[name]:>9}")
+        lines.append(f"{len(self._slow_turns)} slow turns profiled")
+        return "\n".join(lines) + "\n"
+
+    # Everything in the Prometheus text format
+    def FormatPrometheus(self):
+        lines = []
+        names = sorted(set(name for name, label in self._histograms))
+        for name in names:
+            metric = f"{M_PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            labels = sorted((label for histogram_name, label in self._histograms if histogram_name == name), key=lambda label: label or "")
+            for label in labels:
+                histogram = self._histograms[(name, label)]
+                label_text = ""
+                if label is not None:
+                    label_text = f'{M_LABELS.get(name, "label")}="{EscapeLabel(label)}",'
+                for bound, total in histogram.GetBuckets():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{{label_text}le="{le}"}} {total}')
+                label_text = "{" + label_text.rstrip(",") + "}" if label_text else ""
+                lines.append(f"{metric}_sum{label_text} {histogram.GetSum()!r}")
+                lines.append(f"{metric}_count{label_text} {histogram.GetCount()}")
+        for name in sorted(self._gauges):
+            lines.append(f"# TYPE {M_PREFIX}_{name} gauge")
+            lines.append(f"{M_PREFIX}_{name} {self._gauges[name]}")
+        lines.append(f"# TYPE {M_PREFIX}_slow_turns_profiled gauge")
+        lines.append(f"{M_PREFIX}_slow_turns_profiled {len(self._slow_turns)}")
+        return "\n".join(lines) + "\n"
+
+    # Report, if it's time to
+    def ReportIfDue(self):
+        if self._next_report is not None and time.monotonic() >= self._next_report:
+            self._next_report = time.monotonic() + self._report_every
+            self.Report()
+
+    # Report on time whether or not turns are being played, until cancelled
+    async def RunReports(self):
+        while self._next_report is not None:
+            await asyncio.sleep(max(0.0, self._next_report - time.monotonic()))
+            self.ReportIfDue()
+
+    # Write out the reports. The Prometheus file is swapped in whole, so a
+    # collector never reads half of it.
+    def Report(self):
+        if self._text_stream is not None:
+            self._text_stream.write(self.FormatText())
+            self._text_stream.flush()
+        if self._fn_prometheus is not None:
+            fn_temp = f"{self._fn_prometheus}.{os.getpid()}.tmp"
+            with open(fn_temp, 'w') as prometheus_file:
+                prometheus_file.write(self.FormatPrometheus())
+            os.replace(fn_temp, self._fn_prometheus)
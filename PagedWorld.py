@@ -0,0 +1,359 @@
+# A world that lives on disk, in an SQLite index keyed by location name, and
+# only keeps the locations & items that are in use in memory. It can be used
+# anywhere a World can, e.g. Game(PagedWorld("world.db")).
+
+# Imports
+import collections
+import collections.abc
+import json
+import os
+import sqlite3
+from Adventure import *
+
+# Constants - file names
+FN_PAGED_WORLD = "world.db"
+
+# Constants - default memory budget, in locations & items kept in memory
+PW_MAX_LOCATIONS = 10000
+PW_MAX_ITEMS = 50000
+
+# Constants - names found not to be there that each cache remembers, apart
+# from its entries so they never push real ones out
+PW_MAX_MISSING = 1024
+
+# Constants - locations a search for a route may look at (and so page in)
+# before giving up
+PW_MAX_TRAVEL_VISITS = 1000
+
+# Constants - rows written per batch when building the index
+PW_BATCH_SIZE = 10000
+
+# Build the on-disk index from location & item dicts. They can be any
+# iterables, so very big generated worlds never need to be in memory at once.
+# Extra verbs map each new verb to the verb it acts like.
+def BuildPagedWorld(locations, items, fn_index=FN_PAGED_WORLD, verb_synonyms=None):
+    connection = sqlite3.connect(fn_index)
+    connection.executescript('''
+        DROP TABLE IF EXISTS meta;
+        DROP TABLE IF EXISTS locations;
+        DROP TABLE IF EXISTS items;
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE locations (name TEXT PRIMARY KEY, data TEXT) WITHOUT ROWID;
+        CREATE TABLE items (name TEXT PRIMARY KEY, seq INTEGER, location_name TEXT, data TEXT) WITHOUT ROWID;
+    ''')
+
+    # Write the locations, remembering what the parser will need
+    start_location = None
+    verbs = dict(verb_synonyms or {})
+    blocked_exit_names = []
+    batch = []
+    for location_dict in locations:
+        if location_dict["start_location"]:
+            start_location = location_dict["name"]
+        if "blocked_exit" in location_dict:
+            blocked_exit_names.append(location_dict["blocked_exit"]["name"])
+            for verb in location_dict["blocked_exit"].get("verbs", []):
+                verbs.setdefault(verb, "hit")
+        batch.append((location_dict["name"], json.dumps(location_dict)))
+        if len(batch) >= PW_BATCH_SIZE:
+            connection.executemany("INSERT OR REPLACE INTO locations VALUES (?, ?)", batch)
+            batch = []
+    connection.executemany("INSERT OR REPLACE INTO locations VALUES (?, ?)", batch)
+
+    # Write the items, keeping their load order
+    batch = []
+    for seq, item_dict in enumerate(items):
+        batch.append((item_dict["name"], seq, item_dict["location_name"], json.dumps(item_dict)))
+        if len(batch) >= PW_BATCH_SIZE:
+            connection.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)", batch)
+            batch = []
+    connection.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)", batch)
+
+    # Index the items by where they are, after loading, as it's quicker
+    connection.execute("CREATE INDEX items_by_location ON items (location_name, seq)")
+
+    # And the rest
+    connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("start_location", json.dumps(start_location)),
+        ("verb_synonyms", json.dumps(verbs)),
+        ("blocked_exit_names", json.dumps(blocked_exit_names))
+    ])
+    connection.commit()
+    connection.close()
+
+# Build the on-disk index from the usual JSON files
+def BuildPagedWorldFromJSON(fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_index=FN_PAGED_WORLD, fn_verbs=FN_VERBS):
+    with open(fn_locations, 'r') as json_file:
+        locations_list = json.load(json_file)
+    with open(fn_items, 'r') as json_file:
+        items_list = json.load(json_file)
+
+    # The verbs file is optional
+    verbs_dict = {}
+    if os.path.exists(fn_verbs):
+        with open(fn_verbs, 'r') as json_file:
+            verbs_dict = json.load(json_file)
+
+    BuildPagedWorld(locations_list, items_list, fn_index, verbs_dict)
+
+# Keeps the most recently used values, loading others on demand. Keys that
+# load as None (not there) are remembered separately, in a smaller LRU.
+class LRUCache(object):
+    def __init__(self, max_size, load, max_missing=PW_MAX_MISSING):
+        self._max_size = max_size
+        self._max_missing = max_missing
+        self._load = load
+        self._entries = collections.OrderedDict()
+        self._missing = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def Get(self, key):
+        entries = self._entries
+        if key in entries:
+            # Hit, so now the most recently used
+            self._hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        if key in self._missing:
+            # Known not to be there
+            self._hits += 1
+            self._missing.move_to_end(key)
+            return None
+
+        # Miss, load it
+        self._misses += 1
+        value = self._load(key)
+        if value is None:
+            self._missing[key] = None
+            if len(self._missing) > self._max_missing:
+                self._missing.popitem(last=False)
+        else:
+            self.Put(key, value)
+        return value
+
+    def Put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        # Over budget? Drop the least recently used
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def GetSize(self):
+        return len(self._entries)
+
+    def GetStats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'missing': len(self._missing),
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions
+        }
+
+# The locations, looked up through the world's cache
+class PagedMap(collections.abc.Mapping):
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, location_name):
+        location = self._world.GetLocation(location_name)
+        if location is None:
+            raise KeyError(location_name)
+        return location
+
+    def __contains__(self, location_name):
+        return self._world.GetLocation(location_name) is not None
+
+    def __iter__(self):
+        return self._world.IterNames("locations")
+
+    def __len__(self):
+        return self._world.CountRows("locations")
+
+# Item load order, looked up through the world's cache
+class PagedOrder(collections.abc.Mapping):
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, item_name):
+        entry = self._world.GetItemEntry(item_name)
+        if entry is None:
+            raise KeyError(item_name)
+        return entry[1]
+
+    def __iter__(self):
+        return self._world.IterNames("items")
+
+    def __len__(self):
+        return self._world.CountRows("items")
+
+# Item names, for the parser
+class PagedItemNames(object):
+    def __init__(self, world):
+        self._world = world
+
+    def __contains__(self, item_name):
+        return self._world.GetItemEntry(item_name) is not None
+
+# The base item registry of a paged world. Games layer their own registry
+# over it as usual, so anything a game changes lives in that game and is
+# never lost when the world evicts the original.
+class PagedItemRegistry(ItemRegistry):
+    def __init__(self, world):
+        super().__init__()
+        self._world = world
+        self._order = PagedOrder(world)
+
+    def __getitem__(self, item_name):
+        entry = self._world.GetItemEntry(item_name)
+        if entry is None:
+            raise KeyError(item_name)
+        return entry[0]
+
+    def __contains__(self, item_name):
+        return self._world.GetItemEntry(item_name) is not None
+
+    def __iter__(self):
+        return self._world.IterNames("items")
+
+    def __len__(self):
+        return self._world.CountRows("items")
+
+    def GetIndexedAt(self, location_name):
+        return self._world.GetItemNamesAt(location_name)
+
+    def GetMutableItem(self, item_name):
+        raise TypeError("A paged world is read-only, layer an ItemRegistry over it to make changes")
+
+    def CheckConsistency(self):
+        # Nothing is indexed in memory, SQLite does it all
+        return []
+
+# A world that pages locations & items in from disk as they are used
+class PagedWorld(object):
+    def __init__(self, fn_index=FN_PAGED_WORLD, max_locations=PW_MAX_LOCATIONS, max_items=PW_MAX_ITEMS):
+        self._connection = sqlite3.connect(fn_index)
+
+        # Caches, which together are our memory budget
+        self._locations = LRUCache(max_locations, self.LoadLocation)
+        self._items_at = LRUCache(max_locations, self.LoadItemNamesAt)
+        self._item_entries = LRUCache(max_items, self.LoadItemEntry)
+
+        # The world's pieces
+        self._map = PagedMap(self)
+        self._items = PagedItemRegistry(self)
+        self._parser = Parser()
+        self._verbs = CreateVerbRegistry()
+
+        # Teach the parser our words. Item names are looked up as needed.
+        for verb in self._verbs.GetVerbs():
+            self._parser.AddVerb(verb)
+        verb_synonyms = self.GetMeta("verb_synonyms")
+        for verb in verb_synonyms:
+            if verb not in self._verbs:
+                self._verbs.AddSynonym(verb, verb_synonyms[verb])
+            self._parser.AddVerb(verb)
+        for blocked_exit_name in self.GetMeta("blocked_exit_names"):
+            self._parser.AddBlockedExitName(blocked_exit_name)
+        self._parser.SetLookup(W_ITEM, PagedItemNames(self))
+        self._parser.SetLookup(W_LOCATION, self._map)
+        self._path_index = None
+        self._description_cache = DescriptionCache(DS_SHARED_CACHE_SIZE)
+
+        # Where do we start?
+        self._start_location = self._map[self.GetMeta("start_location")]
+
+    # Getters, the same as World
+    def GetParser(self):
+        return self._parser
+
+    def GetItems(self):
+        return self._items
+
+    def GetMap(self):
+        return self._map
+
+    def GetStartLocation(self):
+        return self._start_location
+
+    def GetVerbs(self):
+        return self._verbs
+
+    # Paged worlds aren't numbered, games look locations up by name
+    def GetGraph(self):
+        return None
+
+    # Routes are only searched for nearby, a search across the whole world
+    # would page all of it in
+    def GetPathIndex(self):
+        if self._path_index is None:
+            self._path_index = PathIndex(self._map, max_visited=PW_MAX_TRAVEL_VISITS)
+        return self._path_index
+
+    def GetDescriptionCache(self):
+        return self._description_cache
+
+    # How much is in memory right now
+    def GetCacheStats(self):
+        return {
+            'locations': self._locations.GetStats(),
+            'items_at': self._items_at.GetStats(),
+            'items': self._item_entries.GetStats()
+        }
+
+    def GetMeta(self, key):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0])
+
+    def IterNames(self, table):
+        for row in self._connection.execute(f"SELECT name FROM {table}"):
+            yield row[0]
+
+    def CountRows(self, table):
+        return self._connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    # Cached lookups
+    def GetLocation(self, location_name):
+        return self._locations.Get(location_name)
+
+    def GetItemNamesAt(self, location_name):
+        return self._items_at.Get(location_name)
+
+    def GetItemEntry(self, item_name):
+        return self._item_entries.Get(item_name)
+
+    # Loaders, called when the caches miss
+    def LoadLocation(self, location_name):
+        row = self._connection.execute("SELECT data FROM locations WHERE name = ?", (location_name,)).fetchone()
+        if row is None:
+            return None
+
+        # Bring in what's here too, as we'll want to describe it
+        self.GetItemNamesAt(location_name)
+        return Location.FromDict(json.loads(row[0]))
+
+    def LoadItemNamesAt(self, location_name):
+        item_names = []
+        rows = self._connection.execute("SELECT name, seq, data FROM items WHERE location_name = ? ORDER BY seq", (location_name,))
+        for item_name, seq, data in rows:
+            # Cache the items while we have them
+            self._item_entries.Put(item_name, self.MakeItemEntry(seq, data))
+            item_names.append(item_name)
+        return tuple(item_names)
+
+    def LoadItemEntry(self, item_name):
+        row = self._connection.execute("SELECT seq, data FROM items WHERE name = ?", (item_name,)).fetchone()
+        if row is None:
+            return None
+        return self.MakeItemEntry(row[0], row[1])
+
+    # An item & its load order
+    def MakeItemEntry(self, seq, data):
+        item = Item.FromDict(json.loads(data))
+        item._registry = self._items
+        return (item, seq)
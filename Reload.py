@@ -0,0 +1,423 @@
+# Reloads the world files into a running server, without restarting it or
+# dropping anyone.
+#
+# A WorldReloader is ticked by the server's loop. Every so often it checks
+# whether the world files' sizes or times have changed. If they have, another
+# process checks the contents really did, then compiles & checks the new
+# world, so parsing & validating the JSON doesn't hold up the game. A thread
+# then loads the snapshot that wrote, which is quick as locations & items are
+# only created when they're used. A bad edit is reported & the old world kept.
+#
+# The old & new worlds are then compared by their saved JSON rows, a limited
+# number of rows each tick (see WorldDiff). Once that's done the new world is
+# swapped in, vocabulary & all, in one go: new games start in it straight
+# away, and existing games move over on their next command, or a few each
+# tick until they all have, so no game ever mixes the two. Each game's saved
+# state is carried over, keeping what still makes sense (see MigrateState),
+# and descriptions of locations the edit didn't touch are kept.
+
+# Imports
+import concurrent.futures
+import os
+import sys
+import time
+from Adventure import *
+
+# Constants - seconds between checks of the files, and between ticks
+HR_CHECK_INTERVAL = 1.0
+HR_TICK = 0.05
+
+# Constants - seconds of work each tick may do, comparing rows or moving
+# games to the new world, and rows compared between looking at the time
+HR_TICK_BUDGET = 0.005
+HR_DIFF_ROWS = 100
+
+# Follow containers up to the location they're in
+def GetTopLocation(items, location_name):
+    steps = 0
+    while location_name in items and steps <= len(items):
+        location_name = items[location_name].GetLocationName()
+        steps += 1
+    return location_name
+
+# What changed between two worlds, worked out a few rows at a time
+class WorldDiff(object):
+    def __init__(self, old_world, new_world):
+        self._old_world = old_world
+        self._new_world = new_world
+        self._locations = {'added': set(), 'removed': set(), 'changed': set()}
+        self._items = {'added': set(), 'removed': set(), 'changed': set()}
+        self._steps = self.Compare()
+        self._done = False
+
+    def GetOldWorld(self):
+        return self._old_world
+
+    def GetNewWorld(self):
+        return self._new_world
+
+    # {"added": names, "removed": names, "changed": names}
+    def GetLocationChanges(self):
+        return self._locations
+
+    def GetItemChanges(self):
+        return self._items
+
+    def IsDone(self):
+        return self._done
+
+    # Compare up to max_rows more rows. Returns True once everything has been.
+    def Step(self, max_rows=HR_DIFF_ROWS):
+        for index in range(max_rows):
+            try:
+                next(self._steps)
+            except StopIteration:
+                self._done = True
+                break
+        return self._done
+
+    # Compare every row, yielding after each one
+    def Compare(self):
+        old_map = self._old_world.GetMap()
+        new_map = self._new_world.GetMap()
+        for location_name in new_map:
+            if location_name not in old_map:
+                self._locations["added"].add(location_name)
+            elif self._old_world.GetLocationRow(location_name) != self._new_world.GetLocationRow(location_name):
+                self._locations["changed"].add(location_name)
+            yield
+        for location_name in old_map:
+            if location_name not in new_map:
+                self._locations["removed"].add(location_name)
+            yield
+
+        old_items = self._old_world.GetItems()
+        new_items = self._new_world.GetItems()
+        for item_name in new_items:
+            if item_name not in old_items:
+                self._items["added"].add(item_name)
+            elif old_items.GetRow(item_name) != new_items.GetRow(item_name):
+                self._items["changed"].add(item_name)
+            yield
+        for item_name in old_items:
+            if item_name not in new_items:
+                self._items["removed"].add(item_name)
+            yield
+
+    # Locations that may look different, because they or what's in them changed
+    def GetTouchedLocations(self):
+        touched = set()
+        for names in self._locations.values():
+            touched.update(names)
+        old_items = self._old_world.GetItems()
+        new_items = self._new_world.GetItems()
+        for names in self._items.values():
+            for item_name in names:
+                for items in [old_items, new_items]:
+                    if item_name in items:
+                        touched.add(GetTopLocation(items, items[item_name].GetLocationName()))
+        return touched
+
+    def GetSummary(self):
+        parts = []
+        for kind, changes in [("locations", self._locations), ("items", self._items)]:
+            counts = ", ".join(f"{len(changes[change])} {change}" for change in ["changed", "added", "removed"])
+            parts.append(f"{kind} {counts}")
+        return "; ".join(parts)
+
+# A game's saved state from the old world of a diff, made to fit the new one.
+# What no longer makes sense goes back to how the new world has it.
+def MigrateState(state, diff):
+    new_world = diff.GetNewWorld()
+    new_map = new_world.GetMap()
+    new_items = new_world.GetItems()
+
+    # Somewhere that's gone? Back to the start
+    location_name = state["location"]
+    if location_name not in new_map:
+        location_name = new_world.GetStartLocation().GetLocationName()
+
+    # Items the player moved, opened or unlocked, if they & where they are still exist
+    items = {}
+    for item_name in state["items"]:
+        item_location_name, open, locked = state["items"][item_name]
+        if item_name not in new_items:
+            continue
+        if item_location_name in new_items:
+            if not new_items[item_location_name].GetContainer():
+                continue
+        elif item_location_name != L_CARRIED and item_location_name not in new_map:
+            continue
+
+        # Only containers open & lock
+        item = new_items[item_name]
+        if not item.GetContainer():
+            open = item.GetOpen()
+            locked = item.GetLocked()
+        values = [item_location_name, open, locked]
+        if values != [item.GetLocationName(), item.GetOpen(), item.GetLocked()]:
+            items[item_name] = values
+
+    # The new world may have put a container inside one the player put inside it
+    for item_name in list(items):
+        seen = set()
+        name = item_name
+        while name in new_items and name not in seen:
+            seen.add(name)
+            name = items[name][0] if name in items else new_items[name].GetLocationName()
+        if name in seen:
+            del items[item_name]
+
+    # Blocked exits the player opened
+    changed_locations = diff.GetLocationChanges()["changed"]
+    locations = {}
+    for opened_name in state["locations"]:
+        if opened_name not in new_map:
+            continue
+        changes = state["locations"][opened_name]
+        if opened_name not in changed_locations:
+            locations[opened_name] = changes
+            continue
+
+        # The location changed, so open its blocked exit again as it is now, if it still has one
+        location = new_map[opened_name]
+        blocked_exit_dict = location.GetBlockedExit()
+        if "exits" in changes and "name" in blocked_exit_dict:
+            base_exits = location.GetExits()
+            new_exits = blocked_exit_dict["exits"]
+            locations[opened_name] = {
+                "exits": {direction: new_exits[direction] for direction in new_exits if base_exits.get(direction) != new_exits[direction]},
+                "desc": blocked_exit_dict["alt_desc"]
+            }
+
+    return {
+        'v': SAVE_VERSION,
+        'location': location_name,
+        'items': items,
+        'locations': locations
+    }
+
+# Stands in for a WorldDiff once the world a state was saved in has gone,
+# e.g. for a game that was hibernated through a reload. Every location counts
+# as changed, so blocked exits the player opened are opened again as the new
+# world has them.
+class UnknownDiff(object):
+    def __init__(self, new_world):
+        self._new_world = new_world
+
+    def GetNewWorld(self):
+        return self._new_world
+
+    def GetLocationChanges(self):
+        return {'added': set(), 'removed': set(), 'changed': self._new_world.GetMap()}
+
+# Has a file's size or time changed since it was described? (Quicker than
+# IsSourceChanged, which reads the whole file if they have.)
+def IsSourceTouched(fn, source_info):
+    if source_info is None:
+        return os.path.exists(fn)
+    stat = os.stat(fn)
+    return stat.st_mtime_ns != source_info["mtime_ns"] or stat.st_size != source_info["size"]
+
+# Runs in another process: if the world files really have changed, build &
+# check the world and save its snapshot. Returns (changed, problem or None,
+# what the files looked like).
+def CompileInProcess(files, sources):
+    fn_locations, fn_items, fn_snapshot, fn_verbs = files
+    new_sources = {fn: GetSourceInfo(fn) for fn in sources}
+    changed = False
+    for fn in sources:
+        if (sources[fn] is None) != (new_sources[fn] is None):
+            changed = True
+        elif sources[fn] is not None and sources[fn]["sha256"] != new_sources[fn]["sha256"]:
+            changed = True
+    if not changed:
+        # Just touched
+        return False, None, new_sources
+    try:
+        CompileWorld(fn_locations, fn_items, fn_snapshot, fn_verbs)
+    except (ValueError, OSError) as error:
+        return True, str(error), new_sources
+    return True, None, new_sources
+
+# Watches the world files & moves games over to the new world when they change
+class WorldReloader(object):
+    def __init__(self, world=None, fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_snapshot=FN_SNAPSHOT, fn_verbs=FN_VERBS,
+                 check_interval=HR_CHECK_INTERVAL, tick_budget=HR_TICK_BUDGET, log=sys.stderr):
+        if world is None:
+            world = GetDefaultWorld()
+        self._world = world
+        self._files = (fn_locations, fn_items, fn_snapshot, fn_verbs)
+        self._check_interval = check_interval
+        self._tick_budget = tick_budget
+        self._log = log
+
+        # What the files looked like when we last loaded them
+        self._sources = self.GetSources()
+        self._last_check = time.monotonic()
+
+        # Where we're up to: idle, compiling, loading, diffing or migrating
+        self._stage = "idle"
+        self._loader = None
+        self._compiling = None
+        self._loading = None
+        self._diff = None
+        self._pending = []
+
+        self._stats = {
+            'reloads': 0,
+            'failed': 0,
+            'migrated': 0,
+            'max_tick_seconds': 0.0,
+            'last_reload_seconds': 0.0,
+            'last_changes': ""
+        }
+        self._reload_start = 0.0
+
+        # Start the compiler process now, rather than in the middle of a tick
+        self._compiler = concurrent.futures.ProcessPoolExecutor(1)
+        self._compiler.submit(GetSourceInfo, fn_locations)
+
+    def GetWorld(self):
+        return self._world
+
+    def GetStage(self):
+        return self._stage
+
+    def GetStats(self):
+        return self._stats
+
+    def GetSources(self):
+        fn_locations, fn_items, fn_snapshot, fn_verbs = self._files
+        return {fn: GetSourceInfo(fn) for fn in [fn_locations, fn_items, fn_verbs]}
+
+    def IsTouched(self):
+        return any(IsSourceTouched(fn, self._sources[fn]) for fn in self._sources)
+
+    def Log(self, text):
+        if self._log is not None:
+            print(text, file=self._log)
+
+    # Do the next bit of reloading, if there's any to do. get_games returns
+    # every game that may need moving to a new world.
+    def Tick(self, get_games=None):
+        start = time.perf_counter()
+        if self._stage == "idle":
+            self.TickIdle()
+        elif self._stage == "compiling":
+            self.TickCompiling()
+        elif self._stage == "loading":
+            self.TickLoading()
+        elif self._stage == "diffing":
+            self.TickDiffing(get_games)
+        elif self._stage == "migrating":
+            self.TickMigrating()
+        self._stats["max_tick_seconds"] = max(self._stats["max_tick_seconds"], time.perf_counter() - start)
+
+    # Time to look at the files again?
+    def TickIdle(self):
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval:
+            return
+        self._last_check = now
+        try:
+            if not self.IsTouched():
+                return
+        except OSError:
+            # Moved away, try again later
+            return
+
+        # Check & build it elsewhere
+        self._reload_start = time.perf_counter()
+        self._compiling = self._compiler.submit(CompileInProcess, self._files, self._sources)
+        self._stage = "compiling"
+
+    # Built yet?
+    def TickCompiling(self):
+        if not self._compiling.done():
+            return
+        try:
+            changed, problem, self._sources = self._compiling.result()
+        except Exception as error:
+            # Try again next time
+            changed, problem = True, f"Couldn't compile the world: {error}"
+        self._compiling = None
+        self._stage = "idle"
+        if not changed:
+            return
+        if problem is not None:
+            self._stats["failed"] += 1
+            self.Log(f"Not reloading the world, keeping the old one. {problem}")
+            return
+
+        # Load what it built
+        if self._loader is None:
+            self._loader = concurrent.futures.ThreadPoolExecutor(1)
+        self._loading = self._loader.submit(ReadSnapshot, *self._files)
+        self._stage = "loading"
+
+    # Loaded yet?
+    def TickLoading(self):
+        if not self._loading.done():
+            return
+        new_world = self._loading.result()
+        self._loading = None
+        if new_world is None:
+            # The files changed again since, so start over
+            self._sources = {fn: None for fn in self._sources}
+            self._stage = "idle"
+            return
+        self._diff = WorldDiff(self._world, new_world)
+        self._stage = "diffing"
+
+    # Compare some more, and swap the new world in once that's done
+    def TickDiffing(self, get_games):
+        deadline = time.perf_counter() + self._tick_budget
+        while not self._diff.Step(HR_DIFF_ROWS):
+            if time.perf_counter() > deadline:
+                return
+
+        # Keep descriptions of locations nothing happened to
+        old_world = self._world
+        new_world = self._diff.GetNewWorld()
+        touched = self._diff.GetTouchedLocations()
+        new_cache = new_world.GetDescriptionCache()
+        for location_name, text in old_world.GetDescriptionCache().GetEntries():
+            if location_name not in touched:
+                new_cache.Put(location_name, text)
+
+        # Swap it in
+        self._world = new_world
+        if GetDefaultWorld() is old_world:
+            SetDefaultWorld(new_world)
+        self._pending = list(get_games()) if get_games is not None else []
+        self._stage = "migrating"
+        self._stats["reloads"] += 1
+        self._stats["last_changes"] = self._diff.GetSummary()
+        self.Log(f"Reloaded the world: {self._diff.GetSummary()}")
+
+    # Move a few more games over
+    def TickMigrating(self):
+        deadline = time.perf_counter() + self._tick_budget
+        while len(self._pending) > 0 and time.perf_counter() < deadline:
+            self.Migrate(self._pending.pop())
+        if len(self._pending) == 0:
+            self._stage = "idle"
+            self._stats["last_reload_seconds"] = time.perf_counter() - self._reload_start
+
+    # Move a game to the newest world, if it's still in the one before.
+    # Returns True if it was moved.
+    def Migrate(self, game):
+        if self._diff is None or game.GetWorld() is not self._diff.GetOldWorld() or self._stage == "diffing":
+            return False
+        game.SetWorld(self._world, MigrateState(game.GetState(), self._diff))
+        self._stats["migrated"] += 1
+        return True
+
+    def Close(self):
+        if self._compiler is not None:
+            self._compiler.shutdown()
+            self._compiler = None
+        if self._loader is not None:
+            self._loader.shutdown()
+            self._loader = None
@@ -0,0 +1,144 @@
+# Replays scripted command transcripts without a terminal, for regression &
+# load testing. A transcript is a text file with one command per line. A file
+# can hold several transcripts, separated by lines of "---". Lines starting
+# with "#" are comments.
+
+# Imports
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import sys
+import time
+from Adventure import *
+
+# Constants - transcript format
+R_SEPARATOR = "---"
+R_COMMENT = "#"
+R_PROMPT = "What next? "
+
+# Game output that just keeps a checksum of what's written out
+class HashSink(OutputSink):
+    def __init__(self):
+        super().__init__()
+        self._hash = hashlib.sha256()
+
+    def WriteOut(self, text):
+        self._hash.update(text.encode())
+
+    def GetChecksum(self):
+        return self._hash.hexdigest()
+
+# Read the transcripts from a file, as (name, commands) pairs
+def LoadTranscripts(fn):
+    transcripts = []
+    commands = []
+    with open(fn, 'r') as transcript_file:
+        for line in transcript_file:
+            line = line.strip()
+            if line == R_SEPARATOR:
+                # End of this transcript
+                transcripts.append((f"{fn}#{len(transcripts) + 1}", commands))
+                commands = []
+            elif line != "" and not line.startswith(R_COMMENT):
+                commands.append(line)
+
+    # The last one doesn't need a separator
+    if len(commands) > 0:
+        transcripts.append((f"{fn}#{len(transcripts) + 1}", commands))
+    return transcripts
+
+# Find the transcripts in a list of files & directories
+def FindTranscripts(paths):
+    transcripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for fn in sorted(os.listdir(path)):
+                transcripts.extend(LoadTranscripts(os.path.join(path, fn)))
+        else:
+            transcripts.extend(LoadTranscripts(path))
+    return transcripts
+
+# Play one transcript through a new game. When describing, the output is the
+# same as running main.py with the transcript piped in.
+def ReplayTranscript(name, commands, describe=True, keep_output=False):
+    if keep_output:
+        sink = MemorySink()
+    else:
+        sink = HashSink()
+    game = Game(sink=sink)
+
+    played = 0
+    start = time.perf_counter()
+    for command in commands:
+        # Stop if they quit
+        if not game.IsAlive():
+            break
+
+        # Tell the player where they are, as Run does
+        if describe:
+            game.DescribeLocation()
+            sink.Write(R_PROMPT)
+
+        game.ProcessInput(command)
+        sink.Flush()
+        played += 1
+    elapsed = time.perf_counter() - start
+
+    # Report what happened
+    result = {
+        'name': name,
+        'commands': played,
+        'seconds': elapsed
+    }
+    if keep_output:
+        text = sink.GetOutput()
+        result['output'] = text
+        result['checksum'] = hashlib.sha256(text.encode()).hexdigest()
+    else:
+        result['checksum'] = sink.GetChecksum()
+    return result
+
+# Replay a batch of transcripts, for a worker process
+def ReplayBatch(batch, describe, keep_output):
+    return [ReplayTranscript(name, commands, describe, keep_output) for name, commands in batch]
+
+# Replay lots of transcripts, spread over a process pool if workers > 1
+def ReplayAll(transcripts, workers=1, describe=True, keep_output=False, batch_size=16):
+    if workers <= 1:
+        return ReplayBatch(transcripts, describe, keep_output)
+
+    # Send transcripts out in batches, to keep the pool overhead down
+    batches = [transcripts[i:i + batch_size] for i in range(0, len(transcripts), batch_size)]
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(ReplayBatch, batch, describe, keep_output) for batch in batches]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+# Run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Replay Adventure transcripts headlessly")
+    arg_parser.add_argument("paths", nargs="+", help="transcript files or directories")
+    arg_parser.add_argument("--workers", type=int, default=1, help="processes to spread transcripts over")
+    arg_parser.add_argument("--no-describe", action="store_true", help="don't describe the room every turn")
+    arg_parser.add_argument("--output", action="store_true", help="print each transcript's output")
+    args = arg_parser.parse_args()
+
+    transcripts = FindTranscripts(args.paths)
+
+    start = time.perf_counter()
+    results = ReplayAll(transcripts, args.workers, not args.no_describe, args.output)
+    elapsed = time.perf_counter() - start
+
+    # Show what happened to each transcript
+    for result in results:
+        print(f"{result['checksum']}  {result['commands']:6d}  {result['name']}")
+        if args.output:
+            print(result['output'])
+
+    # And overall
+    commands = sum(result['commands'] for result in results)
+    print(f"Replayed {len(results)} transcripts, {commands} commands in {elapsed:.2f}s "
+          f"({commands / elapsed:.0f} commands/s)", file=sys.stderr)
@@ -0,0 +1,138 @@
+# Autosaves many game sessions to one append-only file. Each checkpoint only
+# appends small deltas for the sessions that changed, all in a single write,
+# and the log is compacted back to one full state per session once it has
+# grown too long.
+#
+# The file is JSON lines. The first line is a header, then each record is
+#   {"s": session id, "full": state}    a session's whole state
+#   {"s": session id, "d": delta}       changes since its previous record
+#   {"s": session id, "gone": true}     the session ended
+
+# Imports
+import json
+import os
+from Adventure import *
+
+# Constants - file format
+SL_FORMAT = "adventure-savelog"
+SL_VERSION = 1
+
+# Constants - compact once there are this many records per session
+SL_COMPACT_RATIO = 8
+
+class SaveLog(object):
+    def __init__(self, fn, compact_ratio=SL_COMPACT_RATIO, sync=False):
+        self._fn = fn
+        self._compact_ratio = compact_ratio
+        self._sync = sync
+
+        # What we last saved for each session, as (command count, state)
+        self._saved = {}
+        self._records = 0
+
+        # Pick up where we left off
+        for session_id, state in self.Load().items():
+            self._saved[session_id] = (None, state)
+        self._records = len(self._saved)
+        if not os.path.exists(fn):
+            self.Compact()
+
+    # Read all the sessions' latest states from the log
+    def Load(self):
+        states = {}
+        if not os.path.exists(self._fn):
+            return states
+
+        with open(self._fn, 'r') as log_file:
+            # Check the header
+            header = json.loads(log_file.readline() or "{}")
+            if header.get("format") != SL_FORMAT or header.get("v") != SL_VERSION:
+                raise ValueError(f"{self._fn} is not a version {SL_VERSION} save log")
+
+            # Replay the records
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the end of the log, from a crash
+                    break
+                session_id = record["s"]
+                if "full" in record:
+                    states[session_id] = record["full"]
+                elif "d" in record:
+                    states[session_id] = ApplyStateDelta(states[session_id], record["d"])
+                elif record.get("gone"):
+                    states.pop(session_id, None)
+
+        return states
+
+    # Save every session that has changed since the last checkpoint. Games is a
+    # dict of session id to Game. Returns the number of records written.
+    def Checkpoint(self, games):
+        lines = []
+        for session_id in games:
+            game = games[session_id]
+
+            # Nothing typed since last time? Then nothing changed.
+            saved = self._saved.get(session_id)
+            command_count = game.GetCommandCount()
+            if saved is not None and saved[0] == command_count:
+                continue
+
+            # Write the whole state the first time, then just the changes
+            state = game.GetState()
+            if saved is None:
+                record = {"s": session_id, "full": state}
+            else:
+                delta = DiffState(saved[1], state)
+                if len(delta) == 0:
+                    self._saved[session_id] = (command_count, state)
+                    continue
+                record = {"s": session_id, "d": delta}
+
+            lines.append(json.dumps(record, separators=(',', ':')))
+            self._saved[session_id] = (command_count, state)
+
+        self.Append(lines)
+
+        # Grown too long?
+        if self._records > self._compact_ratio * max(1, len(self._saved)):
+            self.Compact()
+
+        return len(lines)
+
+    # Forget a session that has ended
+    def Remove(self, session_id):
+        if session_id in self._saved:
+            del self._saved[session_id]
+            self.Append([json.dumps({"s": session_id, "gone": True}, separators=(',', ':'))])
+
+    # Append records with one write
+    def Append(self, lines):
+        if len(lines) == 0:
+            return
+        with open(self._fn, 'a') as log_file:
+            log_file.write("\n".join(lines) + "\n")
+            if self._sync:
+                log_file.flush()
+                os.fsync(log_file.fileno())
+        self._records += len(lines)
+
+    # Rewrite the log as one full state per session
+    def Compact(self):
+        lines = [json.dumps({"format": SL_FORMAT, "v": SL_VERSION})]
+        for session_id in self._saved:
+            lines.append(json.dumps({"s": session_id, "full": self._saved[session_id][1]}, separators=(',', ':')))
+
+        # Write a new log, then swap it in
+        fn_temp = f"{self._fn}.tmp"
+        with open(fn_temp, 'w') as log_file:
+            log_file.write("\n".join(lines) + "\n")
+            if self._sync:
+                log_file.flush()
+                os.fsync(log_file.fileno())
+        os.replace(fn_temp, self._fn)
+        self._records = len(self._saved)
+
+    def GetSize(self):
+        return os.path.getsize(self._fn)
@@ -0,0 +1,286 @@
+# Imports
+import argparse
+import asyncio
+import secrets
+import sys
+import traceback
+from Adventure import *
+from Metrics import Metrics
+from Journal import Journal
+from Reload import WorldReloader, HR_TICK, HR_CHECK_INTERVAL
+from Hibernate import Hibernator, HB_TICK, HB_IDLE_TIMEOUT
+
+# Constants - server defaults
+S_HOST = "127.0.0.1"
+S_PORT = 4000
+S_BACKLOG = 4096
+S_PROMPT = "What next? "
+S_ENCODING = "utf-8"
+S_RESUME_TOKEN_BYTES = 16
+S_COMMAND_FAILED = "Sorry, something went wrong with that. Try something else."
+
+# Game output to an asyncio stream
+class StreamSink(OutputSink):
+    def __init__(self, writer):
+        super().__init__()
+        self._writer = writer
+
+    def WriteOut(self, text):
+        self._writer.write(text.encode(S_ENCODING))
+
+# One connected player, with their own game. A saved state picks up a game
+# that was being played elsewhere (see ShardServer.py). With a journal, every
+# command is made durable before it's answered, and a player who was cut off
+# can resume their game from the games left behind (see GameServer) with the
+# random token they were given, which also names the game in the journal. With
+# a reloader, the game is moved to a reloaded world before its next command.
+# With a hibernator, the game may be put away on disk between commands.
+class Session(object):
+    def __init__(self, session_id, reader, writer, state=None, journal=None, detached=None, reloader=None, hibernator=None):
+        self._session_id = session_id
+        self._reader = reader
+        self._writer = writer
+        self._sink = StreamSink(writer)
+        self._game = Game(sink=self._sink)
+        if state is not None:
+            self._game.SetState(state)
+        self._journal = journal
+        self._detached = detached
+        self._resume_token = secrets.token_urlsafe(S_RESUME_TOKEN_BYTES)
+        self._reloader = reloader
+        self._hibernator = hibernator
+
+        # Are we between turns, waiting for the player?
+        self._waiting = False
+
+    def GetSessionId(self):
+        return self._session_id
+
+    # What the player types to resume this game, and its name in the journal
+    def GetResumeToken(self):
+        return self._resume_token
+
+    def GetGame(self):
+        return self._game
+
+    # None while it's hibernating
+    def SetGame(self, game):
+        self._game = game
+
+    def GetSink(self):
+        return self._sink
+
+    # Between turns, with everything sent & nothing read ahead? A line already
+    # in the reader's buffer would be lost if the session were handed on, as
+    # only the socket goes with it (StreamReader has no public way to ask).
+    def IsIdle(self):
+        return (self._waiting and self._writer.transport.get_write_buffer_size() == 0
+                and len(self._reader._buffer) == 0)
+
+    # Send this turn's output to this player only
+    async def Send(self):
+        self._sink.Flush()
+        await self._writer.drain()
+
+    # Pick up a game left behind, if they asked to at the start. Returns True if they did.
+    def Resume(self, line):
+        words = line.split()
+        if self._detached is None or self._game.GetCommandCount() > 0:
+            return False
+        if len(words) != 2 or words[0] != "resume":
+            return False
+
+        game = self._detached.pop(words[1], None)
+        if game is None:
+            self._sink.Print("There's no game like that to resume.")
+        else:
+            self._resume_token = words[1]
+            self._game = game
+            self._game.SetSink(self._sink)
+            self._sink.Print("Welcome back!")
+        return True
+
+    # Tell the player where they are, then prompt for the next command
+    def Prompt(self):
+        self._game.DescribeLocation()
+        self._sink.Write(S_PROMPT)
+
+    # Main session loop
+    async def Run(self):
+        if self._journal is not None:
+            self._sink.Print(f"If you get cut off, reconnect and type: resume {self._resume_token}")
+        self.Prompt()
+        await self.Send()
+
+        while self._game.IsAlive():
+            # Wait for the next line, without blocking other players
+            self._waiting = True
+            line = await self._reader.readline()
+            self._waiting = False
+            if not line:
+                # Player hung up
+                break
+
+            # Do what they asked, in the newest world
+            if self._hibernator is not None:
+                self._hibernator.Wake(self)
+            user_input = line.decode(S_ENCODING, "replace")
+            if not self.Resume(user_input):
+                if self._reloader is not None:
+                    self._reloader.Migrate(self._game)
+                try:
+                    command = self._game.ProcessInput(user_input)
+                except Exception:
+                    # A bug in one command shouldn't cost the player their
+                    # game, or be replayed from the journal
+                    traceback.print_exc()
+                    self._sink.Print(S_COMMAND_FAILED)
+                    command = None
+
+                # Make it durable before answering
+                if self._journal is not None:
+                    if not self._game.IsAlive():
+                        self._journal.End(self._resume_token)
+                    elif command is not None and command.verb is not None:
+                        self._journal.Append(self._resume_token, self._game, command)
+                    await self._journal.WaitCommitted()
+
+            # Still playing? Then describe & prompt again
+            if self._game.IsAlive():
+                self.Prompt()
+            else:
+                self._sink.Write("\n")
+
+            await self.Send()
+            if self._hibernator is not None:
+                self._hibernator.Active(self)
+
+# Serves many independent sessions on one event loop. With a journal, games
+# are recovered from it at startup, and kept when their players hang up, until
+# they're resumed. With a reloader, changes to the world files are picked up
+# while everyone carries on playing. With a hibernator, idle players' games
+# are kept on disk rather than in memory.
+class GameServer(object):
+    def __init__(self, host=S_HOST, port=S_PORT, journal=None, reloader=None, hibernator=None):
+        self._host = host
+        self._port = port
+        self._sessions = {}
+        self._next_session_id = 1
+        self._journal = journal
+        self._reloader = reloader
+        self._hibernator = hibernator
+        self._detached = None
+        if journal is not None:
+            self._detached = journal.Recover()
+
+    def GetSessionCount(self):
+        return len(self._sessions)
+
+    # Every game being played or waiting to be resumed (hibernating games are
+    # moved to a reloaded world as they wake)
+    def GetGames(self):
+        games = [session.GetGame() for session in self._sessions.values() if session.GetGame() is not None]
+        if self._detached is not None:
+            games.extend(self._detached.values())
+        return games
+
+    # Keep the reloader going, a little at a time
+    async def TickReloader(self):
+        while True:
+            await asyncio.sleep(HR_TICK)
+            self._reloader.Tick(self.GetGames)
+
+    # Put idle games away every so often
+    async def TickHibernator(self):
+        while True:
+            await asyncio.sleep(HB_TICK)
+            self._hibernator.Tick()
+
+    # Called by asyncio for every new connection
+    async def HandleConnection(self, reader, writer):
+        # Create a session for the new player
+        session_id = self._next_session_id
+        session = Session(session_id, reader, writer, journal=self._journal, detached=self._detached,
+                          reloader=self._reloader, hibernator=self._hibernator)
+        self._next_session_id += 1
+        self._sessions[session_id] = session
+        if self._hibernator is not None:
+            self._hibernator.Add(session)
+
+        try:
+            await session.Run()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Player dropped, nothing else to do
+            pass
+        finally:
+            # Tidy up, keeping the game if it can be resumed
+            del self._sessions[session_id]
+            if self._hibernator is not None:
+                if self._detached is not None:
+                    self._hibernator.Wake(session)
+                self._hibernator.Remove(session)
+            game = session.GetGame()
+            if self._detached is not None and game.IsAlive() and game.GetCommandCount() > 0:
+                game.SetSink(NullSink())
+                self._detached[session.GetResumeToken()] = game
+            writer.close()
+
+    async def Serve(self):
+        server = await asyncio.start_server(self.HandleConnection, self._host, self._port, backlog=S_BACKLOG)
+        print(f"Adventure server listening on {self._host}:{self._port}")
+        if self._reloader is not None:
+            self._reload_task = asyncio.create_task(self.TickReloader())
+        if self._hibernator is not None:
+            self._hibernate_task = asyncio.create_task(self.TickHibernator())
+        if GetMetrics() is not None:
+            self._metrics_task = asyncio.create_task(GetMetrics().RunReports())
+        async with server:
+            await server.serve_forever()
+
+    def Run(self):
+        asyncio.run(self.Serve())
+
+# Start the server
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the Adventure game server")
+    arg_parser.add_argument("--host", default=S_HOST)
+    arg_parser.add_argument("--port", type=int, default=S_PORT)
+    arg_parser.add_argument("--metrics", help="write Prometheus metrics to this file")
+    arg_parser.add_argument("--metrics-every", type=float, default=10.0, help="seconds between metrics reports")
+    arg_parser.add_argument("--metrics-text", action="store_true", help="also print a metrics table to stderr")
+    arg_parser.add_argument("--slow-turn-ms", type=float, help="profile sampled turns slower than this")
+    arg_parser.add_argument("--profile-every", type=int, default=100, help="profile one turn in this many")
+    arg_parser.add_argument("--journal", help="journal commands to this file, recovering games from it at startup")
+    arg_parser.add_argument("--commit-delay-ms", type=float, default=0.0, help="wait this long to group more commands into each commit")
+    arg_parser.add_argument("--no-fsync", action="store_true", help="don't fsync the journal")
+    arg_parser.add_argument("--reload", action="store_true", help="pick up changes to the world files while running")
+    arg_parser.add_argument("--reload-every", type=float, default=HR_CHECK_INTERVAL, help="seconds between checks of the world files")
+    arg_parser.add_argument("--hibernate", metavar="FILE", help="keep idle games in this scratch file rather than in memory")
+    arg_parser.add_argument("--memory-budget-mb", type=float, help="hibernate the least recently used games to keep memory under this")
+    arg_parser.add_argument("--idle-timeout", type=float, default=HB_IDLE_TIMEOUT, help="hibernate games idle for this many seconds")
+    args = arg_parser.parse_args()
+
+    # Measure it all?
+    if args.metrics or args.metrics_text or args.slow_turn_ms is not None:
+        slow_turn = None
+        if args.slow_turn_ms is not None:
+            slow_turn = args.slow_turn_ms / 1000
+        SetMetrics(Metrics(args.metrics, args.metrics_every, sys.stderr if args.metrics_text else None,
+                           slow_turn, args.profile_every))
+
+    journal = None
+    if args.journal:
+        journal = Journal(args.journal, not args.no_fsync, args.commit_delay_ms / 1000)
+
+    reloader = None
+    if args.reload:
+        reloader = WorldReloader(check_interval=args.reload_every)
+
+    hibernator = None
+    if args.hibernate:
+        memory_budget = None
+        if args.memory_budget_mb is not None:
+            memory_budget = int(args.memory_budget_mb * 1048576)
+        hibernator = Hibernator(args.hibernate, memory_budget, args.idle_timeout, reloader)
+
+    GameServer(args.host, args.port, journal, reloader, hibernator).Run()
@@ -0,0 +1,380 @@
+# Spreads sessions over worker processes, so the game can use every core.
+#
+# The supervisor accepts connections and hands each one's socket to a worker,
+# which then talks to the player directly. A session stays on its worker
+# (chosen by session ID) unless the worker crashes or the workers get out of
+# balance. The supervisor keeps its own copy of every socket, so a session
+# can be moved without the player being disconnected, and keeps every
+# session's saved state, sent by the workers every so often, to carry on
+# from on the new worker.
+#
+# The world is compiled to world.snapshot once by the supervisor, and the
+# workers map that rather than each parsing the JSON.
+#
+# Supervisor & workers talk over Unix SEQPACKET sockets, one JSON message per
+# packet, with sockets passed alongside:
+#   to workers:   {"op": "adopt", "s": id, "state": state} + socket
+#                 {"op": "release", "s": id}
+#   from workers: {"op": "ready"}                  started & has the world loaded
+#                 {"op": "state", "s": id, "full" | "d": state or delta}
+#                 {"op": "released", "s": id, "state": state}
+#                 {"op": "kept", "s": id}          couldn't release it right now
+#                 {"op": "ended", "s": id}         the player quit or hung up
+
+# Imports
+import argparse
+import array
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+from Adventure import *
+from Server import S_HOST, S_PORT, S_BACKLOG, Session
+
+# Constants - defaults
+SH_WORKERS = os.cpu_count() or 1
+SH_CHECKPOINT = 0.5
+SH_REBALANCE = 5.0
+
+# Constants - rebalance once the busiest worker has this much more than its share
+SH_IMBALANCE = 1.25
+
+# Constants - biggest control message
+SH_MAX_MESSAGE = 1 << 20
+
+# Send a control message, with a socket if there is one
+def SendMessage(control, message, connection=None):
+    data = json.dumps(message, separators=(',', ':')).encode()
+    if connection is None:
+        control.sendall(data)
+    else:
+        socket.send_fds(control, [data], [connection.fileno()])
+
+# Read a waiting control message. Returns (message, socket), (None, None) if
+# the other end has gone, or raises BlockingIOError if nothing is waiting.
+def ReceiveMessage(control):
+    # Not socket.recv_fds, which ignores the flags
+    fds = array.array('i')
+    data, ancillary, flags, address = control.recvmsg(SH_MAX_MESSAGE, socket.CMSG_LEN(fds.itemsize), socket.MSG_DONTWAIT)
+    if not data:
+        return None, None
+    connection = None
+    for level, kind, fd_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(fd_data[:len(fd_data) - (len(fd_data) % fds.itemsize)])
+    if len(fds) > 0:
+        connection = socket.socket(fileno=fds[0])
+    return json.loads(data), connection
+
+# A worker process, running the sessions it's handed
+class ShardWorker(object):
+    def __init__(self, control, checkpoint_every=SH_CHECKPOINT):
+        self._control = control
+        self._checkpoint_every = checkpoint_every
+
+        # Session ID -> (Session, task), and what we last told the supervisor
+        # about each one, as (command count, state)
+        self._sessions = {}
+        self._saved = {}
+        self._released = set()
+        self._stopped = None
+
+    async def Serve(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = loop.create_future()
+        loop.add_reader(self._control.fileno(), self.OnControl)
+        SendMessage(self._control, {"op": "ready"})
+
+        # Tell the supervisor how play is going, until it goes away
+        while not self._stopped.done():
+            await asyncio.wait([self._stopped], timeout=self._checkpoint_every)
+            self.Checkpoint()
+
+    # Called by the event loop when the supervisor has sent something
+    def OnControl(self):
+        while True:
+            try:
+                message, connection = ReceiveMessage(self._control)
+            except BlockingIOError:
+                return
+            if message is None:
+                # The supervisor has gone, so should we
+                asyncio.get_running_loop().remove_reader(self._control.fileno())
+                if not self._stopped.done():
+                    self._stopped.set_result(None)
+                return
+
+            if message["op"] == "adopt":
+                session_id = message["s"]
+                task = asyncio.create_task(self.RunSession(session_id, connection, message["state"]))
+                self._sessions[session_id] = (None, task)
+            elif message["op"] == "release":
+                self.Release(message["s"])
+
+    # Play one session, until it ends or is released
+    async def RunSession(self, session_id, connection, state):
+        connection.setblocking(False)
+        reader, writer = await asyncio.open_connection(sock=connection)
+        session = Session(session_id, reader, writer, state)
+        self._sessions[session_id] = (session, self._sessions[session_id][1])
+        self._saved[session_id] = (session.GetGame().GetCommandCount(), state)
+
+        try:
+            await session.Run()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Player dropped, nothing else to do
+            pass
+        except asyncio.CancelledError:
+            # Released, another worker is carrying on
+            pass
+        finally:
+            # Only our copy of the socket is closed, the player is still connected
+            writer.close()
+            del self._sessions[session_id]
+            self._saved.pop(session_id, None)
+            if session_id in self._released:
+                self._released.discard(session_id)
+            else:
+                SendMessage(self._control, {"op": "ended", "s": session_id})
+
+    # Hand a session back to the supervisor, if it's between turns
+    def Release(self, session_id):
+        session, task = self._sessions.get(session_id, (None, None))
+        if session is None or not session.IsIdle():
+            SendMessage(self._control, {"op": "kept", "s": session_id})
+            return
+
+        self._released.add(session_id)
+        SendMessage(self._control, {"op": "released", "s": session_id, "state": session.GetGame().GetState()})
+        task.cancel()
+
+    # Send the changes to every session that's been played since last time
+    def Checkpoint(self):
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id][0]
+            if session is None or session_id in self._released:
+                continue
+            game = session.GetGame()
+            command_count, state = self._saved[session_id]
+            if command_count == game.GetCommandCount():
+                continue
+
+            new_state = game.GetState()
+            if state is None:
+                SendMessage(self._control, {"op": "state", "s": session_id, "full": new_state})
+            else:
+                delta = DiffState(state, new_state)
+                if len(delta) > 0:
+                    SendMessage(self._control, {"op": "state", "s": session_id, "d": delta})
+            self._saved[session_id] = (game.GetCommandCount(), new_state)
+
+# Where worker processes start
+def RunWorker(control, checkpoint_every):
+    # Map the snapshot the supervisor compiled
+    GetDefaultWorld()
+    asyncio.run(ShardWorker(control, checkpoint_every).Serve())
+
+# The supervisor's view of one worker process
+class WorkerHandle(object):
+    def __init__(self, index, process, control):
+        self._index = index
+        self._process = process
+        self._control = control
+        self._session_ids = set()
+        self._ready = asyncio.get_running_loop().create_future()
+
+    def GetIndex(self):
+        return self._index
+
+    def GetProcess(self):
+        return self._process
+
+    def GetControl(self):
+        return self._control
+
+    def GetSessionIds(self):
+        return self._session_ids
+
+    # Resolved once the worker has started
+    def GetReady(self):
+        return self._ready
+
+# The supervisor
+class ShardServer(object):
+    def __init__(self, host=S_HOST, port=S_PORT, workers=SH_WORKERS,
+                 checkpoint_every=SH_CHECKPOINT, rebalance_every=SH_REBALANCE):
+        self._host = host
+        self._port = port
+        self._worker_count = max(1, workers)
+        self._checkpoint_every = checkpoint_every
+        self._rebalance_every = rebalance_every
+        self._context = multiprocessing.get_context("spawn")
+
+        # The workers, and every session: ID -> {"socket", "worker", "state", "moving"}
+        self._workers = []
+        self._sessions = {}
+        self._next_session_id = 1
+        self._crashes = 0
+        self._moves = 0
+
+    def GetSessionCount(self):
+        return len(self._sessions)
+
+    def GetWorkers(self):
+        return self._workers
+
+    def GetStats(self):
+        return {
+            'sessions': len(self._sessions),
+            'per_worker': [len(worker.GetSessionIds()) for worker in self._workers],
+            'crashes': self._crashes,
+            'moves': self._moves
+        }
+
+    # Start a worker process in a slot
+    def StartWorker(self, index):
+        control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = self._context.Process(target=RunWorker, args=(worker_control, self._checkpoint_every), daemon=True)
+        process.start()
+        worker_control.close()
+
+        worker = WorkerHandle(index, process, control)
+        asyncio.get_running_loop().add_reader(control.fileno(), self.OnWorkerMessage, worker)
+        if index < len(self._workers):
+            self._workers[index] = worker
+        else:
+            self._workers.append(worker)
+        return worker
+
+    # Give a session to a worker
+    def Assign(self, session_id, worker):
+        session = self._sessions[session_id]
+        session["worker"] = worker
+        session["moving"] = None
+        worker.GetSessionIds().add(session_id)
+        try:
+            SendMessage(worker.GetControl(), {"op": "adopt", "s": session_id, "state": session["state"]}, session["socket"])
+        except OSError:
+            # It's crashed, the session will be moved along with the rest
+            pass
+
+    # Called by the event loop when a worker has sent something
+    def OnWorkerMessage(self, worker):
+        while True:
+            try:
+                message, connection = ReceiveMessage(worker.GetControl())
+            except BlockingIOError:
+                return
+            except OSError:
+                message = None
+            if message is None:
+                self.HandleCrash(worker)
+                return
+
+            if message["op"] == "ready":
+                worker.GetReady().set_result(None)
+                continue
+            session = self._sessions.get(message["s"])
+            if session is None:
+                continue
+            if message["op"] == "state":
+                if "full" in message:
+                    session["state"] = message["full"]
+                else:
+                    session["state"] = ApplyStateDelta(session["state"], message["d"])
+            elif message["op"] == "released":
+                # Carry on with it on its new worker
+                session["state"] = message["state"]
+                worker.GetSessionIds().discard(message["s"])
+                self._moves += 1
+                self.Assign(message["s"], session["moving"])
+            elif message["op"] == "kept":
+                session["moving"] = None
+            elif message["op"] == "ended":
+                worker.GetSessionIds().discard(message["s"])
+                session["socket"].close()
+                del self._sessions[message["s"]]
+
+    # A worker has died. Start another in its place, and carry on its sessions
+    # elsewhere from their last saved state.
+    def HandleCrash(self, worker):
+        asyncio.get_running_loop().remove_reader(worker.GetControl().fileno())
+        worker.GetControl().close()
+        worker.GetProcess().join(1)
+        self._crashes += 1
+
+        replacement = self.StartWorker(worker.GetIndex())
+        for session_id in sorted(worker.GetSessionIds()):
+            self.Assign(session_id, self.GetLeastLoaded())
+
+        # Sessions that were on their way to the dead worker go to its replacement
+        for session_id in self._sessions:
+            session = self._sessions[session_id]
+            if session["moving"] is worker:
+                session["moving"] = replacement
+
+    def GetLeastLoaded(self):
+        return min(self._workers, key=lambda worker: len(worker.GetSessionIds()))
+
+    # Move sessions off any worker with much more than its share
+    def Rebalance(self):
+        share = len(self._sessions) / len(self._workers)
+        loads = {worker: len(worker.GetSessionIds()) for worker in self._workers}
+        for worker in self._workers:
+            for session_id in sorted(worker.GetSessionIds()):
+                if loads[worker] <= share * SH_IMBALANCE or loads[worker] - min(loads.values()) < 2:
+                    break
+                session = self._sessions[session_id]
+                if session["moving"] is not None:
+                    continue
+
+                # Ask for it back, it'll go to the quietest worker
+                target = min(loads, key=loads.get)
+                session["moving"] = target
+                loads[worker] -= 1
+                loads[target] += 1
+                SendMessage(worker.GetControl(), {"op": "release", "s": session_id})
+
+    async def RebalanceLoop(self):
+        while True:
+            await asyncio.sleep(self._rebalance_every)
+            self.Rebalance()
+
+    async def Serve(self):
+        # Compile the world once, for every worker to share
+        GetDefaultWorld()
+        for index in range(self._worker_count):
+            self.StartWorker(index)
+        await asyncio.gather(*[worker.GetReady() for worker in self._workers])
+
+        listener = socket.create_server((self._host, self._port), backlog=S_BACKLOG, reuse_port=False)
+        listener.setblocking(False)
+        print(f"Adventure shard server listening on {self._host}:{self._port} with {self._worker_count} workers")
+        asyncio.create_task(self.RebalanceLoop())
+
+        loop = asyncio.get_running_loop()
+        while True:
+            connection, address = await loop.sock_accept(listener)
+            connection.setblocking(True)
+
+            # Sticky by session ID
+            session_id = self._next_session_id
+            self._next_session_id += 1
+            self._sessions[session_id] = {"socket": connection, "worker": None, "state": None, "moving": None}
+            self.Assign(session_id, self._workers[session_id % len(self._workers)])
+
+    def Run(self):
+        asyncio.run(self.Serve())
+
+# Start the server
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the Adventure game server over several processes")
+    arg_parser.add_argument("--host", default=S_HOST)
+    arg_parser.add_argument("--port", type=int, default=S_PORT)
+    arg_parser.add_argument("--workers", type=int, default=SH_WORKERS)
+    arg_parser.add_argument("--checkpoint-every", type=float, default=SH_CHECKPOINT, help="seconds between saved states")
+    arg_parser.add_argument("--rebalance-every", type=float, default=SH_REBALANCE)
+    args = arg_parser.parse_args()
+
+    ShardServer(args.host, args.port, args.workers, args.checkpoint_every, args.rebalance_every).Run()
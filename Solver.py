@@ -0,0 +1,425 @@
+# Finds the shortest walkthrough of a world, or shows there isn't one.
+#
+# Game states are searched breadth first, by trying commands the game's verbs
+# understand. A state is the game's saved state (what has changed from the
+# starting world: where the player is, item locations, open & locked flags
+# and opened exits) as sorted JSON, so the same state always looks the same.
+# States already seen are remembered by a 16 byte hash of that. Only the
+# current level of the search is kept whole; everything before it is just its
+# hash, the hash it came from & the command that got there.
+#
+# A goal is one or more conditions, separated by commas, that must all hold
+# at once:
+#   at:<location>        the player is there
+#   carrying:<item>      the player is holding it
+#   open:<item>          the container is open
+#   unlocked:<item>      the container is unlocked
+#   unblocked:<location> the blocked exit there has been opened
+# With no goals given, every location that can't be walked to from the start
+# (it's behind a blocked exit) is a goal of its own.
+#
+# By default only commands that get somewhere are tried: moving, opening
+# blocked exits, and getting, opening & unlocking the items that matter (goal
+# items, whatever opens a blocked exit, the containers those are in & their
+# keys). None of the built-in verbs ever need anything dropped, put away,
+# closed or locked first, so this finds the same answers & keeps worlds with
+# thousands of items small. --all-verbs tries everything.
+#
+# Big levels are split over worker processes. Every walkthrough found is then
+# played through a new game, as typed, to check it really does get there.
+
+# Imports
+import argparse
+import hashlib
+import json
+import multiprocessing
+import sys
+import time
+from Adventure import *
+
+# Constants - bytes of each state's hash, and the most states to look at
+SV_DIGEST_SIZE = 16
+SV_MAX_STATES = 10000000
+
+# Constants - levels smaller than this are done here rather than in worker
+# processes, and how many states each worker job gets
+SV_MIN_PARALLEL = 1024
+SV_CHUNK_SIZE = 256
+
+# Constants - what a goal can ask for
+SV_CONDITIONS = ["at", "carrying", "open", "unlocked", "unblocked"]
+
+# A game state as canonical text, and its hash
+def EncodeState(state):
+    return json.dumps(state, sort_keys=True, separators=(',', ':'))
+
+def HashState(encoded):
+    return hashlib.blake2b(encoded.encode(), digest_size=SV_DIGEST_SIZE).digest()
+
+# Is a location's blocked exit still blocked?
+def IsBlocked(location):
+    blocked_exit_dict = location.GetBlockedExit()
+    if "name" not in blocked_exit_dict:
+        return False
+    exits = location.GetExits()
+    new_exits = blocked_exit_dict["exits"]
+    return any(exits.get(direction) != new_exits[direction] for direction in new_exits)
+
+# Something to reach, e.g. "at:cabin_basement" or "at:cabin_basement,carrying:bottle"
+class Goal(object):
+    def __init__(self, spec, world):
+        self._spec = spec
+        self._conditions = []
+        for part in spec.split(","):
+            kind, separator, name = part.strip().partition(":")
+            if kind not in SV_CONDITIONS:
+                raise ValueError(f"Don't know how to reach '{part}', try one of {', '.join(SV_CONDITIONS)}")
+            if kind == "at" or kind == "unblocked":
+                if name not in world.GetMap():
+                    raise ValueError(f"There's no location called '{name}'")
+            elif name not in world.GetItems():
+                raise ValueError(f"There's no item called '{name}'")
+            self._conditions.append((kind, name))
+
+    def GetSpec(self):
+        return self._spec
+
+    def GetItemNames(self):
+        return [name for kind, name in self._conditions if kind != "at" and kind != "unblocked"]
+
+    def IsMet(self, game):
+        items = game.GetItems()
+        for kind, name in self._conditions:
+            if kind == "at":
+                if game.GetLocation().GetLocationName() != name:
+                    return False
+            elif kind == "carrying":
+                if items[name].GetLocationName() != L_CARRIED:
+                    return False
+            elif kind == "open":
+                if not items[name].GetOpen():
+                    return False
+            elif kind == "unlocked":
+                if items[name].GetLocked():
+                    return False
+            elif IsBlocked(game.GetMap()[name]):
+                return False
+        return True
+
+# Every location behind a blocked exit, as goals
+def GetDefaultGoals(world):
+    graph = world.GetGraph()
+    reached = graph.FindReachable(world.GetStartLocation().GetLocationId())
+    return [Goal(f"at:{graph.GetLocationName(location_id)}", world) for location_id in range(len(reached)) if not reached[location_id]]
+
+# The items that could matter for reaching the goals
+def FindUsefulItems(world, goals):
+    items = world.GetItems()
+    location_map = world.GetMap()
+    wanted = []
+    for goal in goals:
+        wanted.extend(goal.GetItemNames())
+    for location_name in location_map:
+        target = location_map[location_name].GetBlockedExit().get("target")
+        if target is not None:
+            wanted.append(target)
+
+    useful = set()
+    while len(wanted) > 0:
+        item_name = wanted.pop()
+        if item_name in useful or item_name not in items:
+            continue
+        useful.add(item_name)
+
+        # The container it's in, and the key to it, matter too
+        item = items[item_name]
+        if item.GetLocationName() in items:
+            wanted.append(item.GetLocationName())
+        if item.GetContainer() and item.GetRequiresToUnlock() != "":
+            wanted.append(item.GetRequiresToUnlock())
+    return useful
+
+# Tries commands from game states to find the states they lead to
+class StateExpander(object):
+    def __init__(self, world, goals, all_verbs=False):
+        self._game = Game(world, NullSink())
+        self._goals = goals
+        self._all_verbs = all_verbs
+        self._useful = None if all_verbs else FindUsefulItems(world, goals)
+
+    def GetGame(self):
+        return self._game
+
+    # The commands worth trying where the game is now, as (text, command)
+    def GetActions(self):
+        game = self._game
+        items = game.GetItems()
+        location = game.GetLocation()
+        actions = []
+
+        for direction in location.GetExits():
+            actions.append((f"go {direction}", Command("go", direction, None, None)))
+
+        # Everything in reach, here & carried
+        reachable = items.GetVisibleAt(location.GetLocationName()) + items.GetVisibleAt(L_CARRIED)
+        reachable_names = set(reachable)
+        open_containers = []
+        for item_name in reachable:
+            if self._useful is not None and item_name not in self._useful:
+                continue
+            item = items[item_name]
+            carried = item.GetLocationName() == L_CARRIED
+            if item.GetGetable() and not carried:
+                actions.append((f"get {item_name}", Command("get", item_name, None, None)))
+
+            if item.GetContainer():
+                key_name = item.GetRequiresToUnlock()
+                if item.GetLocked():
+                    if key_name in reachable_names:
+                        actions.append((f"unlock {item_name} with {key_name}", Command("unlock", item_name, "with", key_name)))
+                elif not item.GetOpen():
+                    actions.append((f"open {item_name}", Command("open", item_name, None, None)))
+                    if self._all_verbs and key_name in reachable_names:
+                        actions.append((f"lock {item_name} with {key_name}", Command("lock", item_name, "with", key_name)))
+                elif self._all_verbs:
+                    actions.append((f"close {item_name}", Command("close", item_name, None, None)))
+                    open_containers.append(item_name)
+
+            if self._all_verbs and carried:
+                actions.append((f"drop {item_name}", Command("drop", item_name, None, None)))
+
+        # Putting anything in anything
+        if self._all_verbs:
+            for item_name in reachable:
+                if items[item_name].GetGetable():
+                    for container_name in open_containers:
+                        if container_name != item_name and items[item_name].GetLocationName() != container_name:
+                            actions.append((f"put {item_name} in {container_name}", Command("put", item_name, "in", container_name)))
+
+        # Smashing through the blocked exit
+        if IsBlocked(location):
+            blocked_exit_dict = location.GetBlockedExit()
+            if blocked_exit_dict["target"] in reachable_names:
+                text = f"hit {blocked_exit_dict['name']} with {blocked_exit_dict['target']}"
+                actions.append((text, Command("hit", blocked_exit_dict["name"], "with", blocked_exit_dict["target"])))
+        return actions
+
+    # The states one command away from a state, as (hash, state, command, goals met)
+    def Expand(self, encoded):
+        game = self._game
+        state = json.loads(encoded)
+        game.SetState(state)
+        children = []
+        changed = False
+        for text, command in self.GetActions():
+            # Back to where we were, if the last command changed anything
+            if changed:
+                game.SetState(state)
+            game.DoCommand(command)
+            child = EncodeState(game.GetState())
+            changed = child != encoded
+            if changed:
+                met = [index for index, goal in enumerate(self._goals) if goal.IsMet(game)]
+                children.append((HashState(child), child, text, met))
+        return children
+
+    def ExpandAll(self, encoded_states):
+        return [self.Expand(encoded) for encoded in encoded_states]
+
+# The world from its files, sharing the default one if that's what they are
+def OpenWorld(fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_verbs=FN_VERBS):
+    if fn_locations == FN_LOCATIONS and fn_items == FN_ITEMS and fn_verbs == FN_VERBS:
+        return GetDefaultWorld()
+    return World(fn_locations, fn_items, fn_verbs)
+
+# Worker processes each have their own world & expander
+_worker_expander = None
+
+def StartSolverWorker(world_files, goal_specs, all_verbs):
+    global _worker_expander
+    world = OpenWorld(*world_files)
+    _worker_expander = StateExpander(world, [Goal(spec, world) for spec in goal_specs], all_verbs)
+
+def ExpandInWorker(encoded_states):
+    return _worker_expander.ExpandAll(encoded_states)
+
+# Breadth first search of a world's states
+class Solver(object):
+    def __init__(self, fn_locations=FN_LOCATIONS, fn_items=FN_ITEMS, fn_verbs=FN_VERBS, goal_specs=None,
+                 all_verbs=False, processes=0, max_states=SV_MAX_STATES):
+        self._world_files = (fn_locations, fn_items, fn_verbs)
+        self._world = OpenWorld(fn_locations, fn_items, fn_verbs)
+        if goal_specs is None:
+            self._goals = GetDefaultGoals(self._world)
+        else:
+            self._goals = [Goal(spec, self._world) for spec in goal_specs]
+        self._all_verbs = all_verbs
+        self._expander = StateExpander(self._world, self._goals, all_verbs)
+        self._processes = processes
+        self._max_states = max_states
+        self._pool = None
+        self._stats = {}
+
+    def GetWorld(self):
+        return self._world
+
+    def GetGoals(self):
+        return self._goals
+
+    # How the last search went: states seen, levels searched, seconds taken,
+    # and whether every reachable state was seen
+    def GetStats(self):
+        return self._stats
+
+    # Search until every goal is reached or there are no new states left.
+    # Returns a walkthrough (list of commands) for each goal, or None if it
+    # wasn't reached; if the search was complete, it can't be.
+    def Solve(self):
+        start = time.perf_counter()
+        root = EncodeState(Game(self._world, NullSink()).GetState())
+        root_digest = HashState(root)
+        parents = {root_digest: None}
+        commands = {}
+        found = {}
+
+        # Anything done already?
+        start_game = Game(self._world, NullSink())
+        for index, goal in enumerate(self._goals):
+            if goal.IsMet(start_game):
+                found[index] = root_digest
+
+        frontier = [root]
+        frontier_digests = [root_digest]
+        levels = 0
+        complete = False
+        try:
+            while len(found) < len(self._goals):
+                if len(frontier) == 0:
+                    # Seen everything
+                    complete = True
+                    break
+                if len(parents) >= self._max_states:
+                    break
+
+                next_frontier = []
+                next_digests = []
+                for parent_digest, children in zip(frontier_digests, self.ExpandLevel(frontier)):
+                    for digest, child, text, met in children:
+                        if digest in parents:
+                            continue
+                        parents[digest] = (parent_digest, commands.setdefault(text, text))
+                        next_frontier.append(child)
+                        next_digests.append(digest)
+                        for index in met:
+                            if index not in found:
+                                found[index] = digest
+                frontier = next_frontier
+                frontier_digests = next_digests
+                levels += 1
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+        self._stats = {
+            'states': len(parents),
+            'levels': levels,
+            'seconds': time.perf_counter() - start,
+            'complete': complete
+        }
+        return [self.GetWalkthrough(parents, found[index]) if index in found else None for index in range(len(self._goals))]
+
+    # The children of every state in a level, in order
+    def ExpandLevel(self, frontier):
+        if self._processes <= 1 or len(frontier) < SV_MIN_PARALLEL:
+            yield from self._expander.ExpandAll(frontier)
+            return
+
+        # Share it out
+        if self._pool is None:
+            goal_specs = [goal.GetSpec() for goal in self._goals]
+            self._pool = multiprocessing.Pool(self._processes, StartSolverWorker, (self._world_files, goal_specs, self._all_verbs))
+        chunks = [frontier[index:index + SV_CHUNK_SIZE] for index in range(0, len(frontier), SV_CHUNK_SIZE)]
+        for chunk_children in self._pool.imap(ExpandInWorker, chunks):
+            yield from chunk_children
+
+    # Follow the trail back to the start
+    def GetWalkthrough(self, parents, digest):
+        walkthrough = []
+        while parents[digest] is not None:
+            digest, text = parents[digest]
+            walkthrough.append(text)
+        walkthrough.reverse()
+        return walkthrough
+
+# Play a walkthrough through a new game, as typed, and see if it reaches a goal
+def Verify(world, walkthrough, goal):
+    game = Game(world, NullSink())
+    for user_input in walkthrough:
+        game.ProcessInput(user_input)
+        if not game.IsAlive():
+            break
+    return goal.IsMet(game)
+
+# Read a walkthrough, one command per line (blank lines & #s ignored)
+def ReadWalkthrough(fn):
+    with open(fn, 'r') as walkthrough_file:
+        lines = [line.strip() for line in walkthrough_file]
+    return [line for line in lines if line != "" and not line.startswith("#")]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Find the shortest walkthrough of an Adventure world, or show there isn't one")
+    arg_parser.add_argument("--locations", default=FN_LOCATIONS)
+    arg_parser.add_argument("--items", default=FN_ITEMS)
+    arg_parser.add_argument("--verbs", default=FN_VERBS)
+    arg_parser.add_argument("--goal", action="append", help="e.g. at:cabin_basement (default: every location behind a blocked exit)")
+    arg_parser.add_argument("--all-verbs", action="store_true", help="try every command, not just ones that get somewhere")
+    arg_parser.add_argument("--processes", type=int, default=0, help="worker processes for big levels")
+    arg_parser.add_argument("--max-states", type=int, default=SV_MAX_STATES)
+    arg_parser.add_argument("--verify", metavar="FILE", help="just check a walkthrough reaches the goals")
+    args = arg_parser.parse_args()
+
+    try:
+        solver = Solver(args.locations, args.items, args.verbs, args.goal, args.all_verbs, args.processes, args.max_states)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    world = solver.GetWorld()
+    goals = solver.GetGoals()
+    if len(goals) == 0:
+        print("Nothing to do, everywhere can be walked to from the start")
+        sys.exit(0)
+
+    # Check someone else's walkthrough?
+    if args.verify is not None:
+        walkthrough = ReadWalkthrough(args.verify)
+        failed = 0
+        for goal in goals:
+            reached = Verify(world, walkthrough, goal)
+            print(f"{goal.GetSpec()}: {'reached' if reached else 'NOT reached'} in {len(walkthrough)} moves")
+            failed += 0 if reached else 1
+        sys.exit(1 if failed > 0 else 0)
+
+    walkthroughs = solver.Solve()
+    stats = solver.GetStats()
+    failed = 0
+    for goal, walkthrough in zip(goals, walkthroughs):
+        if walkthrough is None:
+            failed += 1
+            if stats['complete']:
+                print(f"{goal.GetSpec()}: unwinnable, not reached from any of the {stats['states']} states the game can get into")
+            else:
+                print(f"{goal.GetSpec()}: not reached in the first {stats['states']} states (see --max-states)")
+            continue
+
+        # Check it, as a player would type it
+        verified = Verify(world, walkthrough, goal)
+        failed += 0 if verified else 1
+        print(f"{goal.GetSpec()}: {len(walkthrough)} moves, {'verified' if verified else 'FAILED verification'}")
+        for user_input in walkthrough:
+            print(f"  {user_input}")
+
+    print(f"Searched {stats['states']} states over {stats['levels']} levels in {stats['seconds']:.2f}s "
+          f"({stats['states'] / max(stats['seconds'], 1e-9):.0f} states/s)", file=sys.stderr)
+    sys.exit(1 if failed > 0 else 0)
@@ -0,0 +1,189 @@
+# Measures the stateless HTTP API: requests per second handled in process &
+# over HTTP keep-alive connections to a server in another process, and how
+# big state tokens get as games go on, next to the plain JSON state. Checks
+# that games played through tokens say exactly what a game kept in memory
+# says, that any server with the key takes any other's tokens, and that
+# tampered tokens, other keys & other worlds (even the same world with an
+# item moved) are refused.
+
+# Imports
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from HttpApi import *
+import worldgen
+
+KEY = b"benchmark key"
+WALKTHROUGH = [
+    "go out", "go up", "get key", "go down", "go south", "go down", "unlock chest with key",
+    "open chest", "get sledgehammer", "go up", "go north", "go in", "hit trapdoor with sledgehammer", "go down"
+]
+
+# A game kept in memory, to check the tokens against
+class ShadowGame(object):
+    def __init__(self, world):
+        self._sink = ObservationSink()
+        self._game = Game(world, self._sink)
+
+    def GetGame(self):
+        return self._game
+
+    def Play(self, user_input):
+        if user_input is not None:
+            self._game.ProcessInput(user_input)
+        if self._game.IsAlive():
+            self._game.DescribeLocation()
+        return self._sink.Take()
+
+# Wander about picking things up, choosing from what the shadow game sees
+def ChooseCommand(game, rng):
+    here = game.GetItems().GetItemsAt(game.GetLocation().GetLocationName())
+    if len(here) > 0 and rng.random() < 0.3:
+        return f"get {rng.choice(here)}"
+    return f"go {rng.choice(list(game.GetLocation().GetExits()))}"
+
+# Play through tokens & in memory side by side. Returns the number of
+# outputs that differed & (turn, token bytes, JSON state bytes) as it went.
+def PlayAlongside(token_game, world, commands, rng, turns):
+    shadow = ShadowGame(world)
+    response = token_game.Play(None, None)
+    wrong = int(response["output"] != shadow.Play(None))
+    sizes = []
+    for turn in range(1, turns + 1):
+        user_input = commands[turn - 1] if commands is not None else ChooseCommand(shadow.GetGame(), rng)
+        response = token_game.Play(response["token"], user_input)
+        wrong += int(response["output"] != shadow.Play(user_input))
+        state_bytes = len(json.dumps(shadow.GetGame().GetState(), separators=(',', ':')))
+        sizes.append((turn, len(response["token"]), state_bytes))
+    return wrong, sizes
+
+def ReportSizes(label, sizes, turns_shown):
+    for turn, token_bytes, state_bytes in sizes:
+        if turn in turns_shown:
+            print(f"  {label} turn {turn:4d}: token {token_bytes:5d} bytes, JSON state {state_bytes:6d} bytes")
+
+# Requests handled in process, without HTTP
+def MeasureInProcess(token_game, count):
+    bodies = []
+    response = token_game.Play(None, None)
+    for index in range(len(WALKTHROUGH)):
+        bodies.append(json.dumps({'token': response["token"], 'command': WALKTHROUGH[index]}))
+        response = token_game.Play(response["token"], WALKTHROUGH[index])
+    start = time.perf_counter()
+    for index in range(count):
+        status, response = token_game.HandleBody(bodies[index % len(bodies)])
+    return count / (time.perf_counter() - start)
+
+def RunServer(port):
+    ApiServer(HA_HOST, port, KEY).Run()
+
+def GetFreePort():
+    with socket.socket() as probe:
+        probe.bind((HA_HOST, 0))
+        return probe.getsockname()[1]
+
+async def Post(reader, writer, request):
+    body = json.dumps(request).encode()
+    writer.write(f"POST {HA_PATH} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, separator, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+# One player replaying the walkthrough over & over on one connection
+async def PlayOverHttp(port, deadline, counts):
+    reader, writer = await asyncio.open_connection(HA_HOST, port)
+    while time.perf_counter() < deadline:
+        status, response = await Post(reader, writer, {})
+        for user_input in WALKTHROUGH:
+            status, response = await Post(reader, writer, {'token': response["token"], 'command': user_input})
+            assert status == 200, response
+            counts[0] += 1
+    writer.close()
+
+async def MeasureHttp(port, clients, seconds):
+    counts = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*[PlayOverHttp(port, start + seconds, counts) for index in range(clients)])
+    return counts[0] / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check the stateless HTTP API")
+    arg_parser.add_argument("--requests", type=int, default=20000, help="requests handled in process")
+    arg_parser.add_argument("--clients", type=int, default=32, help="keep-alive connections over HTTP")
+    arg_parser.add_argument("--seconds", type=float, default=5.0, help="time spent sending requests over HTTP")
+    arg_parser.add_argument("--locations", type=int, default=20000)
+    arg_parser.add_argument("--items", type=int, default=20000)
+    arg_parser.add_argument("--turns", type=int, default=500, help="turns wandering the generated world")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    world = GetDefaultWorld()
+    token_game = TokenGame(world, KEY)
+
+    # Token sizes, checking outputs as we go
+    wrong, sizes = PlayAlongside(token_game, world, WALKTHROUGH, rng, len(WALKTHROUGH))
+    ReportSizes("shipped world", sizes, [1, 3, 9, len(WALKTHROUGH)])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_locations, fn_items = worldgen.WriteWorld(temp_dir, args.locations, args.items, args.seed)
+        big_world = LoadWorld(fn_locations, fn_items, os.path.join(temp_dir, "world.snapshot"))
+        big_wrong, big_sizes = PlayAlongside(TokenGame(big_world, KEY), big_world, None, rng, args.turns)
+        ReportSizes(f"{args.locations} locations", big_sizes, [1, 10, 50, 100, 200, args.turns])
+        other_world_token = TokenGame(big_world, KEY).Play(None, None)["token"]
+
+        # The shipped world with the key somewhere else
+        with open(FN_ITEMS, 'r') as items_file:
+            item_dicts = json.load(items_file)
+        for item_dict in item_dicts:
+            if item_dict["name"] == "key":
+                item_dict["location_name"] = "outside_cabin"
+        fn_moved = os.path.join(temp_dir, "moved.json")
+        worldgen.WriteJSONList(fn_moved, item_dicts)
+        moved_world = LoadWorld(FN_LOCATIONS, fn_moved, os.path.join(temp_dir, "moved.snapshot"))
+    wrong += big_wrong
+
+    # Any server takes any other's tokens, but only with the key & the world
+    token = token_game.Play(None, "go out")["token"]
+    elsewhere = TokenGame(world, KEY).HandleBody(json.dumps({'token': token, 'command': "go up"}))[0]
+    tampered = token_game.HandleBody(json.dumps({'token': token[:-3] + ("A" if token[-3] != "A" else "B") + token[-2:]}))[0]
+    other_key = TokenGame(world, b"another key").HandleBody(json.dumps({'token': token}))[0]
+    other_world = token_game.HandleBody(json.dumps({'token': other_world_token}))[0]
+    moved = TokenGame(moved_world, KEY).HandleBody(json.dumps({'token': token}))[0]
+
+    # Throughput
+    in_process = MeasureInProcess(token_game, args.requests)
+    print(f"  in process: {in_process:8.0f} requests/s ({1000000 / in_process:.1f}us each)")
+    port = GetFreePort()
+    server = multiprocessing.Process(target=RunServer, args=(port,), daemon=True)
+    server.start()
+    for attempt in range(100):
+        try:
+            socket.create_connection((HA_HOST, port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    over_http = asyncio.run(MeasureHttp(port, args.clients, args.seconds))
+    server.terminate()
+    server.join()
+    print(f"  over HTTP, {args.clients} keep-alive connections: {over_http:8.0f} requests/s ({os.cpu_count()} cores, shared with the clients)")
+
+    print(f"  check: {wrong} outputs differed from a game in memory; another server {elsewhere}, "
+          f"tampered {tampered}, another key {other_key}, another world {other_world}, an item moved {moved}")
+    assert wrong == 0 and elsewhere == 200 and tampered == 403 and other_key == 403 and other_world == 409 and moved == 409
@@ -0,0 +1,81 @@
+# Times clearing an item-heavy room the way a bot would have to before, one
+# "get" turn per item, against a single "get all" turn, then the same for
+# dropping everything and emptying a container.
+
+# Imports
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import worldgen
+
+# The usual world, with lots of things in the cabin and in a crate there
+def WriteClutteredWorld(directory, item_count):
+    with open(FN_ITEMS, 'r') as items_file:
+        item_dicts = json.load(items_file)
+    crate = worldgen.MakeItem("crate", "A big open crate.", 3, "inside_cabin", False)
+    crate["container"] = True
+    crate["open"] = True
+    item_dicts.append(crate)
+    for index in range(item_count):
+        location_name = "inside_cabin" if index % 2 == 0 else "crate"
+        item_dicts.append(worldgen.MakeItem(f"thing_{index}", f"Thing number {index}.", 1, location_name, True))
+    fn_items = os.path.join(directory, "items.json")
+    worldgen.WriteJSONList(fn_items, item_dicts)
+    return fn_items
+
+# Play whole turns, the way a client sees them, returning the seconds taken
+def PlayTurns(game, commands):
+    start = time.perf_counter()
+    for command in commands:
+        game.ProcessInput(command)
+        game.DescribeLocation()
+        game.GetSink().Flush()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the bulk get & drop verbs")
+    arg_parser.add_argument("--items", type=int, default=500, help="items in the room")
+    arg_parser.add_argument("--repeats", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        world = World(FN_LOCATIONS, WriteClutteredWorld(temp_dir, args.items), FN_VERBS)
+
+    in_room = [f"thing_{index}" for index in range(0, args.items, 2)]
+    in_crate = [f"thing_{index}" for index in range(1, args.items, 2)]
+    everything = in_room + ["bottle"] + in_crate
+    ways = [
+        ("get everything here", [f"get {item_name}" for item_name in in_room + ["bottle"]], ["get all"]),
+        ("empty the crate", [f"get {item_name} from crate" for item_name in in_crate], ["get all from crate"])
+    ]
+
+    for name, one_by_one, bulk in ways:
+        times = {}
+        for way, commands in [("one by one", one_by_one), ("bulk", bulk)]:
+            elapsed = 0.0
+            for repeat in range(args.repeats):
+                game = Game(world, NullSink())
+                elapsed += PlayTurns(game, commands)
+            times[way] = elapsed / args.repeats
+        print(f"  {name:<20} one by one {times['one by one'] * 1000:8.3f}ms ({len(one_by_one)} turns), "
+              f"bulk {times['bulk'] * 1000:8.3f}ms (1 turn), {times['one by one'] / times['bulk']:.0f}x faster")
+
+    # Dropping, from carrying everything
+    times = {}
+    for way, commands in [("one by one", [f"drop {item_name}" for item_name in everything]), ("bulk", ["drop all"])]:
+        elapsed = 0.0
+        for repeat in range(args.repeats):
+            game = Game(world, NullSink())
+            PlayTurns(game, ["get all", "get all from crate"])
+            elapsed += PlayTurns(game, commands)
+            assert game.GetCarriedItems() == [] and game._items.CheckConsistency() == []
+        times[way] = elapsed / args.repeats
+    print(f"  {'drop everything':<20} one by one {times['one by one'] * 1000:8.3f}ms ({len(everything)} turns), "
+          f"bulk {times['bulk'] * 1000:8.3f}ms (1 turn), {times['one by one'] / times['bulk']:.0f}x faster")
@@ -0,0 +1,72 @@
+# Checkpoints thousands of sessions with the save log, and compares the bytes
+# written with dumping every session's whole world.
+
+# Imports
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from SaveLog import *
+
+COMMANDS = [
+    "get bottle", "drop bottle", "go out", "go in", "go up", "go down",
+    "get key", "drop key", "go south", "go north", "inventory"
+]
+
+# What a naive save of one game would write: the whole world
+def FullDumpSize(game):
+    world = {
+        'locations': [game._map[location_name].ToDict() for location_name in game._map],
+        'items': [game._items[item_name].ToDict() for item_name in game._items]
+    }
+    return len(json.dumps(world, separators=(',', ':')))
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark save log checkpoints")
+    arg_parser.add_argument("--sessions", type=int, default=5000)
+    arg_parser.add_argument("--ticks", type=int, default=50)
+    arg_parser.add_argument("--active", type=float, default=0.2, help="fraction of sessions that act each tick")
+    arg_parser.add_argument("--sync", action="store_true", help="fsync every checkpoint")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = {session_id: Game(sink=NullSink()) for session_id in range(args.sessions)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log = SaveLog(os.path.join(temp_dir, "sessions.log"), sync=args.sync)
+        log.Checkpoint(games)
+
+        checkpoint_time = 0.0
+        records = 0
+        start_size = log.GetSize()
+        for tick in range(args.ticks):
+            # Some players do something
+            for session_id in games:
+                if rng.random() < args.active:
+                    games[session_id].ProcessInput(rng.choice(COMMANDS))
+
+            # Then everyone is checkpointed
+            start = time.perf_counter()
+            records += log.Checkpoint(games)
+            checkpoint_time += time.perf_counter() - start
+
+        # Everything must come back as it was
+        states = log.Load()
+        for session_id in games:
+            assert states[session_id] == games[session_id].GetState()
+
+        log.Compact()
+        compact_size = log.GetSize()
+
+    naive = FullDumpSize(games[0]) * args.sessions
+    print(f"checkpoint: {checkpoint_time / args.ticks * 1000:.1f}ms per tick for {args.sessions} sessions "
+          f"({records / args.ticks:.0f} records per tick)")
+    print(f"log size:   {compact_size} bytes compacted, {compact_size / args.sessions:.0f} bytes per session")
+    print(f"naive dump: {naive} bytes per tick")
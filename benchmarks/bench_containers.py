@@ -0,0 +1,91 @@
+# Times the nested container checks on generated worlds of growing size, with
+# a chain of boxes inside boxes at the start. Reaching an item walks up
+# through the boxes it's in, so it should cost the same however many items
+# the world has. Then checks the rules: after random opening, closing, getting
+# & putting, everything listed as visible must be exactly what a full scan of
+# every item says can be reached.
+
+# Imports
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import worldgen
+
+# A world with a chain of open boxes at the start, the innermost holding a gem
+def WriteNestedWorld(directory, location_count, item_count, depth, seed):
+    fn_locations = os.path.join(directory, "locations.json")
+    fn_items = os.path.join(directory, "items.json")
+    worldgen.WriteJSONList(fn_locations, worldgen.GenerateLocations(location_count, seed))
+
+    def Items():
+        yield from worldgen.GenerateItems(item_count, location_count, seed)
+        location_name = worldgen.LocationName(0)
+        for level in range(depth):
+            item_dict = worldgen.MakeItem(f"nest_{level}", "A nesting box.", 1, location_name, True)
+            item_dict["container"] = True
+            item_dict["open"] = True
+            yield item_dict
+            location_name = item_dict["name"]
+        yield worldgen.MakeItem("gem", "A shiny gem.", 1, location_name, True)
+
+    worldgen.WriteJSONList(fn_items, Items())
+    return fn_locations, fn_items
+
+# What can be reached, the slow way: walk up from every single item
+def ScanReachable(game, location_name):
+    reachable = set()
+    for item_name in game._items:
+        if game._items.GetReachableLocation(game._items[item_name]) == location_name:
+            reachable.add(item_name)
+    return reachable
+
+def Time(function, count):
+    start = time.perf_counter()
+    for i in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check nested containers")
+    arg_parser.add_argument("--sizes", default="1000,10000,100000", help="item counts to try")
+    arg_parser.add_argument("--depth", type=int, default=10)
+    arg_parser.add_argument("--repeats", type=int, default=20000)
+    arg_parser.add_argument("--turns", type=int, default=2000, help="random turns in the check")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    for item_count in [int(size) for size in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            world = World(*WriteNestedWorld(temp_dir, item_count // 10, item_count, args.depth, args.seed))
+        game = Game(world, NullSink())
+        game._location = game._map[worldgen.LocationName(0)]
+
+        # Reaching the gem at the bottom, and examining it, a whole turn
+        gem = game._items["gem"]
+        reach = Time(lambda: game.IsReachable(gem), args.repeats)
+        examine = Time(lambda: game.ProcessInput("examine gem"), args.repeats)
+        describe = Time(game.RenderLocation, args.repeats // 10)
+        print(f"  {item_count:>7} items, depth {args.depth}: reach {reach * 1000000:6.2f}us, "
+              f"examine turn {examine * 1000000:6.2f}us, render room {describe * 1000000:7.2f}us")
+
+    # The rules hold up, checked against a scan of everything
+    rng = random.Random(args.seed)
+    commands = []
+    for level in range(args.depth):
+        commands.extend([f"open nest_{level}", f"close nest_{level}", f"get nest_{level}", f"drop nest_{level}"])
+        commands.extend([f"put gem in nest_{level}", f"put nest_{level} in nest_{rng.randrange(args.depth)}"])
+    commands.extend(["get gem", "drop gem"])
+    mismatches = 0
+    for turn in range(args.turns):
+        game.ProcessInput(rng.choice(commands))
+        here = game._location.GetLocationName()
+        if set(game._items.GetVisibleAt(here)) != ScanReachable(game, here):
+            mismatches += 1
+    print(f"  check: {args.turns} random turns, {mismatches} times the visible items differed from a full scan")
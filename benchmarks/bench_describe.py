@@ -0,0 +1,116 @@
+# Times describing the player's location with & without the description
+# caches, then checks the caches never go stale: games play random commands
+# (moving items, smashing the trapdoor, restoring saved states...) and after
+# every one the cached description must match one rendered from scratch.
+
+# Imports
+import argparse
+import random
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import worldgen
+
+COMMANDS = [
+    "get bottle", "drop bottle", "get key", "drop key", "get sledgehammer", "drop sledgehammer",
+    "get chest", "open chest", "close chest", "unlock chest with key", "put bottle in chest",
+    "put key in chest", "get bottle from chest", "hit trapdoor with sledgehammer", "kick trapdoor",
+    "go in", "go out", "go up", "go down", "go north", "go south", "go east", "go west",
+    "go top of tree", "go cabin basement", "look", "inventory", "xyzzy"
+]
+
+# A random command, sometimes picking up something that's here or dropping
+# something we're carrying
+def ChooseCommand(game, rng):
+    choice = rng.random()
+    if choice < 0.2:
+        here = game._items.GetItemsAt(game._location.GetLocationName())
+        if len(here) > 0:
+            return f"get {rng.choice(here)}"
+    elif choice < 0.3:
+        carried = game._items.GetItemsAt(L_CARRIED)
+        if len(carried) > 0:
+            return f"drop {rng.choice(carried)}"
+    return rng.choice(COMMANDS)
+
+# Describe the location, returning what was written
+def Describe(game, sink):
+    game.DescribeLocation()
+    sink.Flush()
+    text = sink.GetOutput()
+    sink.Clear()
+    return text
+
+# Play random commands, checking every description. Returns the number of
+# descriptions that didn't match.
+def CheckInvalidation(world, games, commands, rng):
+    sinks = [MemorySink() for i in range(games)]
+    players = [Game(world, sink) for sink in sinks]
+    stale = 0
+    for turn in range(commands):
+        for game, sink in zip(players, sinks):
+            # Now & then, pick up another game's state
+            if rng.random() < 0.01:
+                game.SetState(rng.choice(players).GetState())
+            else:
+                game.ProcessInput(ChooseCommand(game, rng))
+            sink.Flush()
+            sink.Clear()
+            if Describe(game, sink) != game.RenderLocation():
+                stale += 1
+
+    # And the caches stayed in bounds
+    assert len(world.GetDescriptionCache()) <= DS_SHARED_CACHE_SIZE
+    for game in players:
+        assert game._descriptions is None or len(game._descriptions) <= DS_CACHE_SIZE
+    return stale
+
+# Time describing the location a number of times, returning seconds per description
+def Time(describe, count):
+    start = time.perf_counter()
+    for i in range(count):
+        describe()
+    return (time.perf_counter() - start) / count
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check the location description caches")
+    arg_parser.add_argument("--describes", type=int, default=200000)
+    arg_parser.add_argument("--games", type=int, default=50)
+    arg_parser.add_argument("--commands", type=int, default=2000, help="commands per game in the check")
+    arg_parser.add_argument("--locations", type=int, default=10000, help="size of the generated world")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    # Speed, in an unchanged room (shared cache) and one we've dropped something in (our own)
+    world = GetDefaultWorld()
+    game = Game(world, NullSink())
+    for name, commands in [("unchanged room", []), ("changed room", ["get bottle", "go out", "drop bottle"])]:
+        for command in commands:
+            game.ProcessInput(command)
+        render = Time(game.RenderLocation, args.describes)
+        cached = Time(game.DescribeLocation, args.describes)
+        print(f"  {name:<15} rendered {render * 1000000:7.2f}us, cached {cached * 1000000:7.2f}us ({render / cached:.1f}x)")
+
+    # Whole turns that change nothing
+    game = Game(world, NullSink())
+    start = time.perf_counter()
+    for i in range(args.describes):
+        game.ProcessInput("look")
+        game.DescribeLocation()
+    print(f"  'look' turns     {(time.perf_counter() - start) / args.describes * 1000000:7.2f}us per turn")
+
+    # The caches never go stale, in the real world & a big generated one
+    rng = random.Random(args.seed)
+    stale = CheckInvalidation(world, args.games, args.commands, rng)
+    print(f"  check: {args.games} games x {args.commands} commands, {stale} stale descriptions")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_locations, fn_items = worldgen.WriteWorld(temp_dir, args.locations, args.locations, args.seed)
+        big_world = World(fn_locations, fn_items)
+    stale = CheckInvalidation(big_world, args.games, args.commands // 4, rng)
+    print(f"  check, {args.locations} locations: {args.games} games x {args.commands // 4} commands, {stale} stale descriptions, "
+          f"shared cache {big_world.GetDescriptionCache().GetStats()}")
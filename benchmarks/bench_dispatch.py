@@ -0,0 +1,56 @@
+# Times verb dispatch through Game.DoCommand as the number of verbs grows, and
+# compares it with checking the verbs one by one, like an if/elif chain.
+
+# Imports
+import argparse
+import random
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+
+# A verb that does nothing, so we only time the dispatch
+def Nothing(game, command):
+    pass
+
+# Dispatch by checking each verb in turn
+def ChainDispatch(pairs, game, command):
+    for verb, handler in pairs:
+        if command.verb == verb:
+            handler(game, command)
+            return
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark verb dispatch")
+    arg_parser.add_argument("--calls", type=int, default=200000)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    for verb_count in [10, 50, 100, 500, 1000]:
+        # A world with lots of do-nothing verbs
+        world = World()
+        for i in range(verb_count):
+            world.AddVerb(f"verb{i}", Nothing)
+        game = Game(world, NullSink())
+
+        # Commands for random verbs
+        rng = random.Random(args.seed)
+        commands = [Command(f"verb{rng.randrange(verb_count)}", None, None, None) for i in range(args.calls)]
+
+        # Table lookup
+        start = time.perf_counter()
+        for command in commands:
+            game.DoCommand(command)
+        table_time = time.perf_counter() - start
+
+        # One by one
+        pairs = [(f"verb{i}", Nothing) for i in range(verb_count)]
+        start = time.perf_counter()
+        for command in commands:
+            ChainDispatch(pairs, game, command)
+        chain_time = time.perf_counter() - start
+
+        print(f"{verb_count:5d} verbs: table {table_time / args.calls * 1e9:7.0f}ns/call, "
+              f"chain {chain_time / args.calls * 1e9:7.0f}ns/call")
@@ -0,0 +1,94 @@
+# Steps per second of the headless environments, against playing through
+# Game.Run with input() & print(), for batch sizes from 1 up to 4096. Big
+# batches are also tried split over worker processes.
+
+# Imports
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Environment import *
+
+COMMANDS = [
+    "get bottle", "drop bottle", "go out", "go in", "go up", "go down",
+    "get key", "drop key", "go south", "go north", "inventory", "get all",
+    "drop all", "examine bottle", "open chest", "xyzzy"
+]
+
+# A reward for picking things up, at the top level so worker processes can use it
+def CarriedReward(game, command, observation):
+    return 1.0 if command.verb == "get" else 0.0
+
+# Playing the old way, with the console swapped for strings
+def TimeConsole(steps, rng):
+    commands = [rng.choice(COMMANDS) for i in range(steps)] + ["quit"]
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin = io.StringIO("\n".join(commands) + "\n")
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.perf_counter()
+        Game().Run()
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdin, sys.stdout = stdin, stdout
+    return len(commands) / elapsed
+
+# Step a batch of games in lockstep, returning steps per second
+def TimeVecEnv(batch_size, steps, processes, rng):
+    envs = VecEnv(batch_size, reward=CarriedReward, max_steps=200, processes=processes)
+    try:
+        envs.Reset()
+        batches = [[rng.choice(COMMANDS) for i in range(batch_size)] for j in range(16)]
+        rounds = max(1, steps // batch_size)
+        start = time.perf_counter()
+        for index in range(rounds):
+            envs.Step(batches[index % len(batches)])
+        elapsed = time.perf_counter() - start
+    finally:
+        envs.Close()
+    return rounds * batch_size / elapsed
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the headless game environments")
+    arg_parser.add_argument("--steps", type=int, default=50000, help="steps per measurement")
+    arg_parser.add_argument("--max-batch", type=int, default=4096)
+    arg_parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    GetDefaultWorld()
+    print(f"{os.cpu_count()} cores")
+    console = TimeConsole(args.steps, rng)
+    print(f"  Game.Run via input/print {console:9.0f} steps/s")
+
+    # One game, then batches
+    env = GameEnv(reward=CarriedReward)
+    env.Reset()
+    commands = [rng.choice(COMMANDS) for i in range(args.steps)]
+    start = time.perf_counter()
+    for command in commands:
+        observation, reward, done, info = env.Step(command)
+        if done:
+            env.Reset()
+    single = len(commands) / (time.perf_counter() - start)
+    print(f"  GameEnv                   {single:9.0f} steps/s ({single / console:.1f}x)")
+
+    batch_size = 1
+    while batch_size <= args.max_batch:
+        throughput = TimeVecEnv(batch_size, args.steps, 0, rng)
+        line = f"  VecEnv batch {batch_size:<5}        {throughput:9.0f} steps/s ({throughput / console:.1f}x)"
+        if args.processes > 1 and batch_size >= 256:
+            pooled = TimeVecEnv(batch_size, args.steps, args.processes, rng)
+            line += f", {args.processes} processes {pooled:9.0f} steps/s"
+        print(line)
+        batch_size *= 4
+    if args.processes <= 1:
+        print("  (one core, so batches weren't split over processes; try --processes 2 to see the overhead)")
@@ -0,0 +1,187 @@
+# Measures what hibernating idle games saves & costs: memory held by games in
+# memory against the same games hibernated, how well the memory estimate
+# tracks the real thing, and how long waking a game takes next to playing a
+# turn. Checks that woken games carry on exactly where they were, that a
+# memory budget is kept to, and that a game asleep through two reloads of the
+# world wakes up in the newest one with what it had.
+
+# Imports
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Hibernate import *
+from Reload import WorldReloader
+
+WALKTHROUGH = [
+    "go out", "go up", "get key", "go down", "go south", "go down", "unlock chest with key",
+    "open chest", "get sledgehammer", "go up", "go north", "go in", "hit trapdoor with sledgehammer", "go down"
+]
+
+# Stands in for a connected player's session, which is all the hibernator needs
+class StandInSession(object):
+    def __init__(self, game):
+        self._game = game
+        self._sink = game.GetSink()
+
+    def GetGame(self):
+        return self._game
+
+    def SetGame(self, game):
+        self._game = game
+
+    def GetSink(self):
+        return self._sink
+
+    def IsIdle(self):
+        return True
+
+# Players part way through the game, some having wandered about too
+def MakeSessions(count, rng):
+    sessions = []
+    for index in range(count):
+        game = Game(sink=NullSink())
+        for command in WALKTHROUGH[:rng.randrange(len(WALKTHROUGH) + 1)]:
+            game.ProcessInput(command)
+        if rng.random() < 0.5:
+            game.ProcessInput(rng.choice(["get bottle", "drop key", "go out", "go in"]))
+        game.DescribeLocation()
+        sessions.append(StandInSession(game))
+    return sessions
+
+# Edit the items file & tick the reloader until the new world is in
+def Reload(reloader, fn_items, edit):
+    with open(fn_items, 'r') as items_file:
+        item_dicts = json.load(items_file)
+    edit(item_dicts)
+    with open(fn_items, 'w') as items_file:
+        json.dump(item_dicts, items_file)
+    reloads = reloader.GetStats()["reloads"]
+    while reloader.GetStats()["reloads"] == reloads or reloader.GetStage() != "idle":
+        reloader.Tick(lambda: [])
+        time.sleep(0.01)
+
+# Hibernate a game that's opened the trapdoor, reload twice & wake it up.
+# Returns True if it's in the newest world with everything it had.
+def CheckReloads(temp_dir):
+    fns = [os.path.join(temp_dir, fn) for fn in [FN_LOCATIONS, FN_ITEMS, FN_SNAPSHOT, FN_VERBS]]
+    for fn in [FN_LOCATIONS, FN_ITEMS, FN_VERBS]:
+        shutil.copy(fn, temp_dir)
+    world = LoadWorld(*fns)
+    reloader = WorldReloader(world, *fns, check_interval=0, log=None)
+    hibernator = Hibernator(os.path.join(temp_dir, "reloads.hibernate"), reloader=reloader)
+
+    game = Game(world, NullSink())
+    for command in WALKTHROUGH[:-1]:
+        game.ProcessInput(command)
+    state = game.GetState()
+    session = StandInSession(game)
+    hibernator.Add(session)
+    hibernator.Hibernate(session)
+    Reload(reloader, fns[1], lambda item_dicts: item_dicts.append(dict(item_dicts[0], name="widget")))
+    Reload(reloader, fns[1], lambda item_dicts: item_dicts[0].update(description="Something new."))
+    hibernator.Wake(session)
+    game = session.GetGame()
+    woke = game.GetWorld() is reloader.GetWorld() and game.GetState() == state
+    game.ProcessInput(WALKTHROUGH[-1])
+    hibernator.Close()
+    reloader.Close()
+    return woke and game.GetLocation().GetLocationName() == "cabin_basement"
+
+def Percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check idle game hibernation")
+    arg_parser.add_argument("--sessions", type=int, default=20000)
+    arg_parser.add_argument("--wakes", type=int, default=2000, help="games woken, at random")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    GetDefaultWorld()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Memory of the games themselves, measured & estimated
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        sessions = MakeSessions(args.sessions, rng)
+        resident = tracemalloc.get_traced_memory()[0] - before
+        hibernator = Hibernator(os.path.join(temp_dir, "games.hibernate"), memory_budget=0)
+        for session in sessions:
+            hibernator.Add(session)
+        estimate = hibernator.GetStats()["resident_bytes_estimate"]
+        states = [(session.GetGame().GetState(), session.GetGame().GetCommandCount()) for session in sessions]
+
+        # Hibernate the lot (a budget of nothing)
+        after_add = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        hibernator.Tick()
+        hibernate_time = (time.perf_counter() - start) / args.sessions
+        gc.collect()
+        hibernated = tracemalloc.get_traced_memory()[0] - after_add
+        tracemalloc.stop()
+        stats = hibernator.GetStats()
+        hibernator.Close()
+        print(f"  {args.sessions} games in memory: {resident / args.sessions:7.0f} bytes each measured, "
+              f"{estimate / args.sessions:7.0f} estimated")
+        print(f"  hibernated: {stats['sessions_hibernated']} games, {(resident + hibernated) / args.sessions:7.0f} bytes each left in memory, "
+              f"{stats['hibernation_file_bytes'] / args.sessions:5.0f} bytes each on disk, "
+              f"{hibernate_time * 1000000:.1f}us each to hibernate")
+
+        # Waking, against playing a turn
+        game = Game(sink=NullSink())
+        start = time.perf_counter()
+        for index in range(args.wakes):
+            game.ProcessInput(WALKTHROUGH[index % 4])
+            game.DescribeLocation()
+        turn_time = (time.perf_counter() - start) / args.wakes
+
+        hibernator = Hibernator(os.path.join(temp_dir, "games.hibernate"), idle_timeout=float("inf"))
+        for session, (state, command_count) in zip(sessions, states):
+            session.SetGame(Game(sink=NullSink()))
+            session.GetGame().SetState(state)
+            session.GetGame().SetCommandCount(command_count)
+            hibernator.Add(session)
+            hibernator.Hibernate(session)
+
+        wrong = 0
+        wake_times = []
+        order = list(range(args.sessions))
+        rng.shuffle(order)
+        for index in order[:args.wakes]:
+            session = sessions[index]
+            start = time.perf_counter()
+            hibernator.Wake(session)
+            wake_times.append(time.perf_counter() - start)
+            if (session.GetGame().GetState(), session.GetGame().GetCommandCount()) != states[index]:
+                wrong += 1
+        stats = hibernator.GetStats()
+        hibernator.Close()
+        print(f"  waking {len(wake_times)}: mean {sum(wake_times) / len(wake_times) * 1000000:6.1f}us, p99 {Percentile(wake_times, 0.99) * 1000000:6.1f}us, "
+              f"max {max(wake_times) * 1000000:6.1f}us (including any garbage collection); a turn takes {turn_time * 1000000:.1f}us")
+
+        # Keep to a budget of a quarter of them
+        budget = stats['resident_bytes_estimate'] // 4
+        hibernator = Hibernator(os.path.join(temp_dir, "games.hibernate"), memory_budget=budget, idle_timeout=float("inf"))
+        for session in sessions:
+            if session.GetGame() is not None:
+                hibernator.Add(session)
+        hibernator.Tick()
+        stats = hibernator.GetStats()
+        over = stats['resident_bytes_estimate'] > budget
+        print(f"  budget {budget} bytes: {stats['sessions_resident']} games kept in memory ({stats['resident_bytes_estimate']} bytes), "
+              f"{stats['sessions_hibernated']} hibernated")
+        hibernator.Close()
+        reloaded = CheckReloads(temp_dir)
+        print(f"  check: {wrong} woken games differed from before, budget {'EXCEEDED' if over else 'kept'}, "
+              f"slept through two reloads {'fine' if reloaded else 'WRONG'}")
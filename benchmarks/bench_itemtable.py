@@ -0,0 +1,99 @@
+# Compares the array-backed ItemTable with the usual Item objects on a big
+# generated world: memory per item, and the speed of bulk queries.
+
+# Imports
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import ItemTable
+import worldgen
+
+# Build something, returning it & how many bytes it allocated
+def Measure(build):
+    gc.collect()
+    tracemalloc.start()
+    built = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, size
+
+def BuildRegistry(item_dicts):
+    items = ItemRegistry()
+    for item_dict in item_dicts:
+        items.AddItem(Item.FromDict(item_dict))
+    return items
+
+# Time a query a number of times, returning seconds per query
+def Time(query, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        query(argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the array-backed item table")
+    arg_parser.add_argument("--items", type=int, default=1000000)
+    arg_parser.add_argument("--locations", type=int, default=100000)
+    arg_parser.add_argument("--queries", type=int, default=20)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    # The same items, with some carried & some containers open
+    item_dicts = list(worldgen.GenerateItems(args.items, args.locations, args.seed))
+    rng = random.Random(args.seed)
+    for item_dict in item_dicts:
+        if item_dict["getable"] and rng.random() < 0.001:
+            item_dict["location_name"] = L_CARRIED
+        if item_dict["container"] and not item_dict["locked"] and rng.random() < 0.5:
+            item_dict["open"] = True
+    location_names = [worldgen.LocationName(rng.randrange(args.locations)) for i in range(args.queries)]
+
+    print(f"{args.items} items, numpy {'used' if ItemTable.numpy is not None else 'not installed'}")
+
+    # Memory
+    registry, registry_bytes = Measure(lambda: BuildRegistry(item_dicts))
+    table, table_bytes = Measure(lambda: ItemTable.BuildItemTable(item_dicts))
+    print(f"  memory per item: objects {registry_bytes / args.items:7.1f} bytes, "
+          f"table {table_bytes / args.items:7.1f} bytes "
+          f"(columns {table.GetColumnBytes() / args.items:.1f})")
+    del item_dicts
+
+    # Queries, the object way vs the column way
+    def ObjectsAt(location_name):
+        return [item_name for item_name in registry if registry[item_name].GetLocationName() == location_name]
+
+    def ObjectsOpenContainers(unused):
+        return [item_name for item_name in registry
+                if registry[item_name].GetContainer() and registry[item_name].GetOpen()]
+
+    def ObjectsCarriedWeight(unused):
+        return sum(registry[item_name].GetWeight() for item_name in registry
+                   if registry[item_name].GetLocationName() == L_CARRIED)
+
+    table_registry = ItemTable.TableItemRegistry(table)
+    table_registry.GetItemsAt(L_CARRIED)
+    queries = [
+        ("items at X (scan)", ObjectsAt, table.FindRowsAt, location_names),
+        ("items at X (index)", registry.GetItemsAt, table_registry.GetItemsAt, location_names),
+        ("carried weight", ObjectsCarriedWeight, lambda unused: table.GetTotalWeightAt(L_CARRIED), [None] * args.queries),
+        ("open containers", ObjectsOpenContainers, lambda unused: table.FindOpenContainers(), [None] * args.queries)
+    ]
+
+    # Check they agree first
+    names = table.GetNames()
+    assert sorted(ObjectsAt(location_names[0])) == sorted(names[row] for row in table.FindRowsAt(location_names[0]))
+    assert ObjectsCarriedWeight(None) == table.GetTotalWeightAt(L_CARRIED)
+    assert ObjectsOpenContainers(None) == [names[row] for row in table.FindOpenContainers()]
+
+    for name, object_query, table_query, arguments in queries:
+        object_time = Time(object_query, arguments)
+        table_time = Time(table_query, arguments)
+        print(f"  {name:<20} objects {object_time * 1000:9.3f}ms, table {table_time * 1000:9.3f}ms "
+              f"({object_time / table_time:.1f}x)")
@@ -0,0 +1,200 @@
+# Measures what journaling costs many sessions playing at once: no journal,
+# a group commit shared by everyone waiting, and an fsync for every command.
+# Then checks recovery: a journaling process is killed part way through, and
+# every command it had answered must come back, with the same game state as
+# playing them again. Last, the same through the server: a player's server is
+# killed, and they resume their game on the restarted one.
+
+# Imports
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Journal import *
+from Server import S_HOST, S_PROMPT, S_ENCODING
+
+COMMANDS = [
+    "get bottle", "drop bottle", "go out", "go in", "go up", "go down",
+    "get key", "drop key", "go south", "go north", "inventory", "open box"
+]
+
+# Each session's commands, the same every time
+def GetCommands(session_id, count):
+    rng = random.Random(session_id)
+    return [rng.choice(COMMANDS) for i in range(count)]
+
+# Sessions playing on one event loop, each waiting for its command to be
+# committed before the next. Mode is "none", "group" or "each". Calls
+# acknowledged(session_id, count) after each durable command.
+async def PlaySessions(journal, mode, sessions, commands, acknowledged=None):
+    latencies = []
+
+    async def Play(session_id):
+        game = Game(sink=NullSink())
+        for user_input in GetCommands(session_id, commands):
+            start = time.perf_counter()
+            command = game.ProcessInput(user_input)
+            if mode != "none" and command.verb is not None:
+                journal.Append(session_id, game, command)
+                if mode == "group":
+                    await journal.WaitCommitted()
+                else:
+                    journal.Commit()
+            latencies.append(time.perf_counter() - start)
+            if acknowledged is not None:
+                acknowledged(session_id, game.GetCommandCount())
+            # Let the others have a turn
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(Play(session_id) for session_id in range(1, sessions + 1)))
+    return sorted(latencies)
+
+def MeasureThroughput(fn, mode, sessions, commands, sync):
+    journal = Journal(fn, sync=sync)
+    journal.Recover()
+    start = time.perf_counter()
+    latencies = asyncio.run(PlaySessions(journal, mode, sessions, commands))
+    elapsed = time.perf_counter() - start
+    stats = journal.GetStats()
+    journal.Close()
+    os.remove(fn)
+    return len(latencies) / elapsed, latencies[int(len(latencies) * 0.99)], stats
+
+# The process that gets killed: journals, noting each acknowledged command
+# in another file
+def RunChild(fn, sessions, commands):
+    journal = Journal(fn)
+    journal.Recover()
+
+    with open(fn + ".acks", 'w') as acks_file:
+        def Acknowledged(session_id, count):
+            acks_file.write(f"{session_id} {count}\n")
+            acks_file.flush()
+
+        asyncio.run(PlaySessions(journal, "group", sessions, commands, Acknowledged))
+
+def CheckRecovery(fn, sessions, commands, kill_after):
+    fn_acks = fn + ".acks"
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", fn,
+                              "--sessions", str(sessions), "--commands", str(commands)])
+
+    # Kill it a while after it starts acknowledging
+    while not os.path.exists(fn_acks) or os.path.getsize(fn_acks) == 0:
+        time.sleep(0.01)
+    time.sleep(kill_after)
+    child.send_signal(signal.SIGKILL)
+    child.wait()
+
+    acknowledged = {}
+    with open(fn_acks, 'r') as acks_file:
+        for line in acks_file:
+            words = line.split()
+            if len(words) == 2 and line.endswith("\n"):
+                acknowledged[int(words[0])] = int(words[1])
+    os.remove(fn_acks)
+
+    # Everything acknowledged must have been recovered, exactly as it was played
+    journal = Journal(fn)
+    games = journal.Recover()
+    journal.Close()
+    lost = 0
+    wrong = 0
+    for session_id in acknowledged:
+        game = games.get(session_id)
+        if game is None or game.GetCommandCount() < acknowledged[session_id]:
+            lost += 1
+            continue
+        expected = Game(sink=NullSink())
+        for user_input in GetCommands(session_id, game.GetCommandCount()):
+            expected.ProcessInput(user_input)
+        if json.dumps(expected.GetState(), sort_keys=True) != json.dumps(game.GetState(), sort_keys=True):
+            wrong += 1
+    return sum(acknowledged.values()), len(acknowledged), lost, wrong
+
+# Start a journaling server, waiting until it's listening
+def StartServer(fn, port):
+    process = subprocess.Popen([sys.executable, "Server.py", "--port", str(port), "--journal", fn],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    process.stdout.readline()
+    return process
+
+async def Say(reader, writer, command):
+    writer.write((command + "\n").encode(S_ENCODING))
+    await writer.drain()
+    return (await reader.readuntil(S_PROMPT.encode(S_ENCODING))).decode(S_ENCODING)
+
+# A player picks up the bottle & goes out, the server is killed, then they
+# resume on a new server & check
+async def CheckResume(fn, port):
+    process = StartServer(fn, port)
+    reader, writer = await asyncio.open_connection(S_HOST, port)
+    welcome = (await reader.readuntil(S_PROMPT.encode(S_ENCODING))).decode(S_ENCODING)
+    resume_token = welcome.split("resume ")[1].split()[0]
+    await Say(reader, writer, "get bottle")
+    await Say(reader, writer, "go out")
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    writer.close()
+
+    process = StartServer(fn, port)
+    try:
+        reader, writer = await asyncio.open_connection(S_HOST, port)
+        await reader.readuntil(S_PROMPT.encode(S_ENCODING))
+        output = await Say(reader, writer, f"resume {resume_token}")
+        output += await Say(reader, writer, "inventory")
+        writer.close()
+    finally:
+        process.terminate()
+        process.wait()
+    return "You are carrying: bottle" in output and "outside a small, wooden cabin" in output
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the command journal")
+    arg_parser.add_argument("--sessions", type=int, default=1000)
+    arg_parser.add_argument("--commands", type=int, default=20)
+    arg_parser.add_argument("--dir", help="where to put the journal (default: a temporary directory)")
+    arg_parser.add_argument("--kill-after", type=float, default=1.0, help="seconds before the journaling process is killed")
+    arg_parser.add_argument("--port", type=int, default=4322)
+    arg_parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        RunChild(args.child, args.sessions, args.commands)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        fn = os.path.join(temp_dir, "commands.journal")
+        print(f"{args.sessions} sessions x {args.commands} commands, journal in {temp_dir}")
+
+        # Throughput
+        setups = [
+            ("no journal", "none", True),
+            ("group commit", "group", True),
+            ("fsync each", "each", True),
+            ("group, no fsync", "group", False)
+        ]
+        for name, mode, sync in setups:
+            throughput, p99, stats = MeasureThroughput(fn, mode, args.sessions, args.commands, sync)
+            per_commit = stats["records"] / max(1, stats["commits"])
+            print(f"  {name:<16} {throughput:9.0f} commands/s, p99 {p99 * 1000:7.3f}ms, "
+                  f"{stats['commits']} commits of {per_commit:.1f} records")
+
+        # Crash recovery, in process
+        commands, sessions, lost, wrong = CheckRecovery(fn, args.sessions, args.commands * 100, args.kill_after)
+        print(f"  crash: {commands} commands acknowledged by {sessions} sessions before the kill, "
+              f"{lost} sessions lost commands, {wrong} recovered a different state")
+        os.remove(fn)
+
+        # And through the server
+        resumed = asyncio.run(CheckResume(fn, args.port))
+        print(f"  server killed & restarted: player {'resumed' if resumed else 'did NOT resume'} their game")
@@ -0,0 +1,62 @@
+# Measures what instrumentation costs: the same playthrough with it off, on,
+# and on with the slow turn profiler sampling turns.
+
+# Imports
+import argparse
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+from Metrics import Metrics
+
+# The usual playthrough, ending back where it started
+PLAYTHROUGH = [
+    "get bottle", "go out", "go up", "get key", "go down", "go south", "go down",
+    "unlock chest with key", "open chest", "get sledgehammer", "go up", "go north",
+    "go in", "break trapdoor with sledgehammer", "go down", "drop bottle", "inventory",
+    "examine sledgehammer", "xyzzy"
+]
+
+# Play the game many times, returning seconds per turn
+def Play(games, metrics):
+    SetMetrics(metrics)
+    world = GetDefaultWorld()
+    turns = 0
+    start = time.perf_counter()
+    for i in range(games):
+        game = Game(world, NullSink())
+        for user_input in PLAYTHROUGH:
+            game.DescribeLocation()
+            game.ProcessInput(user_input)
+            game.GetSink().Flush()
+            turns += 1
+    elapsed = time.perf_counter() - start
+    SetMetrics(None)
+    return elapsed / turns
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the cost of instrumentation")
+    arg_parser.add_argument("--games", type=int, default=5000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    setups = [
+        ("off", lambda: None),
+        ("on", lambda: Metrics()),
+        ("on, profile 1 in 100", lambda: Metrics(slow_turn=0.001, sample_every=100)),
+        ("on, keep 1 in 100", lambda: Metrics(slow_turn=0.0, sample_every=100)),
+        ("on, profile every turn", lambda: Metrics(slow_turn=0.0, sample_every=1))
+    ]
+
+    off = None
+    for name, make in setups:
+        metrics = make()
+        best = min(Play(args.games, make()) for i in range(args.repeat))
+        if off is None:
+            off = best
+        print(f"{name:<24} {best * 1000000:8.2f}us per turn ({(best / off - 1) * 100:+6.1f}%)")
+        if name == "on":
+            Play(args.games, metrics)
+            print(metrics.FormatText())
@@ -0,0 +1,73 @@
+# Counts the write system calls a turn makes when every fragment is written
+# straight out (as print() did) and when the turn is buffered in a sink.
+
+# Imports
+import argparse
+import os
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+
+# An unbuffered file that counts its writes, each of which is a system call
+class CountingFile(object):
+    def __init__(self):
+        self._file = open(os.devnull, 'wb', buffering=0)
+        self.writes = 0
+
+    def Write(self, text):
+        self._file.write(text.encode())
+        self.writes += 1
+
+# Writes every fragment as soon as it's printed, the old way
+class DirectSink(OutputSink):
+    def __init__(self, out_file):
+        super().__init__()
+        self._out_file = out_file
+
+    def Print(self, text="", end="\n"):
+        self._out_file.Write(f"{text}")
+        self._out_file.Write(end)
+
+    def Write(self, text):
+        self._out_file.Write(text)
+
+# Collects the turn, then writes it once
+class BufferedSink(OutputSink):
+    def __init__(self, out_file):
+        super().__init__()
+        self._out_file = out_file
+
+    def WriteOut(self, text):
+        self._out_file.Write(text)
+
+# A short game, run turn by turn
+TURNS = [
+    "get bottle", "go out", "go up", "get key", "go down", "go south",
+    "go down", "unlock chest with key", "open chest", "get sledgehammer",
+    "go up", "go north", "go in", "break trapdoor with sledgehammer",
+    "go down", "drop bottle", "inventory"
+]
+
+def CountWrites(make_sink, rounds):
+    out_file = CountingFile()
+    for i in range(rounds):
+        sink = make_sink(out_file)
+        game = Game(sink=sink)
+        for command in TURNS:
+            game.DescribeLocation()
+            game.ProcessInput(command)
+            sink.Flush()
+    return out_file.writes
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark output write calls per turn")
+    arg_parser.add_argument("--rounds", type=int, default=100)
+    args = arg_parser.parse_args()
+
+    turns = len(TURNS) * args.rounds
+    direct = CountWrites(DirectSink, args.rounds)
+    buffered = CountWrites(BufferedSink, args.rounds)
+    print(f"direct:   {direct / turns:6.1f} writes/turn")
+    print(f"buffered: {buffered / turns:6.1f} writes/turn ({direct / buffered:.1f}x fewer)")
@@ -0,0 +1,83 @@
+# Walks a big generated world through the paged backend, showing that memory
+# stays bounded by the cache budget rather than by the size of the map.
+
+# Imports
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from PagedWorld import *
+
+# A square grid of locations, with one item in every location
+def GridLocations(size):
+    for y in range(size):
+        for x in range(size):
+            exits = {}
+            if y > 0:
+                exits[D_NORTH] = f"room_{x}_{y - 1}"
+            if y < size - 1:
+                exits[D_SOUTH] = f"room_{x}_{y + 1}"
+            if x > 0:
+                exits[D_WEST] = f"room_{x - 1}_{y}"
+            if x < size - 1:
+                exits[D_EAST] = f"room_{x + 1}_{y}"
+            yield {
+                "name": f"room_{x}_{y}",
+                "description": f"You are in room {x}, {y} of a very large maze.",
+                "start_location": x == 0 and y == 0,
+                "exits": exits
+            }
+
+def GridItems(size):
+    for y in range(size):
+        for x in range(size):
+            yield {
+                "name": f"pebble_{x}_{y}", "description": "A small pebble.", "weight": 1,
+                "location_name": f"room_{x}_{y}", "getable": True, "container": False,
+                "requires_to_unlock": "", "open": False, "locked": False
+            }
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the paged world backend")
+    arg_parser.add_argument("--size", type=int, default=1000, help="grid width, the map has size * size locations")
+    arg_parser.add_argument("--steps", type=int, default=100000)
+    arg_parser.add_argument("--max-locations", type=int, default=PW_MAX_LOCATIONS)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_index = os.path.join(temp_dir, FN_PAGED_WORLD)
+
+        start = time.perf_counter()
+        BuildPagedWorld(GridLocations(args.size), GridItems(args.size), fn_index)
+        print(f"build:   {time.perf_counter() - start:.2f}s for {args.size * args.size} locations")
+
+        # Random walk, picking up every other pebble we find
+        tracemalloc.start()
+        world = PagedWorld(fn_index, max_locations=args.max_locations, max_items=args.max_locations * 2)
+        game = Game(world, NullSink())
+        rng = random.Random(args.seed)
+        directions = [D_NORTH, D_SOUTH, D_EAST, D_WEST]
+
+        start = time.perf_counter()
+        for step in range(args.steps):
+            game.ProcessInput(f"go {rng.choice(directions)}")
+            game.DescribeLocation()
+            if step % 2 == 0:
+                location_name = game._location.GetLocationName()
+                game.ProcessInput("get pebble_" + location_name[len("room_"):])
+        elapsed = time.perf_counter() - start
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"walk:    {args.steps} steps in {elapsed:.2f}s ({args.steps / elapsed:.0f} steps/s)")
+    print(f"memory:  {current / 1024 / 1024:.1f}MB now, {peak / 1024 / 1024:.1f}MB peak")
+    print(f"cached:  {world.GetCacheStats()}")
+    print(f"carried: {len(game.GetCarriedItems())} pebbles")
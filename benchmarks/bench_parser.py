@@ -0,0 +1,60 @@
+# Parses a large number of mixed inputs against a large vocabulary, with and
+# without the parse cache.
+
+# Imports
+import argparse
+import random
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+
+# A parser that knows lots of items, some with multi-word names
+def MakeParser(item_count):
+    parser = Parser()
+    for i in range(item_count):
+        if i % 10 == 0:
+            parser.AddItemName(f"rusty widget {i}")
+        else:
+            parser.AddItemName(f"widget{i}")
+    for i in range(item_count // 100):
+        parser.AddBlockedExitName(f"door{i}")
+        parser.AddVerb(f"kick{i}")
+    return parser
+
+# Mostly the same few commands, like real players, plus some one-offs
+def MakeInputs(input_count, item_count, seed):
+    rng = random.Random(seed)
+    common = ["go north", "go south", "inventory", "look", "get widget1", "drop widget1", "n", "e"]
+    inputs = []
+    for i in range(input_count):
+        choice = rng.random()
+        if choice < 0.7:
+            inputs.append(rng.choice(common))
+        elif choice < 0.9:
+            inputs.append(f"unlock widget{rng.randrange(1, item_count)} with rusty widget {rng.randrange(0, item_count, 10)}")
+        else:
+            inputs.append(f"pick up the widget{rng.randrange(1, item_count)} from door{rng.randrange(item_count // 100)}")
+    return inputs
+
+def TimeParse(parser, inputs):
+    start = time.perf_counter()
+    for user_input in inputs:
+        parser.ParseInput(user_input)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark Parser.ParseInput")
+    arg_parser.add_argument("--inputs", type=int, default=1000000)
+    arg_parser.add_argument("--items", type=int, default=10000)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    inputs = MakeInputs(args.inputs, args.items, args.seed)
+    for label, cache_size in [("no cache", 0), ("cache", P_CACHE_SIZE)]:
+        parser = MakeParser(args.items)
+        parser.SetCacheSize(cache_size)
+        elapsed = TimeParse(parser, inputs)
+        print(f"{label:<10} {elapsed:8.2f}s {args.inputs / elapsed:12.0f} inputs/s")
@@ -0,0 +1,135 @@
+# Reloads an edited world under games in progress, ticking the reloader the
+# way the server does. Reports the longest any one tick took, and the latest
+# any tick started (the thread loading the new world shares the interpreter
+# lock), against stopping everything to reload in one go. Then checks every
+# game ended up in the new world with what it should have kept: a player
+# carrying an item that's still there still has it, removed items are gone,
+# players are where they were, changed descriptions show & new item names
+# are understood.
+
+# Imports
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Reload import *
+import worldgen
+
+# Change some descriptions (including where some players are), remove some
+# items & add some new ones. Returns the removed items & changed locations.
+def EditWorld(fn_locations, fn_items, rng, changes, occupied):
+    with open(fn_locations, 'r') as locations_file:
+        location_dicts = json.load(locations_file)
+    redecorated = set(rng.sample(occupied, changes // 2))
+    redecorated.update(location_dict["name"] for location_dict in rng.sample(location_dicts, changes - len(redecorated)))
+    for location_dict in location_dicts:
+        if location_dict["name"] in redecorated:
+            location_dict["description"] = "It has been redecorated since you were last here."
+    worldgen.WriteJSONList(fn_locations, location_dicts)
+
+    with open(fn_items, 'r') as items_file:
+        item_dicts = json.load(items_file)
+    things = [item_dict for item_dict in item_dicts if item_dict["name"].startswith("thing_")]
+    removed = set(item_dict["name"] for item_dict in rng.sample(things, changes))
+    item_dicts = [item_dict for item_dict in item_dicts if item_dict["name"] not in removed]
+    for index in range(changes):
+        item_dicts.append(worldgen.MakeItem(f"gadget_{index}", "A new gadget.", 1, worldgen.LocationName(0), True))
+    worldgen.WriteJSONList(fn_items, item_dicts)
+    return removed, redecorated
+
+# Games that have wandered about picking things up
+def PlayGames(world, count, turns, rng):
+    games = []
+    for index in range(count):
+        game = Game(world, NullSink())
+        for turn in range(turns):
+            here = game.GetItems().GetItemsAt(game.GetLocation().GetLocationName())
+            if len(here) > 0 and rng.random() < 0.3:
+                game.ProcessInput(f"get {rng.choice(here)}")
+            else:
+                game.ProcessInput(f"go {rng.choice(list(game.GetLocation().GetExits()))}")
+        games.append(game)
+    return games
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check hot reloading of the world")
+    arg_parser.add_argument("--locations", type=int, default=20000)
+    arg_parser.add_argument("--items", type=int, default=20000)
+    arg_parser.add_argument("--games", type=int, default=2000)
+    arg_parser.add_argument("--turns", type=int, default=20, help="turns each game plays first")
+    arg_parser.add_argument("--changes", type=int, default=100, help="locations & items changed")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_locations, fn_items = worldgen.WriteWorld(temp_dir, args.locations, args.items, args.seed)
+        fn_snapshot = os.path.join(temp_dir, "world.snapshot")
+        fn_verbs = os.path.join(temp_dir, "verbs.json")
+        world = LoadWorld(fn_locations, fn_items, fn_snapshot, fn_verbs)
+        games = PlayGames(world, args.games, args.turns, rng)
+        states = [game.GetState() for game in games]
+        reloader = WorldReloader(world, fn_locations, fn_items, fn_snapshot, fn_verbs, check_interval=0, log=None)
+
+        occupied = sorted(set(state["location"] for state in states))
+        removed, redecorated = EditWorld(fn_locations, fn_items, rng, args.changes, occupied)
+
+        # The old way: stop everything, load the JSON & restart every game
+        start = time.perf_counter()
+        stopped_world = World(fn_locations, fn_items, fn_verbs)
+        for state in states:
+            Game(stopped_world, NullSink())
+        stop_the_world = time.perf_counter() - start
+
+        # Tick until it's all done, as the server would
+        ticks = 0
+        stage_ticks = {}
+        latest = 0.0
+        sleep = HR_TICK / 10
+        start = time.perf_counter()
+        while reloader.GetStats()["reloads"] == 0 or reloader.GetStage() != "idle":
+            stage = reloader.GetStage()
+            tick_start = time.perf_counter()
+            reloader.Tick(lambda: games)
+            tick_end = time.perf_counter()
+            stage_ticks[stage] = max(stage_ticks.get(stage, 0.0), tick_end - tick_start)
+            ticks += 1
+            time.sleep(sleep)
+            latest = max(latest, time.perf_counter() - tick_end - sleep)
+        elapsed = time.perf_counter() - start
+        reloader.Close()
+
+        stats = reloader.GetStats()
+        print(f"  {args.locations} locations, {args.items} items, {args.games} games: {stats['last_changes']}")
+        print(f"  stop the world & reload: {stop_the_world * 1000:8.1f}ms with every game waiting")
+        print(f"  hot reload: {elapsed:.2f}s over {ticks} ticks, longest tick {stats['max_tick_seconds'] * 1000:.1f}ms "
+              f"({', '.join(f'{stage} {seconds * 1000:.1f}ms' for stage, seconds in stage_ticks.items())}), "
+              f"latest tick {latest * 1000:.1f}ms late")
+
+        # Everyone's in the new world, with what they should have
+        new_world = reloader.GetWorld()
+        problems = 0
+        for game, old_state in zip(games, states):
+            if game.GetWorld() is not new_world:
+                problems += 1
+                continue
+            state = game.GetState()
+            for item_name in old_state["items"]:
+                if (item_name in state["items"]) == (item_name in removed):
+                    problems += 1
+            if state["location"] != old_state["location"]:
+                problems += 1
+            if (state["location"] in redecorated) != ("redecorated" in game.RenderLocation()):
+                problems += 1
+        game = Game(new_world, NullSink())
+        game.ProcessInput("get gadget_0")
+        if game.GetItems()["gadget_0"].GetLocationName() != L_CARRIED:
+            problems += 1
+        players_redecorated = sum(1 for state in states if state["location"] in redecorated)
+        print(f"  check: {problems} problems across {args.games} games ({players_redecorated} in changed locations)")
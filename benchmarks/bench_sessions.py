@@ -0,0 +1,47 @@
+# Measures the cost of creating many game sessions, comparing a private
+# world per session (the old behaviour) with one shared world.
+
+# Imports
+import argparse
+import gc
+import time
+import tracemalloc
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+
+# Create some sessions, returning (seconds, bytes allocated)
+def MeasureSessions(count, make_game):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    sessions = [make_game() for i in range(count)]
+
+    elapsed = time.perf_counter() - start
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Keep the sessions alive until we've measured them
+    del sessions
+    return elapsed, allocated
+
+def Report(label, count, elapsed, allocated):
+    print(f"{label:<22} {elapsed:8.3f}s {elapsed / count * 1e6:9.1f}us/session "
+          f"{allocated / 1024 / 1024:9.1f}MB {allocated / count:9.0f}B/session")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark game session creation")
+    arg_parser.add_argument("--sessions", type=int, default=10000)
+    args = arg_parser.parse_args()
+
+    # Before: every session loads & builds its own world
+    elapsed, allocated = MeasureSessions(args.sessions, lambda: Game(World()))
+    Report("private world", args.sessions, elapsed, allocated)
+
+    # After: every session shares one world, copying only what it changes
+    world = World()
+    elapsed, allocated = MeasureSessions(args.sessions, lambda: Game(world))
+    Report("shared world", args.sessions, elapsed, allocated)
@@ -0,0 +1,173 @@
+# Load tests the shard server with more & more workers, against the single
+# process server, then checks that sessions carry on when a worker is killed
+# and that sessions are moved when the workers get out of balance.
+
+# Imports
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from LoadClient import RunLoad
+from Server import S_HOST, S_PROMPT, S_ENCODING
+
+# Start a server, waiting until it's listening
+def StartServer(arguments):
+    process = subprocess.Popen([sys.executable] + arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    process.stdout.readline()
+    return process
+
+def StopServer(process):
+    process.terminate()
+    process.wait()
+
+# The worker processes of a shard server
+def GetWorkerPids(process):
+    pids = []
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", 'r') as stat_file:
+                parent = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{pid}/cmdline", 'rb') as cmdline_file:
+                cmdline = cmdline_file.read()
+        except OSError:
+            continue
+        if parent == process.pid and b"spawn_main" in cmdline:
+            pids.append(int(pid))
+    return sorted(pids)
+
+# One player, who picks up the bottle, waits, then checks they still have it
+async def CheckPlayer(port, before, after, pause):
+    reader, writer = await asyncio.open_connection(S_HOST, port)
+    prompt = S_PROMPT.encode(S_ENCODING)
+    await reader.readuntil(prompt)
+
+    async def Say(command):
+        writer.write((command + "\n").encode(S_ENCODING))
+        await writer.drain()
+        return (await reader.readuntil(prompt)).decode(S_ENCODING)
+
+    for command in before:
+        await Say(command)
+    await asyncio.sleep(pause)
+
+    # The first thing said after a move is answered by the room being described again
+    output = ""
+    for command in after:
+        output += await Say(command)
+    writer.close()
+    return output
+
+# Kill a worker while players are part way through, and check nobody lost anything
+async def CheckCrash(port, players, process, checkpoint):
+    before = ["get bottle", "go out"]
+    after = ["look", "inventory", "inventory"]
+    tasks = [asyncio.create_task(CheckPlayer(port, before, after, checkpoint * 4)) for i in range(players)]
+
+    # Give the checkpoint time to happen, then kill a worker
+    await asyncio.sleep(checkpoint * 2)
+    os.kill(GetWorkerPids(process)[0], signal.SIGKILL)
+
+    outputs = await asyncio.gather(*tasks)
+    return sum(1 for output in outputs if "You are carrying: bottle" in output and "outside a small, wooden cabin" in output)
+
+# How many sockets each worker has open, less those it had when idle
+def GetWorkerSockets(process, idle=None):
+    counts = []
+    for index, pid in enumerate(GetWorkerPids(process)):
+        fds = os.listdir(f"/proc/{pid}/fd")
+        count = sum(1 for fd in fds if os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:"))
+        if idle is not None:
+            count -= idle[index]
+        counts.append(count)
+    return counts
+
+# Connect players, then have every other one leave, which empties one worker
+async def CheckRebalance(port, players, process, rebalance):
+    connections = []
+    prompt = S_PROMPT.encode(S_ENCODING)
+    idle = GetWorkerSockets(process)
+    for i in range(players):
+        reader, writer = await asyncio.open_connection(S_HOST, port)
+        await reader.readuntil(prompt)
+        connections.append((reader, writer))
+    for reader, writer in connections[1::2]:
+        writer.write(b"quit\n")
+        await writer.drain()
+        await reader.read()
+        writer.close()
+    await asyncio.sleep(0.2)
+    before = GetWorkerSockets(process, idle)
+
+    await asyncio.sleep(rebalance * 2)
+    after = GetWorkerSockets(process, idle)
+
+    # Everyone left can still play
+    playing = 0
+    for reader, writer in connections[0::2]:
+        writer.write(b"inventory\n")
+        await writer.drain()
+        if b"You are" in await reader.readuntil(prompt):
+            playing += 1
+        writer.close()
+    return before, after, playing
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the shard server")
+    arg_parser.add_argument("--players", type=int, default=200)
+    arg_parser.add_argument("--commands", type=int, default=100)
+    arg_parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="load client processes")
+    arg_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument("--port", type=int, default=4321)
+    args = arg_parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.players} players x {args.commands} commands, {args.clients} client processes")
+
+    # Scaling
+    setups = [("Server.py", ["Server.py"])]
+    workers = 1
+    while workers <= args.max_workers:
+        setups.append((f"{workers} workers", ["ShardServer.py", "--workers", str(workers)]))
+        workers *= 2
+    baseline = None
+    for name, arguments in setups:
+        process = StartServer(arguments + ["--port", str(args.port)])
+        try:
+            latencies, elapsed = RunLoad(S_HOST, args.port, args.players, args.commands, 100, args.clients)
+        finally:
+            StopServer(process)
+        throughput = len(latencies) / elapsed
+        if baseline is None:
+            baseline = throughput
+        print(f"  {name:<12} {throughput:9.0f} commands/s ({throughput / baseline:.2f}x), "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms")
+
+    # Crash recovery
+    checkpoint = 0.2
+    process = StartServer(["ShardServer.py", "--workers", "2", "--port", str(args.port), "--checkpoint-every", str(checkpoint)])
+    try:
+        workers_before = GetWorkerPids(process)
+        players = 20
+        survived = asyncio.run(CheckCrash(args.port, players, process, checkpoint))
+        workers_after = GetWorkerPids(process)
+    finally:
+        StopServer(process)
+    print(f"  crash: killed 1 of {len(workers_before)} workers, {len(workers_after)} running after, "
+          f"{survived}/{players} players carried on with their bottle")
+
+    # Rebalancing
+    rebalance = 0.5
+    process = StartServer(["ShardServer.py", "--workers", "2", "--port", str(args.port), "--rebalance-every", str(rebalance)])
+    try:
+        players = 20
+        before, after, playing = asyncio.run(CheckRebalance(args.port, players, process, rebalance))
+    finally:
+        StopServer(process)
+    print(f"  rebalance: sessions per worker {before} -> {after}, {playing}/{players // 2} still playing")
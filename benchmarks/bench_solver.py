@@ -0,0 +1,102 @@
+# Times the walkthrough solver, and checks what it says:
+#  - the shipped world gets the same length walkthrough trying only useful
+#    commands as trying every command, and both play through
+#  - with the key locked inside the chest, the basement is shown unreachable
+#  - on generated worlds with thousands of items, fetching something from a
+#    locked box gets solved, with & without worker processes, to the same
+#    length, and the memory used per state seen stays small
+
+# Imports
+import argparse
+import json
+import os
+import resource
+import tempfile
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Solver import *
+import worldgen
+
+# Solve, returning the walkthroughs & the stats
+def Run(solver):
+    walkthroughs = solver.Solve()
+    return walkthroughs, solver.GetStats()
+
+def Describe(stats):
+    return f"{stats['states']:8d} states, {stats['levels']:3d} levels, {stats['seconds']:7.2f}s ({stats['states'] / max(stats['seconds'], 1e-9):6.0f} states/s)"
+
+# Check every walkthrough plays through to its goal
+def CheckWalkthroughs(solver, walkthroughs):
+    for goal, walkthrough in zip(solver.GetGoals(), walkthroughs):
+        assert walkthrough is not None, goal.GetSpec()
+        assert Verify(solver.GetWorld(), walkthrough, goal), goal.GetSpec()
+
+# The shipped world, with the key locked away in the chest
+def WriteLockedOutWorld(directory):
+    with open(FN_ITEMS, 'r') as items_file:
+        item_dicts = json.load(items_file)
+    for item_dict in item_dicts:
+        if item_dict["name"] == "key":
+            item_dict["location_name"] = "chest"
+    fn_items = os.path.join(directory, "items.json")
+    worldgen.WriteJSONList(fn_items, item_dicts)
+    return fn_items
+
+# Something inside a locked box, in a generated world
+def FindBoxedItem(fn_items):
+    with open(fn_items, 'r') as items_file:
+        item_dicts = json.load(items_file)
+    locked = set(item_dict["name"] for item_dict in item_dicts if item_dict["locked"])
+    boxed = [item_dict["name"] for item_dict in item_dicts if item_dict["location_name"] in locked]
+    return boxed[-1]
+
+def GetMaxRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark & check the walkthrough solver")
+    arg_parser.add_argument("--locations", type=int, default=400, help="size of the generated worlds")
+    arg_parser.add_argument("--sizes", default="1000,10000", help="item counts to try")
+    arg_parser.add_argument("--processes", type=int, default=max(2, os.cpu_count() or 1))
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    # The shipped world, both ways
+    useful = Solver()
+    walkthroughs, stats = Run(useful)
+    CheckWalkthroughs(useful, walkthroughs)
+    print(f"  shipped world, useful commands {Describe(stats)}: {len(walkthroughs[0])} moves")
+    everything = Solver(all_verbs=True)
+    all_walkthroughs, all_stats = Run(everything)
+    CheckWalkthroughs(everything, all_walkthroughs)
+    assert [len(walkthrough) for walkthrough in all_walkthroughs] == [len(walkthrough) for walkthrough in walkthroughs]
+    print(f"  shipped world, every command   {Describe(all_stats)}: {len(all_walkthroughs[0])} moves")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Can't be done, and it says so having seen everything
+        fn_items = WriteLockedOutWorld(temp_dir)
+        for all_verbs in [False, True]:
+            solver = Solver(FN_LOCATIONS, fn_items, all_verbs=all_verbs)
+            walkthroughs, stats = Run(solver)
+            assert walkthroughs == [None] and stats['complete']
+            print(f"  key locked in the chest{' (every command)' if all_verbs else ''}: unwinnable, {Describe(stats)}")
+
+        # Big generated worlds
+        for item_count in [int(size) for size in args.sizes.split(",")]:
+            fn_locations, fn_items = worldgen.WriteWorld(temp_dir, args.locations, item_count, args.seed)
+            goal_spec = f"carrying:{FindBoxedItem(fn_items)}"
+            lengths = []
+            for processes in [0, args.processes]:
+                rss = GetMaxRSS()
+                solver = Solver(fn_locations, fn_items, goal_specs=[goal_spec], processes=processes)
+                walkthroughs, stats = Run(solver)
+                CheckWalkthroughs(solver, walkthroughs)
+                lengths.append(len(walkthroughs[0]))
+                growth = max(0, GetMaxRSS() - rss)
+                print(f"  {args.locations} locations, {item_count:>6} items, {goal_spec}, "
+                      f"{'serial' if processes == 0 else f'{processes} processes'}: {Describe(stats)}, "
+                      f"{lengths[-1]} moves, peak memory +{growth / 1048576:.1f}MB")
+            assert lengths[0] == lengths[1]
+    print(f"  check: all walkthroughs verified ({os.cpu_count()} cores)")
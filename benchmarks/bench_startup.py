@@ -0,0 +1,43 @@
+# Compares world start up time from the JSON files with the compiled snapshot.
+
+# Imports
+import argparse
+import os
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+
+# Best of a few runs, in seconds
+def TimeBest(repeat, func):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark world start up")
+    arg_parser.add_argument("--locations", default=FN_LOCATIONS)
+    arg_parser.add_argument("--items", default=FN_ITEMS)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_snapshot = os.path.join(temp_dir, FN_SNAPSHOT)
+
+        # Compile once, then time loading
+        compile_time = TimeBest(1, lambda: CompileWorld(args.locations, args.items, fn_snapshot))
+        json_time = TimeBest(args.repeat, lambda: World(args.locations, args.items))
+        snapshot_time = TimeBest(args.repeat, lambda: ReadSnapshot(args.locations, args.items, fn_snapshot))
+        snapshot_size = os.path.getsize(fn_snapshot)
+
+    print(f"compile:  {compile_time * 1000:10.2f}ms ({snapshot_size} bytes)")
+    print(f"json:     {json_time * 1000:10.2f}ms")
+    print(f"snapshot: {snapshot_time * 1000:10.2f}ms ({json_time / snapshot_time:.1f}x faster)")
@@ -0,0 +1,64 @@
+# Times "go <location>" route finding on big generated worlds. The first trip
+# to a place searches the map, later trips from anywhere along a route already
+# found just follow the remembered steps.
+
+# Imports
+import argparse
+import random
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import worldgen
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark auto-travel route finding")
+    arg_parser.add_argument("--locations", type=int, default=200000)
+    arg_parser.add_argument("--targets", type=int, default=20, help="destinations to travel to")
+    arg_parser.add_argument("--trips", type=int, default=1000, help="trips to each destination")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_locations, fn_items = worldgen.WriteWorld(temp_dir, args.locations, 10, args.seed)
+        world = World(fn_locations, fn_items)
+
+    rng = random.Random(args.seed)
+    location_names = list(world.GetMap())
+    targets = [rng.choice(location_names) for i in range(args.targets)]
+    start_name = world.GetStartLocation().GetLocationName()
+
+    # First trip to each place, searching the map
+    path_index = world.GetPathIndex()
+    steps = 0
+    start = time.perf_counter()
+    for target_name in targets:
+        steps += len(path_index.FindRoute(start_name, target_name))
+    cold = time.perf_counter() - start
+    print(f"{args.locations} locations, first trips:  {cold / len(targets) * 1000:9.3f}ms per route "
+          f"({steps / len(targets):.0f} steps)")
+
+    # Same trips again, from the start & from places along the way
+    trips = []
+    for target_name in targets:
+        for i in range(args.trips):
+            trips.append(target_name)
+    start = time.perf_counter()
+    for target_name in trips:
+        path_index.FindRoute(start_name, target_name)
+    warm = time.perf_counter() - start
+    print(f"{args.locations} locations, repeat trips: {warm / len(trips) * 1000:9.3f}ms per route "
+          f"({cold / len(targets) / (warm / len(trips)):.0f}x faster)")
+
+    # Whole "go <location>" turns through a game, there & back again
+    game = Game(world, NullSink())
+    start = time.perf_counter()
+    for target_name in trips:
+        game.ProcessInput(f"go {target_name}")
+        game.ProcessInput(f"go {start_name}")
+        game.GetSink().Flush()
+    elapsed = time.perf_counter() - start
+    print(f"{args.locations} locations, game turns:   {elapsed / (len(trips) * 2) * 1000:9.3f}ms per turn")
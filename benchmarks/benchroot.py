@@ -0,0 +1,14 @@
+# Imported by every benchmark before anything from the game. Puts the
+# repository root on the path and makes it the working directory, so the game
+# & its JSON files are found however the benchmark was started. Run as a
+# script, a benchmark's own directory is already on the path, which is how
+# this module & worldgen are found.
+
+# Imports
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
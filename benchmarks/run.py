@@ -0,0 +1,224 @@
+# The benchmark suite. Runs each benchmark against seeded synthetic worlds of
+# increasing size and writes the results as JSON, one result per line, so
+# runs can be compared with --compare to catch scaling regressions.
+#
+#   python benchmarks/run.py --sizes 10,1000,100000 --output results.jsonl
+#   python benchmarks/run.py --compare results.jsonl
+
+# Imports
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+# Run from the repository root (see benchroot.py)
+import benchroot
+
+from Adventure import *
+import worldgen
+
+# Constants - defaults
+B_SIZES = "10,1000,100000"
+B_OPS = 20000
+B_REPEAT = 3
+B_REGRESSION = 1.25
+
+# Every benchmark takes (world, fn_locations, fn_items, ops, rng) and returns
+# the number of operations it timed & how long they took.
+def BenchWorldLoad(world, fn_locations, fn_items, ops, rng):
+    start = time.perf_counter()
+    World(fn_locations, fn_items)
+    return 1, time.perf_counter() - start
+
+def BenchSnapshotLoad(world, fn_locations, fn_items, ops, rng):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fn_snapshot = os.path.join(temp_dir, FN_SNAPSHOT)
+        CompileWorld(fn_locations, fn_items, fn_snapshot)
+        start = time.perf_counter()
+        ReadSnapshot(fn_locations, fn_items, fn_snapshot)
+        return 1, time.perf_counter() - start
+
+def BenchParse(world, fn_locations, fn_items, ops, rng):
+    parser = world.GetParser()
+    parser.SetCacheSize(0)
+    item_names = list(world.GetItems())
+    inputs = []
+    for i in range(ops):
+        choice = rng.random()
+        if choice < 0.4:
+            inputs.append(f"go {rng.choice(['north', 'south', 'east', 'west'])}")
+        elif choice < 0.8:
+            inputs.append(f"get the {rng.choice(item_names)}")
+        else:
+            inputs.append(f"unlock {rng.choice(item_names)} with {rng.choice(item_names)}")
+
+    start = time.perf_counter()
+    for user_input in inputs:
+        parser.ParseInput(user_input)
+    elapsed = time.perf_counter() - start
+    parser.SetCacheSize(P_CACHE_SIZE)
+    return ops, elapsed
+
+def BenchDescribe(world, fn_locations, fn_items, ops, rng):
+    game = Game(world, NullSink())
+    location_names = RandomLocations(world, ops, rng)
+    start = time.perf_counter()
+    for location_name in location_names:
+        game._location = game._map[location_name]
+        game.DescribeLocation()
+    return ops, time.perf_counter() - start
+
+def BenchGo(world, fn_locations, fn_items, ops, rng):
+    game = Game(world, NullSink())
+    start = time.perf_counter()
+    for i in range(ops):
+        directions = list(game._location.GetExits())
+        game.Go(Command("go", rng.choice(directions), None, None))
+    return ops, time.perf_counter() - start
+
+def BenchGetDrop(world, fn_locations, fn_items, ops, rng):
+    game = Game(world, NullSink())
+    targets = GetableItems(world, ops, rng)
+    start = time.perf_counter()
+    for item_name, location_name in targets:
+        game._location = game._map[location_name]
+        game.Get(Command("get", item_name, None, None))
+        game.Drop(Command("drop", item_name, None, None))
+    return len(targets) * 2, time.perf_counter() - start
+
+def BenchOpen(world, fn_locations, fn_items, ops, rng):
+    game = Game(world, NullSink())
+    items = world.GetItems()
+    containers = [item_name for item_name in items if items[item_name].GetContainer() and not items[item_name].GetLocked()]
+    if len(containers) == 0:
+        return 0, 0.0
+    start = time.perf_counter()
+    for i in range(ops):
+        item_name = rng.choice(containers)
+        game._location = game._map[items[item_name].GetLocationName()]
+        game.OpenItem(Command("open", item_name, None, None))
+    return ops, time.perf_counter() - start
+
+def BenchPlaythrough(world, fn_locations, fn_items, ops, rng):
+    game = Game(world, NullSink())
+    start = time.perf_counter()
+    for i in range(ops):
+        # What a player might do here
+        here = game._items.GetItemsAt(game._location.GetLocationName())
+        choice = rng.random()
+        if choice < 0.5 or len(here) == 0:
+            user_input = f"go {rng.choice(list(game._location.GetExits()))}"
+        elif choice < 0.7:
+            user_input = f"get {rng.choice(here)}"
+        elif choice < 0.8:
+            user_input = f"examine {rng.choice(here)}"
+        elif choice < 0.9:
+            user_input = f"open {rng.choice(here)}"
+        else:
+            user_input = "inventory"
+        game.ProcessInput(user_input)
+        game.DescribeLocation()
+        game.GetSink().Flush()
+    return ops, time.perf_counter() - start
+
+BENCHMARKS = [
+    ("world_load", BenchWorldLoad),
+    ("snapshot_load", BenchSnapshotLoad),
+    ("parse", BenchParse),
+    ("describe", BenchDescribe),
+    ("go", BenchGo),
+    ("get_drop", BenchGetDrop),
+    ("open", BenchOpen),
+    ("playthrough", BenchPlaythrough)
+]
+
+# Helpers to pick things to benchmark
+def RandomLocations(world, count, rng):
+    location_names = list(world.GetMap())
+    return [rng.choice(location_names) for i in range(count)]
+
+def GetableItems(world, count, rng):
+    items = world.GetItems()
+    location_map = world.GetMap()
+    getable = [item_name for item_name in items
+               if items[item_name].GetGetable() and items[item_name].GetLocationName() in location_map]
+    return [(item_name, items[item_name].GetLocationName()) for item_name in rng.sample(getable, min(count, len(getable)))]
+
+# Run every benchmark on one world size, keeping the best of a few runs
+def RunSize(directory, size, ops, seed, names, repeat):
+    fn_locations, fn_items = worldgen.WriteWorld(directory, size, size, seed)
+    world = World(fn_locations, fn_items)
+    results = []
+    for name, benchmark in BENCHMARKS:
+        if names and name not in names:
+            continue
+        best = None
+        for i in range(repeat):
+            done, elapsed = benchmark(world, fn_locations, fn_items, ops, random.Random(seed))
+            if best is None or elapsed < best:
+                best = elapsed
+        elapsed = best
+        results.append({
+            'benchmark': name,
+            'size': size,
+            'seed': seed,
+            'ops': done,
+            'seconds': elapsed,
+            'ops_per_sec': done / elapsed if elapsed > 0 else None,
+            'python': platform.python_version()
+        })
+    return results
+
+# Show how a run compares with an earlier one
+def Compare(results, fn_previous, threshold):
+    with open(fn_previous, 'r') as previous_file:
+        previous = {(result["benchmark"], result["size"]): result for result in map(json.loads, previous_file)}
+
+    regressions = 0
+    for result in results:
+        old = previous.get((result["benchmark"], result["size"]))
+        if old is None or not old["ops_per_sec"] or not result["ops_per_sec"]:
+            continue
+        ratio = old["ops_per_sec"] / result["ops_per_sec"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{result['benchmark']:<14} {result['size']:>9} {ratio:6.2f}x slower{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the Adventure benchmark suite")
+    arg_parser.add_argument("--sizes", default=B_SIZES, help="comma separated world sizes, in locations & items")
+    arg_parser.add_argument("--ops", type=int, default=B_OPS, help="operations per benchmark")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--repeat", type=int, default=B_REPEAT, help="runs of each benchmark, the best is kept")
+    arg_parser.add_argument("--only", default="", help="comma separated benchmarks to run")
+    arg_parser.add_argument("--worlds", default=os.path.join(tempfile.gettempdir(), "adventure-worlds"),
+                            help="where generated worlds are kept between runs")
+    arg_parser.add_argument("--output", help="write the results to this file")
+    arg_parser.add_argument("--compare", help="compare with results from an earlier run")
+    arg_parser.add_argument("--threshold", type=float, default=B_REGRESSION, help="slowdown that counts as a regression")
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.worlds, exist_ok=True)
+    names = [name for name in args.only.split(",") if name]
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for result in RunSize(args.worlds, size, args.ops, args.seed, names, args.repeat):
+            results.append(result)
+            print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            for result in results:
+                output_file.write(json.dumps(result) + "\n")
+
+    # Fail if anything got slower
+    if args.compare and Compare(results, args.compare, args.threshold) > 0:
+        sys.exit(1)
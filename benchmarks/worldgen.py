@@ -0,0 +1,161 @@
+# Generates synthetic worlds in the same format as locations.json & items.json.
+# The same size & seed always give exactly the same world.
+#
+# Locations are laid out on a grid joined north/south/east/west, so every
+# location can be reached, with some extra up/down shortcuts and some blocked
+# exits. Items are scattered around, with some locked & unlocked containers
+# that hold other items, and a key for every locked container.
+
+# Imports
+import argparse
+import json
+import math
+import os
+import random
+
+# Constants - how the world is made up
+WG_SHORTCUT_CHANCE = 0.05
+WG_BLOCKED_EXIT_CHANCE = 0.01
+WG_CONTAINER_CHANCE = 0.05
+WG_CONTENTS_CHANCE = 0.2
+
+# Constants - bumped whenever the same size & seed would give a different world
+WG_VERSION = 2
+
+def LocationName(index):
+    return f"loc_{index}"
+
+# Generate the location dicts
+def GenerateLocations(location_count, seed):
+    rng = random.Random(seed)
+    width = max(1, int(math.sqrt(location_count)))
+
+    for index in range(location_count):
+        x = index % width
+        y = index // width
+
+        # Join the grid up
+        exits = {}
+        if y > 0:
+            exits["north"] = LocationName(index - width)
+        if index + width < location_count:
+            exits["south"] = LocationName(index + width)
+        if x > 0:
+            exits["west"] = LocationName(index - 1)
+        if x < width - 1 and index + 1 < location_count:
+            exits["east"] = LocationName(index + 1)
+
+        # The odd one-way shortcut
+        if rng.random() < WG_SHORTCUT_CHANCE:
+            exits["up"] = LocationName(rng.randrange(location_count))
+
+        location_dict = {
+            "name": LocationName(index),
+            "description": f"You are in location {index}, at {x}, {y}. It looks much like everywhere else.",
+            "start_location": index == 0,
+            "exits": exits
+        }
+
+        # Sometimes there's something in the way
+        if rng.random() < WG_BLOCKED_EXIT_CHANCE:
+            location_dict["blocked_exit"] = {
+                "name": f"door_{index}",
+                "desc": "a boarded up door.",
+                "alt_desc": "a smashed door.",
+                "effect": "The boards splinter and fall away.",
+                "exits": {"down": LocationName(rng.randrange(location_count))},
+                "verbs": ["hit", "smash", "break"],
+                "target": "hammer_0"
+            }
+
+        yield location_dict
+
+# Generate the item dicts
+def GenerateItems(item_count, location_count, seed):
+    rng = random.Random(seed + 1)
+    containers = []
+    keys_needed = []
+
+    for index in range(item_count):
+        location_name = LocationName(rng.randrange(location_count))
+
+        # Every world has a hammer for the blocked exits
+        if index == 0:
+            yield MakeItem("hammer_0", "A heavy hammer.", 2, location_name, True)
+            continue
+
+        # Locked containers need their key putting somewhere, straight after
+        if len(keys_needed) > 0:
+            yield MakeItem(keys_needed.pop(), "A small key.", 1, location_name, True)
+            continue
+
+        # Some items are containers, half of them locked (if there's room left for the key)
+        if rng.random() < WG_CONTAINER_CHANCE:
+            item_dict = MakeItem(f"box_{index}", "A wooden box.", 3, location_name, False)
+            item_dict["container"] = True
+            if rng.random() < 0.5 and index + 1 < item_count:
+                item_dict["locked"] = True
+                item_dict["requires_to_unlock"] = f"key_{index}"
+                keys_needed.append(item_dict["requires_to_unlock"])
+            containers.append(item_dict)
+            yield item_dict
+            continue
+
+        # Some things are inside containers
+        if len(containers) > 0 and rng.random() < WG_CONTENTS_CHANCE:
+            location_name = rng.choice(containers)["name"]
+
+        yield MakeItem(f"thing_{index}", f"Thing number {index}.", 1, location_name, True)
+
+def MakeItem(name, description, weight, location_name, getable):
+    return {
+        "name": name,
+        "description": description,
+        "weight": weight,
+        "location_name": location_name,
+        "getable": getable,
+        "container": False,
+        "requires_to_unlock": "",
+        "open": False,
+        "locked": False
+    }
+
+# Write a JSON list one entry at a time, so huge worlds needn't be in memory.
+# It's swapped in whole, so a run that's interrupted never leaves half a world
+# behind for the next one to pick up.
+def WriteJSONList(fn, entries):
+    fn_temp = f"{fn}.{os.getpid()}.tmp"
+    with open(fn_temp, 'w') as json_file:
+        json_file.write("[\n")
+        first = True
+        for entry in entries:
+            if not first:
+                json_file.write(",\n")
+            json_file.write(json.dumps(entry))
+            first = False
+        json_file.write("\n]\n")
+    os.replace(fn_temp, fn)
+
+# Write a world's JSON files into a directory, returning their names
+def WriteWorld(directory, location_count, item_count, seed):
+    fn_locations = os.path.join(directory, f"locations_{location_count}_{item_count}_{seed}_v{WG_VERSION}.json")
+    fn_items = os.path.join(directory, f"items_{location_count}_{item_count}_{seed}_v{WG_VERSION}.json")
+
+    # Already made?
+    if not os.path.exists(fn_locations):
+        WriteJSONList(fn_locations, GenerateLocations(location_count, seed))
+    if not os.path.exists(fn_items):
+        WriteJSONList(fn_items, GenerateItems(item_count, location_count, seed))
+
+    return fn_locations, fn_items
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic Adventure world")
+    arg_parser.add_argument("--locations", type=int, default=1000)
+    arg_parser.add_argument("--items", type=int, default=1000)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--directory", default=".")
+    args = arg_parser.parse_args()
+
+    for fn in WriteWorld(args.directory, args.locations, args.items, args.seed):
+        print(fn)
@@ -0,0 +1,7 @@
+# Run from the repository root, so the game & its JSON files are found
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,87 @@
+# Cached location descriptions always change when what they describe does
+
+# Imports
+from Adventure import *
+
+TO_CHEST = ["go out", "go up", "get key", "go down", "go south", "go down"]
+
+# A game in its own world, so other tests' caches don't matter
+def MakeGame(commands=()):
+    sink = MemorySink()
+    game = Game(World(), sink)
+    for command in commands:
+        game.ProcessInput(command)
+    Describe(game)
+    return game
+
+# Describe the location (through the caches), returning what was written
+def Describe(game):
+    sink = game.GetSink()
+    sink.Flush()
+    sink.Clear()
+    game.DescribeLocation()
+    sink.Flush()
+    text = sink.GetOutput()
+    sink.Clear()
+    assert text == game.RenderLocation()
+    return text
+
+def test_moving_items():
+    game = MakeGame()
+    before = Describe(game)
+    assert "bottle" in before
+
+    game.ProcessInput("get bottle")
+    assert "bottle" not in Describe(game)
+    game.ProcessInput("drop bottle")
+    assert Describe(game) == before
+
+    # Directly too
+    game.GetItems().GetMutableItem("bottle").SetLocationName(L_CARRIED)
+    assert "bottle" not in Describe(game)
+
+def test_opening_and_locking_containers():
+    game = MakeGame(TO_CHEST)
+    closed = Describe(game)
+    assert "sledgehammer" not in closed
+
+    game.ProcessInput("unlock chest with key")
+    assert Describe(game) == closed
+    game.ProcessInput("open chest")
+    opened = Describe(game)
+    assert "sledgehammer" in opened
+    game.ProcessInput("close chest")
+    assert Describe(game) == closed
+    game.ProcessInput("lock chest with key")
+    assert Describe(game) == closed
+
+    # Directly too
+    chest = game.GetItems().GetMutableItem("chest")
+    chest.SetLocked(False)
+    chest.SetOpen(True)
+    assert Describe(game) == opened
+
+def test_changing_exits():
+    game = MakeGame(TO_CHEST + ["unlock chest with key", "open chest", "get sledgehammer", "go up", "go north", "go in"])
+    before = Describe(game)
+    assert "down" not in before
+
+    game.ProcessInput("hit trapdoor with sledgehammer")
+    after = Describe(game)
+    assert after != before
+    assert "broken trapdoor" in after and "down" in after
+
+def test_other_games_keep_their_own_descriptions():
+    world = World()
+    sink = MemorySink()
+    game = Game(world, sink)
+    other = Game(world, MemorySink())
+    before = Describe(other)
+
+    game.ProcessInput("get bottle")
+    assert "bottle" not in Describe(game)
+    assert Describe(other) == before
+
+    # And picking up another game's state brings its descriptions with it
+    other.SetState(game.GetState())
+    assert Describe(other) == Describe(game)
@@ -0,0 +1,82 @@
+# Recovering games from the journal after a crash
+
+# Imports
+import asyncio
+from Adventure import Game, NullSink
+from Journal import Journal
+
+WALKTHROUGH = [
+    "go out", "go up", "get key", "go down", "go south", "go down", "unlock chest with key",
+    "open chest", "get sledgehammer", "go up", "go north", "go in", "hit trapdoor with sledgehammer", "go down"
+]
+
+# Play the walkthrough in two sessions, journalling every command, and
+# return each session's state after every command
+def PlayJournalled(journal, commit):
+    games = {1: Game(sink=NullSink()), 2: Game(sink=NullSink())}
+    states = {1: [], 2: []}
+    for user_input in WALKTHROUGH:
+        for session_id, game in games.items():
+            command = game.ProcessInput(user_input)
+            journal.Append(session_id, game, command)
+            commit()
+            states[session_id].append((game.GetState(), game.GetCommandCount()))
+    return states
+
+def Recover(fn):
+    journal = Journal(fn, sync=False)
+    games = journal.Recover()
+    journal.Close()
+    return {session_id: (game.GetState(), game.GetCommandCount()) for session_id, game in games.items()}
+
+def test_recovers_after_torn_write(tmp_path):
+    fn = str(tmp_path / "commands.journal")
+    journal = Journal(fn, sync=False, snapshot_every=5)
+    journal.Recover()
+    states = PlayJournalled(journal, journal.Commit)
+    journal.Close()
+
+    # A crash part way through writing the last record
+    with open(fn, 'rb') as journal_file:
+        data = journal_file.read()
+    with open(fn, 'wb') as journal_file:
+        journal_file.write(data[:-10])
+
+    # Session 2's last command is lost, everything before it isn't
+    recovered = Recover(fn)
+    assert recovered[1] == states[1][-1]
+    assert recovered[2] == states[2][-2]
+
+def test_ended_sessions_stay_ended(tmp_path):
+    fn = str(tmp_path / "commands.journal")
+    journal = Journal(fn, sync=False)
+    journal.Recover()
+    states = PlayJournalled(journal, journal.Commit)
+    journal.End(1)
+    journal.Commit()
+    journal.Close()
+
+    assert Recover(fn) == {2: states[2][-1]}
+
+def test_recovers_after_compacting_in_group_commits(tmp_path):
+    fn = str(tmp_path / "commands.journal")
+    journal = Journal(fn, sync=True, snapshot_every=3, compact_ratio=1)
+    journal.Recover()
+
+    # Both sessions' commands go out together, compacting as they go
+    async def Play():
+        games = {1: Game(sink=NullSink()), 2: Game(sink=NullSink())}
+        for user_input in WALKTHROUGH:
+            for session_id, game in games.items():
+                journal.Append(session_id, game, game.ProcessInput(user_input))
+            await journal.WaitCommitted()
+        return {session_id: (game.GetState(), game.GetCommandCount()) for session_id, game in games.items()}
+
+    states = asyncio.run(Play())
+    commits = journal.GetStats()["commits"]
+    journal.Close()
+
+    assert commits == len(WALKTHROUGH)
+    with open(fn, 'r') as journal_file:
+        assert len(journal_file.readlines()) < 2 * len(WALKTHROUGH)
+    assert Recover(fn) == states